@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Server (`server.*`) và client (`dbapi2.*`) được import từ src/, như khi chạy trong src/
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "client")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -1,8 +1,12 @@
 import fastapi
 from server.api.router.query import router as query_router
 from server.api.router.auth import router as auth_router
+from server.api.router.table import router as table_router
+from server.api.router.cache import router as cache_router
 router = fastapi.APIRouter()
 
 router.include_router(router=query_router)
 router.include_router(router=auth_router)
+router.include_router(router=table_router)
+router.include_router(router=cache_router)
 
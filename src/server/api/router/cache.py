@@ -0,0 +1,38 @@
+import fastapi
+from fastapi import Depends
+from server.middleware.auth import get_current_user
+from server.controllers import db_controlller
+
+router = fastapi.APIRouter(prefix="/cache", tags=["cache"])
+
+
+@router.get("/results")
+def result_cache_stats(current_user = Depends(get_current_user)):
+    """
+    Hits / misses and memory / disk usage of the query result cache of this server.
+    """
+    return db_controlller.result_cache_statistics()
+
+
+@router.delete("/results")
+def clear_result_cache(current_user = Depends(get_current_user)):
+    """
+    Drop every cached query result (in memory and spilled to disk).
+    """
+    return db_controlller.clear_result_cache()
+
+
+@router.get("/resident")
+def resident_stats(current_user = Depends(get_current_user)):
+    """
+    Tables currently held in memory (RESIDENT_TABLES) and their memory usage.
+    """
+    return db_controlller.resident_statistics()
+
+
+@router.delete("/resident")
+def clear_resident(current_user = Depends(get_current_user)):
+    """
+    Drop every resident copy; they are loaded again on the next query.
+    """
+    return db_controlller.clear_resident()
@@ -1,4 +1,5 @@
 from typing import Iterator, Dict
+import itertools
 import fastapi
 import json
 from fastapi import Depends
@@ -7,9 +8,12 @@ from server.middleware.auth import get_current_user
 from server.controllers import db_controlller
 from server.utils.exceptions import dpapi2_exception
 # from server.utils.exceptions.http.exc_400 import http_exc_400_query_empty_bad_request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from fastapi.requests import Request
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from starlette.types import Send
+from server.config.settings import STREAM_BATCH_ROWS
+from server.database.entities.result_cache import CachedResult
 router = fastapi.APIRouter(prefix="/queries", tags=["queries"])
 
 
@@ -20,6 +24,14 @@ class StreamingResponseWithStatusCode(StreamingResponse):
     The parameter status_code in the constructor is ignored, but kept for compatibility with StreamingResponse.
     '''
     async def stream_response(self, send: Send) -> None:
+        try:
+            await self._stream_chunks(send)
+        finally:
+            # Client ngắt kết nối (send lỗi / task bị cancel): đóng iterator ngay để
+            # scan bên dưới được đóng và giải phóng mmap
+            await self.body_iterator.aclose()
+
+    async def _stream_chunks(self, send: Send) -> None:
         first_chunk_content, self.status_code = await self.body_iterator.__anext__() 
 
         if not isinstance(first_chunk_content, bytes):
@@ -45,25 +57,47 @@ class StreamingResponseWithStatusCode(StreamingResponse):
 
         await send({"type": "http.response.body", "body": b"", "more_body": False})
 
+def _next_rows(rows: Iterator[str], n: int) -> list[str]:
+    return list(itertools.islice(rows, n))
+
 @router.post(path="/")
 async def query(
     request: RequestQuery,
+    http_request: Request,
     current_user = Depends(get_current_user)
 ):
-    query_stream = db_controlller.query_execute(
+    # Trong threadpool: INSERT chờ fsync của WAL, các INSERT đồng thời gộp chung một group commit
+    query_stream = await run_in_threadpool(
+            db_controlller.query_execute,
             user_name=current_user.user_name,
             query=request.query,
-    ) 
+            access_path=request.access_path,
+    )
+
+    if isinstance(query_stream, CachedResult):
+        # Kết quả từ result cache: body JSON đã serialize sẵn, gửi nguyên bytes
+        if query_stream.data is not None:
+            return Response(content=query_stream.data, media_type="application/json")
+        return StreamingResponse(iterate_in_threadpool(query_stream.iter_chunks()), media_type="application/json",
+                                 headers={"content-length": str(query_stream.size)})
 
     async def stream_response():
-        yield '[', 200
-        first = True
-        for row in query_stream:
-            if not first:
-                yield ',\n', 200
-            else:
+        try:
+            yield '[', 200
+            first = True
+            while True:
+                # Scan chạy trong threadpool theo từng batch dòng: event loop không bị chặn
+                # và giữa các batch có thể kiểm tra client còn kết nối hay không
+                rows = await run_in_threadpool(_next_rows, query_stream, STREAM_BATCH_ROWS)
+                if not rows:
+                    break
+                if await http_request.is_disconnected():
+                    return
+                chunk = ',\n'.join(rows)
+                yield (chunk if first else ',\n' + chunk), 200
                 first = False
-            yield row, 200
-        yield ']', 200
+            yield ']', 200
+        finally:
+            query_stream.close()
 
     return StreamingResponseWithStatusCode(stream_response(), media_type="application/json")
\ No newline at end of file
@@ -0,0 +1,28 @@
+import fastapi
+from fastapi import Depends
+from server.middleware.auth import get_current_user
+from server.controllers import db_controlller
+from server.config.settings import STATS_SAMPLE_ROWS
+
+router = fastapi.APIRouter(prefix="/tables", tags=["tables"])
+
+
+@router.post("/{table_name}/analyze")
+def analyze(table_name: str, sample_rows: int | None = None, current_user = Depends(get_current_user)):
+    """
+    Collect column statistics (row count, empty / distinct counts, min / max, histograms).
+    sample_rows: only read about this many rows instead of scanning the whole table.
+    """
+    return db_controlller.analyze_table(
+        user_name=current_user.user_name,
+        table_name=table_name,
+        sample_rows=sample_rows or STATS_SAMPLE_ROWS or None,
+    )
+
+
+@router.get("/{table_name}/stats")
+def stats(table_name: str, current_user = Depends(get_current_user)):
+    """
+    Statistics of the last ANALYZE of the table.
+    """
+    return db_controlller.table_statistics(user_name=current_user.user_name, table_name=table_name)
@@ -1,4 +1,4 @@
-from typing import Annotated, Dict, Any, List
+from typing import Annotated, Dict, Any, List, Literal
 from pydantic import BaseModel
 from fastapi import  Query
 
@@ -7,4 +7,6 @@ class ResponseQuery(BaseModel):
     response: List[Any]
 
 class RequestQuery(BaseModel):
-    query: str
\ No newline at end of file
+    query: str
+    # Ép đường truy cập (test, cần settings.ALLOW_ACCESS_PATH_OVERRIDE); mặc định planner tự chọn
+    access_path: Literal["auto", "scan", "parallel", "index"] | None = None
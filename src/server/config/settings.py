@@ -23,3 +23,84 @@ USER_DB = os.path.join(STORAGE_FOLDER, 'user.csv')
 DB_NAMES = [dir for dir in os.listdir(STORAGE_FOLDER) if os.path.isdir(os.path.join(STORAGE_FOLDER, dir))]
 
 BATCH_SIZE = 10
+
+# Query execution
+# EXECUTION_MODE: "row" (compiled per-row filter), "vectorized" (NumPy masks over
+# column batches) or "auto" (vectorized when NumPy is installed and the table is read
+# from a typed source such as its columnar copy; raw CSV scans stay row-at-a-time)
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "auto")
+VECTOR_BATCH_SIZE = int(os.getenv("VECTOR_BATCH_SIZE", "65536"))
+
+# Parallel scan of large CSV tables (process pool over newline-aligned byte ranges)
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_BYTES = int(os.getenv("PARALLEL_MIN_BYTES", str(64 * 1024 * 1024)))
+PARALLEL_CHUNK_BYTES = int(os.getenv("PARALLEL_CHUNK_BYTES", str(16 * 1024 * 1024)))
+# True: rows come back in file order; False: in whatever order the ranges finish
+PARALLEL_ORDERED = os.getenv("PARALLEL_ORDERED", "true").lower() == "true"
+
+# Zone maps: rows per block of the <table>.zonemap.json sidecar
+ZONE_MAP_BLOCK_ROWS = int(os.getenv("ZONE_MAP_BLOCK_ROWS", "8192"))
+
+# Secondary indexes declared in metadata.json ({"name": ..., "type": ..., "index": "sorted" | "hash"})
+# INDEX_AUTO_BUILD: (re)build a missing or stale index the first time a query could use it
+INDEX_AUTO_BUILD = os.getenv("INDEX_AUTO_BUILD", "true").lower() == "true"
+# Use an index only if it selects at most this fraction of the table's rows
+INDEX_MAX_FRACTION = float(os.getenv("INDEX_MAX_FRACTION", "0.2"))
+
+# Streaming of query results: rows are pulled from the scan in batches of this size
+# (in the thread pool, so the event loop keeps serving and notices client disconnects)
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "512"))
+
+# Plan cache: LRU of parsed + validated queries keyed by (database, metadata.json
+# signature, normalized SQL). Also bounds the memo of compiled WHERE filters. 0 disables it.
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+
+# Result cache: serialized JSON results keyed by plan + signature of the table's CSV.
+# Kept in memory up to RESULT_CACHE_MEMORY_BYTES, then spilled to RESULT_CACHE_DIR up to
+# RESULT_CACHE_DISK_BYTES; results larger than RESULT_CACHE_MAX_ENTRY_BYTES are not cached.
+# RESULT_CACHE_MAX_ENTRY_BYTES=0 disables it.
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(SERVER_FOLDER, 'database/result_cache'))
+
+# Resident ("hot") tables, decoded once into typed in-memory arrays: comma-separated
+# "db.table" names. They share RESIDENT_MEMORY_BYTES; least recently used tables are
+# dropped back to disk-only reads when a new one does not fit.
+RESIDENT_TABLES = {t.strip() for t in os.getenv("RESIDENT_TABLES", "").split(",") if t.strip()}
+RESIDENT_MEMORY_BYTES = int(os.getenv("RESIDENT_MEMORY_BYTES", str(512 * 1024 * 1024)))
+
+# Compressed segments for cold tables (python -m server.manage compress): rows per block
+# and default codec ("zlib" or "lzma"). A table whose CSV was removed is read from them.
+SEGMENT_BLOCK_ROWS = int(os.getenv("SEGMENT_BLOCK_ROWS", "65536"))
+SEGMENT_CODEC = os.getenv("SEGMENT_CODEC", "zlib")
+
+# ANALYZE (python -m server.manage analyze / POST /tables/{table}/analyze): number of
+# equi-depth histogram buckets per column; default sample size (0 = scan the whole table).
+STATS_HISTOGRAM_BUCKETS = int(os.getenv("STATS_HISTOGRAM_BUCKETS", "32"))
+STATS_SAMPLE_ROWS = int(os.getenv("STATS_SAMPLE_ROWS", "0"))
+
+# Access path of single-table queries (see database/entities/planner.py): "auto" picks the
+# cheapest of scan / parallel / index from ANALYZE statistics; "scan", "parallel" or
+# "index" force one (testing).
+ACCESS_PATH = os.getenv("ACCESS_PATH", "auto")
+# Let a query request force its own access_path (testing / benchmarks); off by default,
+# requests that set it are then rejected.
+ALLOW_ACCESS_PATH_OVERRIDE = os.getenv("ALLOW_ACCESS_PATH_OVERRIDE", "false").lower() == "true"
+
+# Memory budget of the blocking operators (GROUP BY hash table, ...), in groups / rows held
+# at once; past it their partial state spills to SPILL_PARTITIONS hash-partitioned
+# temporary files under SPILL_DIR (removed when the query finishes).
+OPERATOR_MEMORY_ROWS = int(os.getenv("OPERATOR_MEMORY_ROWS", "500000"))
+SPILL_DIR = os.getenv("SPILL_DIR", os.path.join(SERVER_FOLDER, 'database/spill'))
+SPILL_PARTITIONS = int(os.getenv("SPILL_PARTITIONS", "16"))
+
+# INSERT (database/entities/wal.py): rows go to the table's append-only write-ahead log
+# <table>.wal and are applied to the CSV by a background thread. Concurrent inserts are
+# committed together with one fsync (group commit); the committing insert waits up to
+# WAL_GROUP_COMMIT_DELAY_MS for more inserts to join its group (0: no wait). WAL_FSYNC=false
+# skips the fsync (benchmarks only: committed rows may be lost on a crash). The log is
+# rewritten with only its unapplied records once it grows past WAL_CHECKPOINT_BYTES.
+WAL_GROUP_COMMIT_DELAY_MS = float(os.getenv("WAL_GROUP_COMMIT_DELAY_MS", "0"))
+WAL_FSYNC = os.getenv("WAL_FSYNC", "true").lower() == "true"
+WAL_CHECKPOINT_BYTES = int(os.getenv("WAL_CHECKPOINT_BYTES", str(16 * 1024 * 1024)))
@@ -1,37 +1,185 @@
+import json
 from server.database.db_engine import engine
+from server.config.settings import ALLOW_ACCESS_PATH_OVERRIDE
 from server.utils.exceptions import dpapi2_exception
 from server.database.entities.logical_validator import LogicalValidator
 from server.database.entities.sql_parser import SQLParser
+from server.database.entities.plan_cache import QueryPlan
+from server.database.entities.optimizer import simplify
+from server.database.entities.aggregates import Aggregate
+from server.database.entities.join import JoinPlan
+from server.database.entities import resident
 
 # Main function to process a user's SQL query.
-def query_execute(user_name: str, query: str):
+def query_execute(user_name: str, query: str, access_path: str | None = None):
 
-    db_metadata = engine.get_metadata(user_name=user_name)
+    if access_path is not None and not ALLOW_ACCESS_PATH_OVERRIDE:
+        raise dpapi2_exception.NotSupportedError("Forcing an access path is disabled on this server (ALLOW_ACCESS_PATH_OVERRIDE).")
+    db = engine.get_db(user_name=user_name)
+    db_metadata, db_tables = db.meta_data, db.tables
 
+    if SQLParser.is_insert(query):
+        # Ghi: không qua plan cache / result cache (result cache tự hết hạn theo signature của CSV)
+        return _insert(query, db_metadata, db_tables)
+
+    # Plan cache: cùng câu (đã chuẩn hoá) trên cùng phiên bản metadata thì bỏ qua parse + validate
+    key = (db.db_name, db.catalog_version, SQLParser.normalize_query(query))
+    plan = engine.plan_cache.get_or_plan(key, lambda: _plan_query(query, db_metadata, db_tables))
+    return engine.execute_plan(plan, plan_key=key, access_path=access_path)
+
+
+def _plan_query(query: str, db_metadata: dict, db_tables: dict) -> QueryPlan:
+    """
+    Parse + validate một câu truy vấn thành QueryPlan.
+    """
     parser = SQLParser()
     parsed = parser.parse_query(query)
     # Extract parsed components.
     columns, tables, condition_ast = parsed["columns"], parsed["tables"], parsed["condition_ast"]
 
-    # Currently, only single table queries are supported (no joins).
-    if len(tables) > 1:
-        raise dpapi2_exception.NotSupportedError("Joins between multiple tables are not supported")
-    table_name = tables[0] # Get the single table_name name.
-
     # Dùng LogicalValidator để xác thực và chuẩn hóa logic truy vấn
     validator = LogicalValidator(db_metadata)
-    columns, table_name, ast = validator.validate_logic(
+    if len(tables) > 1:
+        # Join: cột dạng table.column
+        columns, table_names, ast = validator.validate_join(
+            columns = columns,
+            tables = tables,
+            condition_ast = condition_ast
+        )
+    else:
+        columns, table_name, ast = validator.validate_logic(
+            columns = columns,
+            table = tables[0],
+            condition_ast = condition_ast
+        )
+
+    aggregates = [c for c in columns if isinstance(c, Aggregate)]
+    group_by = None
+    if parsed["group_by"] is not None:
+        group_by = validator.validate_group_by(parsed["group_by"], columns)
+    elif aggregates and len(aggregates) != len(columns):
+        # Aggregate không GROUP BY: mọi mục của SELECT phải là hàm aggregate
+        plain = next(c for c in columns if not isinstance(c, Aggregate))
+        raise dpapi2_exception.ProgrammingError(
+            f"Column '{plain}' must be used in an aggregate function when the SELECT list has aggregates"
+        )
+    # DISTINCT trên một dòng aggregate duy nhất không có tác dụng
+    distinct = parsed["distinct"] and not (aggregates and group_by is None)
+    order_by = None
+    if parsed["order_by"] is not None:
+        order_by = validator.validate_order_by(parsed["order_by"], columns, group_by, distinct)
+
+    if len(tables) > 1:
+        # WHERE được rút gọn rồi tách thành filter từng bảng / key / residual trong JoinPlan
+        join = JoinPlan({name: db_tables[name] for name in table_names}, ast, columns, group_by, order_by)
+        return QueryPlan(
+            columns = columns,
+            table = None,
+            ast = None,
+            limit = parsed["limit"],
+            offset = parsed["offset"],
+            aggregates = aggregates,
+            group_by = group_by,
+            order_by = order_by,
+            distinct = distinct,
+            join = join
+        )
+
+    # Gấp hằng / loại điều kiện luôn đúng, luôn sai (một lần cho mỗi plan)
+    table = db_tables[table_name]
+    ast = simplify(ast, table.column_types)
+
+    return QueryPlan(
         columns = columns,
-        table = table_name,
-        condition_ast = condition_ast
+        table = table,
+        ast = ast,
+        limit = parsed["limit"],
+        offset = parsed["offset"],
+        aggregates = aggregates,
+        group_by = group_by,
+        order_by = order_by,
+        distinct = distinct
     )
 
-    return engine.query_execute(
-        db_name = list(db_metadata.keys())[0],  # Assuming single database per user.
-        columns = columns,
-        table_name = table_name,
-        ast = ast
+
+def _insert(query: str, db_metadata: dict, db_tables: dict):
+    """
+    INSERT INTO ... VALUES ...: trả về khi các dòng đã durable trong WAL của bảng và đã
+    được ghi vào CSV, dưới dạng một dòng kết quả {"inserted": số dòng}.
+    """
+    parsed = SQLParser().parse_insert(query)
+    validator = LogicalValidator(db_metadata)
+    table_name, columns, rows = validator.validate_insert(
+        table = parsed["table"],
+        columns = parsed["columns"],
+        rows = parsed["rows"]
     )
+    inserted = db_tables[table_name].insert(columns, rows)
+    # Generator (router gọi close() sau khi stream xong)
+    return (row for row in [json.dumps({"inserted": inserted})])
+
+
+def _resolve_table(user_name: str, table_name: str):
+    """
+    Bảng `table` hoặc `db_name.table` trong database user đang kết nối.
+    """
+    db = engine.get_db(user_name=user_name)
+    parts = table_name.split(".")
+    if len(parts) == 2 and parts[0] == db.db_name:
+        parts = parts[1:]
+    if len(parts) != 1 or parts[0] not in db.tables:
+        raise dpapi2_exception.ProgrammingError(f"Table '{table_name}' not found in database '{db.db_name}'.")
+    return db.tables[parts[0]]
+
+
+def analyze_table(user_name: str, table_name: str, sample_rows: int | None = None) -> dict:
+    """
+    ANALYZE một bảng: thu thập thống kê cột rồi trả về nội dung đã ghi.
+    """
+    if sample_rows is not None and sample_rows <= 0:
+        raise dpapi2_exception.ProgrammingError("sample_rows must be a positive integer")
+    return _resolve_table(user_name, table_name).analyze(sample_rows)
+
+
+def table_statistics(user_name: str, table_name: str) -> dict:
+    """
+    Thống kê từ lần ANALYZE gần nhất (trả lời chỉ từ metadata, không scan bảng).
+    """
+    table = _resolve_table(user_name, table_name)
+    stats = table.get_statistics()
+    if stats is None:
+        raise dpapi2_exception.ProgrammingError(f"No up-to-date statistics for table '{table.name}', run ANALYZE first.")
+    return stats.payload
+
+
+def result_cache_statistics() -> dict:
+    """
+    Thống kê result cache của server (hit / miss, số entry và byte trong RAM / trên đĩa).
+    """
+    return engine.result_cache.stats()
+
+
+def clear_result_cache() -> dict:
+    """
+    Xoá mọi kết quả đã cache (vd. sau khi sửa file CSV bằng tay mà signature không đổi).
+    """
+    engine.result_cache.clear()
+    return {"message": "Result cache cleared."}
+
+
+def resident_statistics() -> dict:
+    """
+    Các bảng đang resident trong RAM và memory budget đã dùng.
+    """
+    return resident.store.stats()
+
+
+def clear_resident() -> dict:
+    """
+    Bỏ mọi bản resident (truy vấn sau load lại từ đĩa).
+    """
+    resident.store.clear()
+    return {"message": "Resident tables dropped."}
 
     
 def disconnect_user(user_name: str):
@@ -1,12 +1,26 @@
 from server.database.entities.db import DB
-from server.config.settings import DB_NAMES
+from server.config.settings import (
+    DB_NAMES, PLAN_CACHE_SIZE, ACCESS_PATH, PARALLEL_WORKERS, PARALLEL_CHUNK_BYTES,
+    RESULT_CACHE_MEMORY_BYTES, RESULT_CACHE_DISK_BYTES, RESULT_CACHE_MAX_ENTRY_BYTES, RESULT_CACHE_DIR
+)
 from server.utils.exceptions import dpapi2_exception
-from server.database.entities.ast import AST
+from server.database.entities.plan_cache import PlanCache, QueryPlan
+from server.database.entities.result_cache import ResultCache, CachedResult
+from server.database.entities.planner import AccessPath, choose_access_path, choose_order_path
+from server.database.entities.optimizer import reorder_predicates
+from server.database.entities.join import select_join
 
 class DatabaseEngine:
     def __init__(self):
         self.db_pool: dict[str, DB] = {}
         self.user_db: dict[str, str] = {}
+        self.plan_cache = PlanCache(PLAN_CACHE_SIZE)
+        self.result_cache = ResultCache(
+            memory_bytes = RESULT_CACHE_MEMORY_BYTES,
+            disk_bytes = RESULT_CACHE_DISK_BYTES,
+            max_entry_bytes = RESULT_CACHE_MAX_ENTRY_BYTES,
+            cache_dir = RESULT_CACHE_DIR
+        )
 
         for db_name in DB_NAMES:
             try:
@@ -31,8 +45,11 @@ class DatabaseEngine:
         db_name = self.user_db[user_name]
         if db_name not in self.db_pool:
             raise dpapi2_exception.InternalError(f"Database '{db_name}' not loaded in memory.")
-        
-        return self.db_pool[db_name]
+
+        db = self.db_pool[db_name]
+        # metadata.json đổi -> load lại catalog (plan cũ không còn được tra vì key có catalog_version)
+        db.refresh()
+        return db
     
     def disconnect_user(self, user_name: str):
         """
@@ -53,13 +70,61 @@ class DatabaseEngine:
         return db.meta_data
 
 
-    def query_execute(self, db_name: str, columns: list[str], table_name: str, ast: AST = None):
+    def execute_plan(self, plan: QueryPlan, plan_key: tuple | None = None, access_path: str | None = None):
+        """
+        Chạy một plan (thường lấy từ plan_cache): bảng đã được resolve sẵn trong plan.
+        plan_key: key của plan trong plan_cache; nếu có thì kết quả đi qua result_cache
+        (trả về CachedResult khi hit, ngược lại các dòng JSON được lưu lại khi scan xong).
+        access_path: ép đường truy cập ("scan" / "parallel" / "index"), bỏ qua result_cache.
+        """
+        cache_key = None
+        if plan_key is not None and access_path is None and self.result_cache.enabled:
+            if plan.join is not None:
+                # Join: kết quả còn đúng khi mọi bảng của join chưa đổi
+                signatures = [table.data_signature() for table in plan.join.tables.values()]
+                signature = None if None in signatures else [tuple(s) for s in signatures]
+            else:
+                signature = plan.table.data_signature()
+            if signature is not None:
+                cache_key = (plan_key, tuple(signature))
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
 
-        # Lấy bảng đã được xác thực tên và truy vấn
-        db = self.db_pool.get(db_name)
-        table = db.get_table(table_name)
+        if plan.join is not None:
+            # Hash join, mỗi bảng scan với filter riêng của nó (xem join.py)
+            rows = select_join(plan.join, plan.columns, plan.aggregates, plan.group_by, plan.order_by, plan.limit, plan.offset, plan.distinct,
+                               force=access_path or ACCESS_PATH, workers=PARALLEL_WORKERS, chunk_bytes=PARALLEL_CHUNK_BYTES)
+            if cache_key is not None:
+                return self.result_cache.capture(cache_key, rows)
+            return rows
 
-        rows = table.select(columns, ast)
+        # Thứ tự điều kiện và đường truy cập chọn lúc chạy (không lưu trong plan): thống kê có thể đổi sau ANALYZE
+        ast = reorder_predicates(plan.ast, plan.table.column_types, plan.table.get_statistics())
+        # LIMIT / OFFSET của truy vấn aggregate / GROUP BY / ORDER BY / DISTINCT áp trên các dòng kết quả,
+        # không ước lượng được số dòng scan phải đọc
+        sorted_rows = plan.order_by is not None and not plan.aggregates and plan.group_by is None
+        limit, offset = (None, 0) if plan.aggregates or plan.group_by is not None or sorted_rows or plan.distinct else (plan.limit, plan.offset)
+        # ORDER BY cột có sorted index: đọc theo thứ tự index thay vì scan + sort nếu rẻ hơn
+        index_order = None
+        if sorted_rows:
+            index_order = choose_order_path(plan.table, ast, plan.order_by, plan.limit, plan.offset, force=access_path or ACCESS_PATH)
+        if index_order is not None:
+            path = AccessPath("index", parallel=False)
+        else:
+            path = choose_access_path(plan.table, ast, limit, offset, force=access_path or ACCESS_PATH,
+                                      workers=PARALLEL_WORKERS, chunk_bytes=PARALLEL_CHUNK_BYTES)
+        if plan.group_by is not None:
+            # GROUP BY: hash aggregation, một dòng cho mỗi nhóm
+            rows = plan.table.select_groups(plan.group_by, plan.columns, ast, parallel=path.parallel, index_scan=path.index_scan, limit=plan.limit, offset=plan.offset, order_by=plan.order_by, distinct=plan.distinct)
+        elif plan.aggregates:
+            # Aggregate: scan fold các dòng khớp, chỉ một dòng kết quả
+            rows = plan.table.select_aggregates(plan.aggregates, ast, parallel=path.parallel, index_scan=path.index_scan, limit=plan.limit, offset=plan.offset)
+        else:
+            rows = plan.table.select(plan.columns, ast, parallel=path.parallel, index_scan=path.index_scan, limit=plan.limit, offset=plan.offset,
+                                     order_by=plan.order_by, index_order=index_order, distinct=plan.distinct)
+        if cache_key is not None:
+            return self.result_cache.capture(cache_key, rows)
         return rows
 
             
@@ -0,0 +1,281 @@
+import itertools
+from typing import Any, Iterable, Iterator
+from server.database.entities.spill import SpillDirectory, SpillPartitions, SpillRun
+
+# =========================================
+# Aggregate functions of the SELECT list: COUNT(*), COUNT(col), SUM, MIN, MAX, AVG.
+# An Aggregator folds the rows of a scan into a small state instead of returning them:
+#   state = [row count, accumulator 1, accumulator 2, ...]
+# with one accumulator per distinct (sum | min | max, column) of the query (SUM(x) and
+# AVG(x) share the sum of x). States are plain lists, so a parallel scan worker can fold
+# its own range and send back only its state, which the main process merges.
+# The CSV has no NULL (an empty field is read as 0 / 0.0 / ""), so COUNT(col) = COUNT(*).
+# Over no row at all COUNT is 0 and the other functions are None (SQL NULL).
+#
+# GROUP BY runs a hash aggregation (HashAggregation): one state per group in a dict;
+# past the memory budget the partial states spill to hash partitions (spill.py), which
+# are merged one at a time at the end. Workers of a parallel scan return the partial
+# states of the groups of their range.
+# =========================================
+
+AGGREGATE_FUNCTIONS = ("count", "sum", "min", "max", "avg")
+
+# Số dòng gom lại trước khi fold theo cột (sum / min / max chạy trong C trên cả list)
+FOLD_BATCH_ROWS = 4096
+
+# Số lần chia lại tối đa một partition vẫn vượt budget (sau đó gộp trong RAM)
+MAX_SPILL_LEVELS = 3
+
+# Accumulator của từng hàm (AVG = tổng / số dòng)
+_ACCUMULATOR_KIND = {"sum": "sum", "avg": "sum", "min": "min", "max": "max"}
+
+# |giá trị| * số dòng dưới ngưỡng này thì tổng int64 của NumPy không thể tràn
+_INT64_SAFE = 1 << 63
+
+
+class Aggregate:
+    """
+    Một hàm aggregate của SELECT: func (xem AGGREGATE_FUNCTIONS), column (None với COUNT(*)).
+    """
+    def __init__(self, func: str, column: str | None):
+        self.func = func
+        self.column = column
+
+    @property
+    def label(self) -> str:
+        # Tên cột của kết quả, vd. "count(*)", "sum(salary)"
+        return f"{self.func}({self.column or '*'})"
+
+    def __eq__(self, other):
+        return isinstance(other, Aggregate) and (self.func, self.column) == (other.func, other.column)
+
+    def __hash__(self):
+        return hash((self.func, self.column))
+
+    def __repr__(self):
+        return f"Aggregate({self.label})"
+
+
+def _fold(state: list[Any], i: int, kind: str, value: Any) -> None:
+    # Cộng / lấy min / max của accumulator i với một giá trị (hoặc tổng, min, max của một batch)
+    if kind == "sum":
+        state[i] += value
+    elif state[i] is None or (value < state[i] if kind == "min" else value > state[i]):
+        state[i] = value
+
+
+class Aggregator:
+    """
+    Fold các dòng (giá trị đã cast của `columns`, theo thứ tự đó) vào state của các aggregate.
+    """
+    def __init__(self, aggregates: list[Aggregate], column_types: dict[str, str]):
+        self.aggregates = aggregates
+        self.column_types = column_types
+        # Các cột cần đọc (không trùng, theo thứ tự xuất hiện)
+        self.columns = list(dict.fromkeys(a.column for a in aggregates if a.func != "count" and a.column is not None))
+        slots: dict[tuple[str, str], int] = {}
+        for a in aggregates:
+            if a.func in _ACCUMULATOR_KIND:
+                slots.setdefault((_ACCUMULATOR_KIND[a.func], a.column), len(slots) + 1)
+        # (kind, vị trí cột trong self.columns) của từng accumulator, theo thứ tự trong state
+        self.slots = [(kind, self.columns.index(column)) for kind, column in slots]
+        self._slot_of = slots
+
+    def new_state(self) -> list[Any]:
+        return [0] + [0 if kind == "sum" else None for kind, _ in self.slots]
+
+    def add_row(self, state: list[Any], vals: Any) -> None:
+        state[0] += 1
+        for i, (kind, col) in enumerate(self.slots, 1):
+            _fold(state, i, kind, vals[col])
+
+    def add_columns(self, state: list[Any], n: int, columns: list[Any]) -> None:
+        """
+        Fold một batch n dòng cho dưới dạng cột: columns[i] là các giá trị của self.columns[i].
+        """
+        if n == 0:
+            return
+        state[0] += n
+        for i, (kind, col) in enumerate(self.slots, 1):
+            values = columns[col]
+            _fold(state, i, kind, sum(values) if kind == "sum" else min(values) if kind == "min" else max(values))
+
+    def add_rows(self, state: list[Any], rows: Iterable[Any]) -> None:
+        """
+        Fold các dòng (tuple / list theo self.columns) theo từng batch FOLD_BATCH_ROWS dòng.
+        """
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, FOLD_BATCH_ROWS))
+            if not batch:
+                return
+            self.add_columns(state, len(batch), list(zip(*batch)) if self.columns else [])
+
+    def add_arrays(self, state: list[Any], n: int, arrays: list[Any]) -> None:
+        """
+        Giống add_columns nhưng mỗi cột là một ndarray (vectorized scan trên bản có kiểu):
+        min / max / tổng int64 tính bằng NumPy, tổng float cộng tuần tự như các đường scan khác.
+        """
+        if n == 0:
+            return
+        state[0] += n
+        for i, (kind, col) in enumerate(self.slots, 1):
+            values = arrays[col]
+            if values.dtype == object:
+                values = values.tolist()
+                value = sum(values) if kind == "sum" else min(values) if kind == "min" else max(values)
+            elif kind != "sum":
+                value = values.min().item() if kind == "min" else values.max().item()
+            elif values.dtype.kind == "i" and max(abs(int(values.max())), abs(int(values.min()))) * n < _INT64_SAFE:
+                value = int(values.sum())
+            else:
+                value = sum(values.tolist())
+            _fold(state, i, kind, value)
+
+    def merge(self, state: list[Any], other: list[Any]) -> None:
+        """
+        Gộp state của một phần dữ liệu khác (vd. từ một worker của parallel scan) vào state.
+        """
+        state[0] += other[0]
+        for i, (kind, _) in enumerate(self.slots, 1):
+            if other[i] is not None:
+                _fold(state, i, kind, other[i])
+
+    def result(self, state: list[Any]) -> dict[str, Any]:
+        """
+        {label: giá trị} theo thứ tự các aggregate trong SELECT.
+        """
+        rows = state[0]
+        out: dict[str, Any] = {}
+        for a in self.aggregates:
+            if a.func == "count":
+                out[a.label] = rows
+                continue
+            if rows == 0:
+                out[a.label] = None
+                continue
+            value = state[self._slot_of[(_ACCUMULATOR_KIND[a.func], a.column)]]
+            if a.func == "avg":
+                value = value / rows
+            elif a.func == "sum" and self.column_types.get(a.column) == "float":
+                value = float(value)
+            out[a.label] = value
+        return out
+
+    def row_count_only(self) -> bool:
+        # Chỉ có COUNT: không cần đọc giá trị cột nào
+        return not self.slots
+
+
+class HashAggregation:
+    """
+    GROUP BY: bảng hash {key của nhóm: state}. Khi số nhóm vượt max_groups, mọi state
+    một phần trong bảng được ghi xuống các partition tạm (theo hash của key) rồi bảng
+    bắt đầu lại; items() gộp từng partition riêng (chia lại nếu một partition vẫn quá lớn).
+    """
+    def __init__(self, aggregator: Aggregator, key_width: int, max_groups: int | None, spill_dir: str | None = None, partitions: int = 0):
+        self.aggregator = aggregator
+        self.key_width = key_width
+        # None: không giới hạn (không bao giờ spill)
+        self.max_groups = float("inf") if max_groups is None else max(1, max_groups)
+        self.spill_dir = spill_dir
+        self.n_partitions = partitions
+        self.groups: dict[tuple, list[Any]] = {}
+        self.spilled = 0
+        self._directory: SpillDirectory | None = None
+        self._partitions: SpillPartitions | None = None
+
+    def add_rows(self, rows: Iterable[Any]) -> None:
+        """
+        Fold các dòng (giá trị của các cột GROUP BY, rồi self.aggregator.columns).
+        """
+        k = self.key_width
+        groups = self.groups
+        add_row = self.aggregator.add_row
+        new_state = self.aggregator.new_state
+        for vals in rows:
+            key = tuple(vals[:k])
+            state = groups.get(key)
+            if state is None:
+                if len(groups) >= self.max_groups:
+                    self._spill()
+                state = groups[key] = new_state()
+            add_row(state, vals[k:])
+
+    def merge(self, key: tuple, partial: list[Any]) -> None:
+        """
+        Gộp state một phần của một nhóm (vd. từ worker của parallel scan).
+        """
+        state = self.groups.get(key)
+        if state is None:
+            if len(self.groups) >= self.max_groups:
+                self._spill()
+            self.groups[key] = partial
+            return
+        self.aggregator.merge(state, partial)
+
+    def _spill(self) -> None:
+        if self._partitions is None:
+            self._directory = SpillDirectory(self.spill_dir)
+            self._partitions = SpillPartitions(self._directory, self.n_partitions)
+        for item in self.groups.items():
+            self._partitions.add(item[0], item)
+        self.spilled += len(self.groups)
+        # Xoá tại chỗ: add_rows giữ tham chiếu tới dict này
+        self.groups.clear()
+
+    def items(self) -> Iterator[tuple[tuple, list[Any]]]:
+        """
+        (key, state) của mọi nhóm (thứ tự không xác định). Đóng file tạm khi xong.
+        """
+        try:
+            if self._partitions is None:
+                yield from self.groups.items()
+                return
+            self._spill()
+            self._partitions.finish()
+            for run in self._partitions.runs:
+                yield from self._merge_run(run, 1)
+        finally:
+            self.close()
+
+    def _merge_run(self, run: SpillRun, level: int) -> Iterator[tuple[tuple, list[Any]]]:
+        merge = self.aggregator.merge
+        groups: dict[tuple, list[Any]] = {}
+        items = iter(run)
+        for key, partial in items:
+            state = groups.get(key)
+            if state is None:
+                if len(groups) >= self.max_groups and level < MAX_SPILL_LEVELS:
+                    # Partition vẫn quá lớn: chia lại theo hash khác (level) rồi gộp từng phần
+                    parts = SpillPartitions(self._directory, self.n_partitions, level)
+                    for item in itertools.chain(groups.items(), [(key, partial)], items):
+                        parts.add(item[0], item)
+                    parts.finish()
+                    groups = {}
+                    for sub in parts.runs:
+                        yield from self._merge_run(sub, level + 1)
+                    return
+                groups[key] = partial
+            else:
+                merge(state, partial)
+        yield from groups.items()
+
+    def result_rows(self, group_by: list[str]) -> Iterator[dict[str, Any]]:
+        """
+        Một dict {cột GROUP BY / label aggregate: giá trị} cho mỗi nhóm (xem items()).
+        """
+        result = self.aggregator.result
+        items = self.items()
+        try:
+            for key, state in items:
+                values = dict(zip(group_by, key))
+                values.update(result(state))
+                yield values
+        finally:
+            items.close()
+
+    def close(self) -> None:
+        if self._directory is not None:
+            self._directory.close()
+            self._directory = None
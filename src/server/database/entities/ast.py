@@ -1,5 +1,9 @@
+import copy
 from server.utils.exceptions import dpapi2_exception
 
+# Toán tử dạng từ khoá: `x IN (...)`, `x LIKE 'p%'`, `x BETWEEN a AND b` và các dạng NOT
+_KEYWORD_OPS = ('IN', 'LIKE', 'BETWEEN')
+
 # Represents a node in the expression tree.
 # Each node has a value, and optional left and right children for binary operations.
 class ExpressionNode:
@@ -37,6 +41,9 @@ class AST:
     def tokenize(self, expr):
         tokens = []
         i = 0
+        # Độ sâu ngoặc hiện tại, và độ sâu của các BETWEEN đang chờ AND của nó
+        depth = 0
+        betweens = []
         while i < len(expr):
             c = expr[i]
             # Skip whitespace characters.
@@ -46,6 +53,7 @@ class AST:
             # Handle parentheses.
             if c in '()':
                 tokens.append((c, c))
+                depth += 1 if c == '(' else -1
                 i += 1
             # Handle relational operators (e.g., <=, >=, !=, <>, =).
             elif c in ['<', '>', '!', '=']:
@@ -63,6 +71,8 @@ class AST:
                 tokens.append(('OP', c))
                 i += 1
             # Handle single-quoted string literals.
+            # The quotes are kept in the token value: downstream (LogicalValidator, Table)
+            # tells string literals apart from column identifiers by them.
             elif c == "'":
                 j = i + 1
                 while j < len(expr) and expr[j] != "'":
@@ -70,7 +80,7 @@ class AST:
                 if j >= len(expr):
                     # Raise an error if a string literal is not closed.
                     raise dpapi2_exception.ProgrammingError("Unterminated string literal")
-                tokens.append(('STRING', expr[i + 1:j]))
+                tokens.append(('STRING', expr[i:j + 1]))
                 i = j + 1
             # Handle double-quoted string literals.
             elif c == '"':
@@ -80,7 +90,7 @@ class AST:
                 if j >= len(expr):
                     # Raise an error if a string literal is not closed.
                     raise dpapi2_exception.ProgrammingError("Unterminated string literal")
-                tokens.append(('STRING', expr[i + 1:j]))
+                tokens.append(('STRING', expr[i:j + 1]))
                 i = j + 1
             # Handle numeric literals (integers and floats).
             elif c.isdigit():
@@ -108,8 +118,24 @@ class AST:
                     j += 1
                 word = expr[i:j]
                 upper_word = word.upper()
+                next_word, next_end = self._peek_word(expr, j)
+                if upper_word == 'NOT' and next_word in _KEYWORD_OPS:
+                    # x NOT IN / NOT LIKE / NOT BETWEEN: một toán tử
+                    upper_word, j = f"NOT {next_word}", next_end
+                if upper_word.split()[-1] in _KEYWORD_OPS:
+                    tokens.append(('OP', upper_word))
+                    if upper_word.endswith('IN'):
+                        # Danh sách literal của IN thành một operand duy nhất
+                        values, j = self._read_in_list(expr, j)
+                        tokens.append(('LIST', values))
+                    elif upper_word.endswith('BETWEEN'):
+                        betweens.append(depth)
+                elif upper_word == 'AND' and betweens and betweens[-1] == depth:
+                    # AND thuộc `BETWEEN a AND b`, không phải AND logic
+                    betweens.pop()
+                    tokens.append(('OP', 'BETWEEN_AND'))
                 # Check for logical keywords.
-                if upper_word in ['AND', 'OR', 'NOT']:
+                elif upper_word in ['AND', 'OR', 'NOT']:
                     tokens.append((upper_word, upper_word))
                 else:
                     # Otherwise, it's an identifier.
@@ -120,6 +146,57 @@ class AST:
                 raise dpapi2_exception.ProgrammingError(f"Invalid character '{c}' in expression")
         return tokens
 
+    @staticmethod
+    def _peek_word(expr, i):
+        # Từ tiếp theo (viết hoa) sau vị trí i và vị trí kết thúc của nó
+        while i < len(expr) and expr[i].isspace():
+            i += 1
+        j = i
+        while j < len(expr) and (expr[j].isalnum() or expr[j] == '_'):
+            j += 1
+        return expr[i:j].upper(), j
+
+    @staticmethod
+    def _read_in_list(expr, i):
+        """
+        Đọc `(literal, literal, ...)` sau IN từ vị trí i: frozenset các giá trị (chuỗi đã bỏ nháy)
+        và vị trí ngay sau ')'.
+        """
+        while i < len(expr) and expr[i].isspace():
+            i += 1
+        if i >= len(expr) or expr[i] != '(':
+            raise dpapi2_exception.ProgrammingError("IN must be followed by a parenthesized list of literals")
+        i += 1
+        values = []
+        while True:
+            while i < len(expr) and expr[i].isspace():
+                i += 1
+            if i < len(expr) and expr[i] in "'\"":
+                quote = expr[i]
+                j = expr.find(quote, i + 1)
+                if j < 0:
+                    raise dpapi2_exception.ProgrammingError("Unterminated string literal")
+                values.append(expr[i + 1:j])
+                i = j + 1
+            else:
+                j = i + 1 if i < len(expr) and expr[i] == '-' else i
+                while j < len(expr) and (expr[j].isdigit() or expr[j] == '.'):
+                    j += 1
+                raw = expr[i:j]
+                try:
+                    values.append(float(raw) if '.' in raw else int(raw))
+                except ValueError:
+                    raise dpapi2_exception.ProgrammingError(f"IN list must contain only number or string literals, near '{expr[i:i + 20]}'")
+                i = j
+            while i < len(expr) and expr[i].isspace():
+                i += 1
+            if i < len(expr) and expr[i] == ',':
+                i += 1
+                continue
+            if i < len(expr) and expr[i] == ')':
+                return frozenset(values), i + 1
+            raise dpapi2_exception.ProgrammingError("Invalid IN list: expected ',' or ')'")
+
     # Converts a list of infix tokens to postfix (Reverse Polish Notation) using the Shunting-Yard algorithm.
     def to_postfix(self, tokens):
         # Define operator precedence. Higher numbers mean higher precedence.
@@ -128,6 +205,9 @@ class AST:
             'AND': 2,
             'NOT': 3,
             '=': 4, '!=': 4, '<>': 4, '<': 4, '>': 4, '<=': 4, '>=': 4,
+            'IN': 4, 'NOT IN': 4, 'LIKE': 4, 'NOT LIKE': 4, 'BETWEEN': 4, 'NOT BETWEEN': 4,
+            # `a AND b` của BETWEEN gộp trước BETWEEN nhưng sau các phép số học
+            'BETWEEN_AND': 4.5,
             '+': 5, '-': 5,
             '*': 6, '/': 6, '%': 6
         }
@@ -135,7 +215,7 @@ class AST:
         stack = []   # Operator stack.
 
         for kind, val in tokens:
-            if kind in ('ID', 'NUMBER', 'STRING'):
+            if kind in ('ID', 'NUMBER', 'STRING', 'LIST'):
                 # Operands are added directly to the output.
                 output.append((kind, val))
             elif kind in ('OP', 'AND', 'OR', 'NOT'):
@@ -166,7 +246,7 @@ class AST:
     def build_tree(self, postfix_tokens):
         stack = []
         for kind, value in postfix_tokens:
-            if kind in ('ID', 'NUMBER', 'STRING'):
+            if kind in ('ID', 'NUMBER', 'STRING', 'LIST'):
                 # Operands become leaf nodes in the tree.
                 stack.append(ExpressionNode(value))
             elif value == 'NOT':
@@ -181,8 +261,38 @@ class AST:
                     raise dpapi2_exception.ProgrammingError(f"Missing operand for operator '{value}'")
                 right = stack.pop()  # Right operand is popped first.
                 left = stack.pop()   # Left operand is popped second.
+                if value.split()[-1] in _KEYWORD_OPS:
+                    stack.append(self._keyword_node(value, left, right))
+                    continue
                 stack.append(ExpressionNode(value, left, right)) # Create a new node with operator and its children.
         if len(stack) != 1:
             # After building, there should be exactly one node left, which is the root of the tree.
             raise dpapi2_exception.ProgrammingError("Invalid expression")
-        return stack[0]
\ No newline at end of file
+        return stack[0]
+
+    @staticmethod
+    def _keyword_node(op, left, right):
+        """
+        Node của IN / LIKE / BETWEEN (NOT x thành NOT của node đó):
+        - IN: ('IN', expr, leaf frozenset các literal);
+        - LIKE: ('LIKE', expr, leaf chuỗi pattern);
+        - BETWEEN: (expr >= a AND expr <= b), để zone map / index thấy một khoảng.
+        """
+        negated = op.startswith('NOT ')
+        op = op.split()[-1]
+        is_leaf = right.left is None and right.right is None
+        if op == 'IN':
+            if not is_leaf or not isinstance(right.value, frozenset):
+                raise dpapi2_exception.ProgrammingError("IN must be followed by a parenthesized list of literals")
+            node = ExpressionNode('IN', left, right)
+        elif op == 'LIKE':
+            v = right.value
+            if not is_leaf or not isinstance(v, str) or len(v) < 2 or v[0] != v[-1] or v[0] not in "'\"":
+                raise dpapi2_exception.ProgrammingError("LIKE pattern must be a string literal")
+            node = ExpressionNode('LIKE', left, right)
+        else:
+            if right.value != 'BETWEEN_AND' or is_leaf:
+                raise dpapi2_exception.ProgrammingError("BETWEEN must be followed by 'low AND high'")
+            # Biểu thức bên trái dùng hai lần: bản sao riêng (validator sửa node tại chỗ)
+            node = ExpressionNode('AND', ExpressionNode('>=', left, right.left), ExpressionNode('<=', copy.deepcopy(left), right.right))
+        return ExpressionNode('NOT', node, None) if negated else node
@@ -0,0 +1,434 @@
+import os
+import sys
+import mmap
+import shutil
+import secrets
+from array import array
+from typing import Any, Iterable, Iterator
+from server.database.entities.encoding import DictionaryTracker, RangeTracker, CODE_SUFFIX
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import file_signature, atomic_write_json, read_json, appended_since
+
+# =========================================
+# Columnar binary copy of a CSV table.
+#
+# Layout inside storage/<db>/ (next to metadata.json):
+#   <table>.columnar.json          manifest (columns, types, row count, CSV signature)
+#   <table>.columnar-<gen>/        one directory per generation of the copy
+#       <col>.col                  integer/float: fixed-width native int64/float64
+#       <col>.off + <col>.dat      string: uint64 offsets (row_count + 1) + utf-8 bytes
+#   or, when the column compresses well (see encoding.py):
+#       <col>.for                  integer, frame of reference: unsigned code = value - reference
+#       <col>.codes                string, dictionary: unsigned code per row, plus the sorted
+#       <col>.dict.off/.dict.dat   distinct values stored like a plain string column
+# Rows appended to the CSV after the copy was written (INSERT) stay in the CSV: the
+# copy remains usable and readers scan that byte range (ColumnarTable.appended) after it.
+# =========================================
+
+MANIFEST_VERSION = 2
+# Manifest version 1 = chưa có encoding, vẫn đọc được
+_READABLE_VERSIONS = (1, 2)
+BATCH_ROWS = 65536
+
+_FIXED_TYPECODES = {"integer": "q", "float": "d"}
+_OFFSET_TYPECODE = "Q"
+
+
+def manifest_path_for(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.columnar.json")
+
+
+class _ColumnWriter:
+    """
+    Buffers values of one column and flushes them to disk every BATCH_ROWS rows.
+    The plain files are written as the rows come; on close they are replaced by an
+    encoded form if the column turned out to be low-cardinality / narrow-range.
+    """
+    def __init__(self, directory: str, name: str, col_type: str):
+        self.name = name
+        self.col_type = col_type
+        self.directory = directory
+        self.encoding: dict[str, Any] = {}
+        self._rows = 0
+        if col_type in _FIXED_TYPECODES:
+            self.files = {"file": f"{name}.col"}
+            self._values = array(_FIXED_TYPECODES[col_type])
+            self._fh = open(os.path.join(directory, self.files["file"]), "wb")
+            self._range = RangeTracker() if col_type == "integer" else None
+        elif col_type == "string":
+            self.files = {"offsets": f"{name}.off", "data": f"{name}.dat"}
+            self._values = array(_OFFSET_TYPECODE)
+            self._chunks: list[bytes] = []
+            self._pos = 0
+            self._fh = open(os.path.join(directory, self.files["offsets"]), "wb")
+            self._data_fh = open(os.path.join(directory, self.files["data"]), "wb")
+            self._values.append(0)
+            self._range = None
+            # Id (theo thứ tự gặp) của giá trị mỗi dòng, ghi tạm ra file cho tới khi biết có dùng dictionary không
+            self._dictionary = DictionaryTracker()
+            self._ids = array("I")
+            self._ids_path = os.path.join(directory, f"{name}.ids")
+            self._ids_fh = open(self._ids_path, "wb")
+        else:
+            raise dpapi2_exception.NotSupportedError(f"Unsupported column type '{col_type}' for column '{name}'.")
+
+    def append(self, value: Any) -> None:
+        self._rows += 1
+        if self.col_type == "string":
+            raw = value.encode("utf-8")
+            self._chunks.append(raw)
+            self._pos += len(raw)
+            self._values.append(self._pos)
+            if self._dictionary.ids is not None:
+                code = self._dictionary.add(value)
+                if code is None:
+                    self._drop_ids()
+                else:
+                    self._ids.append(code)
+        else:
+            self._values.append(value)
+
+    def flush(self) -> None:
+        if self._range is not None:
+            self._range.add_many(self._values)
+        self._values.tofile(self._fh)
+        del self._values[:]
+        if self.col_type == "string":
+            self._data_fh.write(b"".join(self._chunks))
+            self._chunks = []
+            if self._ids_fh is not None:
+                self._ids.tofile(self._ids_fh)
+                del self._ids[:]
+
+    def _drop_ids(self) -> None:
+        # Quá nhiều giá trị khác nhau: cột giữ dạng plain
+        self._ids_fh.close()
+        self._ids_fh = None
+        self._ids = array("I")
+        os.remove(self._ids_path)
+
+    def close(self) -> None:
+        self.flush()
+        self._fh.close()
+        if self.col_type == "string":
+            self._data_fh.close()
+            if self._ids_fh is not None:
+                self._ids_fh.close()
+                self._ids_fh = None
+                self._encode_dictionary()
+        elif self._range is not None:
+            self._encode_reference()
+
+    def abort(self) -> None:
+        for fh in (self._fh, getattr(self, "_data_fh", None), getattr(self, "_ids_fh", None)):
+            if fh is not None:
+                fh.close()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _encode_dictionary(self) -> None:
+        plan = self._dictionary.finish(self._rows)
+        if plan is None:
+            os.remove(self._ids_path)
+            return
+        values, remap, typecode = plan
+        files = {"codes": f"{self.name}.codes", "dict_offsets": f"{self.name}.dict.off", "dict_data": f"{self.name}.dict.dat"}
+        with open(self._ids_path, "rb") as src, open(self._path(files["codes"]), "wb") as dst:
+            for ids in _read_chunks(src, "I"):
+                array(typecode, [remap[i] for i in ids]).tofile(dst)
+        offsets, data = _encode_strings(values)
+        with open(self._path(files["dict_offsets"]), "wb") as f:
+            offsets.tofile(f)
+        with open(self._path(files["dict_data"]), "wb") as f:
+            f.write(data)
+        for filename in (*self.files.values(), f"{self.name}.ids"):
+            os.remove(self._path(filename))
+        self.files = files
+        self.encoding = {"encoding": "dict", "code_type": typecode, "dict_size": len(values)}
+
+    def _encode_reference(self) -> None:
+        plan = self._range.finish()
+        if plan is None:
+            return
+        reference, typecode = plan
+        files = {"file": f"{self.name}.for"}
+        with open(self._path(self.files["file"]), "rb") as src, open(self._path(files["file"]), "wb") as dst:
+            for values in _read_chunks(src, _FIXED_TYPECODES["integer"]):
+                array(typecode, [v - reference for v in values]).tofile(dst)
+        os.remove(self._path(self.files["file"]))
+        self.files = files
+        self.encoding = {"encoding": "for", "code_type": typecode, "reference": reference, "max_code": self._range.high - reference}
+
+    def describe(self) -> dict[str, Any]:
+        return {"name": self.name, "type": self.col_type, **self.files, **self.encoding}
+
+
+def column_files(meta: dict[str, Any]) -> list[tuple[str, str | None]]:
+    """
+    (tên file, typecode hoặc None với file bytes) của một cột trong manifest.
+    """
+    if meta.get("encoding") == "dict":
+        return [(meta["codes"], meta["code_type"]), (meta["dict_offsets"], _OFFSET_TYPECODE), (meta["dict_data"], None)]
+    if meta.get("encoding") == "for":
+        return [(meta["file"], meta["code_type"])]
+    if meta["type"] == "string":
+        return [(meta["offsets"], _OFFSET_TYPECODE), (meta["data"], None)]
+    return [(meta["file"], _FIXED_TYPECODES[meta["type"]])]
+
+
+def _read_chunks(f: Any, typecode: str) -> Iterator[array]:
+    """
+    Đọc lần lượt các mảng BATCH_ROWS phần tử từ file nhị phân đang mở.
+    """
+    while True:
+        values = array(typecode)
+        try:
+            values.fromfile(f, BATCH_ROWS)
+        except EOFError:
+            # fromfile vẫn giữ phần đọc được trước khi hết file
+            pass
+        if not values:
+            return
+        yield values
+
+
+def _encode_strings(values: list[str]) -> tuple[array, bytes]:
+    """
+    Offsets (len + 1 phần tử) + bytes utf-8 của một list chuỗi.
+    """
+    raw = [v.encode("utf-8") for v in values]
+    offsets = array(_OFFSET_TYPECODE, [0])
+    pos = 0
+    for r in raw:
+        pos += len(r)
+        offsets.append(pos)
+    return offsets, b"".join(raw)
+
+
+def write_columnar(
+    db_path: str,
+    table_name: str,
+    headers: list[str],
+    column_types: dict[str, str],
+    rows: Iterable[tuple],
+    source_signature: list[int] | None,
+    source_state: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    Write typed rows (already cast, in header order) as a new generation of the
+    columnar copy, then point the manifest at it and drop the previous generation.
+    source_state: append_state of the CSV, so the copy survives appends to it.
+    """
+    manifest_path = manifest_path_for(db_path, table_name)
+    generation = f"{table_name}.columnar-{secrets.token_hex(4)}"
+    directory = os.path.join(db_path, generation)
+    os.makedirs(directory)
+
+    writers: list[_ColumnWriter] = []
+    try:
+        writers = [_ColumnWriter(directory, name, column_types[name]) for name in headers]
+        row_count = 0
+        for row in rows:
+            for writer, value in zip(writers, row):
+                writer.append(value)
+            row_count += 1
+            if row_count % BATCH_ROWS == 0:
+                for writer in writers:
+                    writer.flush()
+        for writer in writers:
+            writer.close()
+    except BaseException:
+        for writer in writers:
+            try:
+                writer.abort()
+            except Exception:
+                pass
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    previous = read_json(manifest_path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "byteorder": sys.byteorder,
+        "source": source_signature,
+        "directory": generation,
+        "row_count": row_count,
+        "columns": [writer.describe() for writer in writers],
+        **(source_state or {}),
+    }
+    atomic_write_json(manifest_path, manifest)
+
+    if previous and previous.get("directory") and previous["directory"] != generation:
+        shutil.rmtree(os.path.join(db_path, previous["directory"]), ignore_errors=True)
+    return manifest
+
+
+class ColumnarTable:
+    """
+    Read side of the columnar copy. Column files are memory-mapped lazily, so a
+    query only touches the files of the columns it actually reads.
+    """
+    def __init__(self, db_path: str, manifest: dict[str, Any]):
+        self.directory = os.path.join(db_path, manifest["directory"])
+        self.row_count: int = manifest["row_count"]
+        self.columns: dict[str, dict[str, Any]] = {c["name"]: c for c in manifest["columns"]}
+        self.headers: list[str] = [c["name"] for c in manifest["columns"]]
+        self._maps: dict[str, mmap.mmap] = {}
+        self._views: dict[str, memoryview] = {}
+        self._dictionaries: dict[str, list[str]] = {}
+        # Byte range [start, end) of CSV rows appended after the copy was written, or None
+        self.appended: tuple[int, int] | None = None
+
+    @classmethod
+    def open(cls, db_path: str, table_name: str, csv_path: str, signature: list[int] | None = None) -> "ColumnarTable | None":
+        """
+        Return the columnar copy of a table, or None if there is none or it was built
+        from a different version of the CSV file. A CSV that only had rows appended
+        since still matches; those rows are then described by `appended`.
+        signature: file_signature of the CSV to match (default: the current one).
+        """
+        manifest = read_json(manifest_path_for(db_path, table_name))
+        if not manifest or manifest.get("version") not in _READABLE_VERSIONS:
+            return None
+        if manifest.get("byteorder") != sys.byteorder:
+            return None
+        signature = file_signature(csv_path) if signature is None else signature
+        appended = None
+        if manifest.get("source") != signature:
+            if not appended_since(csv_path, manifest, signature):
+                return None
+            appended = (manifest["size"], signature[1])
+        if not os.path.isdir(os.path.join(db_path, manifest["directory"])):
+            return None
+        columnar = cls(db_path, manifest)
+        columnar.appended = appended
+        return columnar
+
+    def _view(self, filename: str, typecode: str | None) -> memoryview | mmap.mmap | None:
+        key = f"{filename}:{typecode}"
+        if key in self._views:
+            return self._views[key]
+        path = os.path.join(self.directory, filename)
+        if os.path.getsize(path) == 0:
+            return None
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), length=0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as e:
+            raise dpapi2_exception.InternalError(f"Cannot memory-map column file '{path}'.") from e
+        self._maps[key] = mm
+        view = memoryview(mm).cast(typecode) if typecode else memoryview(mm)
+        self._views[key] = view
+        return view
+
+    def fixed_view(self, name: str) -> memoryview | None:
+        """
+        Zero-copy typed view (int64/float64) over a plain numeric column; None if empty.
+        """
+        meta = self.columns[name]
+        return self._view(meta["file"], _FIXED_TYPECODES[meta["type"]])
+
+    def encoding(self, name: str) -> str | None:
+        """
+        "dict" / "for" nếu cột được encode (xem encoding.py), None nếu plain.
+        """
+        return self.columns[name].get("encoding")
+
+    def encodings(self) -> dict[str, tuple]:
+        """
+        Mô tả encoding của các cột đã encode, dạng encoding.code_predicates cần.
+        """
+        result: dict[str, tuple] = {}
+        for name, meta in self.columns.items():
+            if meta.get("encoding") == "dict":
+                result[name] = ("dict", self.dictionary(name))
+            elif meta.get("encoding") == "for":
+                result[name] = ("for", meta["reference"], meta["max_code"])
+        return result
+
+    def code_view(self, name: str) -> memoryview | None:
+        """
+        Zero-copy view over the unsigned codes of an encoded column; None if empty.
+        """
+        meta = self.columns[name]
+        return self._view(meta["codes"] if meta["encoding"] == "dict" else meta["file"], meta["code_type"])
+
+    def dictionary(self, name: str) -> list[str]:
+        """
+        Các giá trị (đã sort) của cột dictionary; decode một lần rồi giữ lại.
+        """
+        values = self._dictionaries.get(name)
+        if values is None:
+            meta = self.columns[name]
+            offsets = self._view(meta["dict_offsets"], _OFFSET_TYPECODE)
+            data = self._view(meta["dict_data"], None)
+            offsets = offsets.tolist() if offsets is not None else [0]
+            chunk = bytes(data) if data is not None else b""
+            values = [chunk[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+            self._dictionaries[name] = values
+        return values
+
+    def read_batch(self, name: str, start: int, stop: int) -> list[Any]:
+        """
+        Decode rows [start, stop) of one column into Python values.
+        "<column>#code" đọc code (chưa decode) của một cột đã encode.
+        """
+        if start >= stop:
+            return []
+        if name.endswith(CODE_SUFFIX):
+            return self.code_view(name[:-len(CODE_SUFFIX)])[start:stop].tolist()
+        meta = self.columns[name]
+        if meta.get("encoding") == "dict":
+            values = self.dictionary(name)
+            return [values[c] for c in self.code_view(name)[start:stop].tolist()]
+        if meta.get("encoding") == "for":
+            reference = meta["reference"]
+            return [reference + c for c in self.code_view(name)[start:stop].tolist()]
+        if meta["type"] in _FIXED_TYPECODES:
+            return self.fixed_view(name)[start:stop].tolist()
+
+        offsets = self._view(meta["offsets"], _OFFSET_TYPECODE)[start:stop + 1].tolist()
+        data = self._view(meta["data"], None)
+        base = offsets[0]
+        chunk = bytes(data[base:offsets[-1]]) if data is not None else b""
+        return [
+            chunk[offsets[i] - base:offsets[i + 1] - base].decode("utf-8")
+            for i in range(stop - start)
+        ]
+
+    def iter_batches(self, names: list[str], batch_rows: int | None = None, first: int = 0, last: int | None = None) -> Iterator[list[list[Any]]]:
+        """
+        Yield, per batch of rows, one list of values for each requested column.
+        Only rows [first, last) are read (last=None: up to the end of the table).
+        batch_rows: size of the first batch (default BATCH_ROWS); later batches double
+        up to BATCH_ROWS, so a LIMIT query does not decode a full batch it won't use.
+        """
+        last = self.row_count if last is None else min(last, self.row_count)
+        start = first
+        size = min(batch_rows or BATCH_ROWS, BATCH_ROWS)
+        while start < last:
+            stop = min(start + size, last)
+            yield [self.read_batch(name, start, stop) for name in names]
+            start = stop
+            size = min(size * 2, BATCH_ROWS)
+
+    def iter_rows(self, names: list[str], first: int = 0, last: int | None = None, batch_rows: int | None = None) -> Iterator[tuple]:
+        if not names:
+            last = self.row_count if last is None else min(last, self.row_count)
+            yield from (() for _ in range(max(0, last - first)))
+            return
+        for batch in self.iter_batches(names, batch_rows, first, last):
+            yield from zip(*batch)
+
+    def close(self) -> None:
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+        for mm in self._maps.values():
+            try:
+                mm.close()
+            except Exception:
+                pass
+        self._maps.clear()
+        self._dictionaries.clear()
@@ -1,8 +1,11 @@
 from server.database.entities.table import Table
+from server.database.entities import wal
 from server.config.settings import STORAGE_FOLDER
 from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import file_signature
 import os
 import json
+import threading
 
 class DB:
     def __init__(self, db_name: str):
@@ -10,6 +13,9 @@ class DB:
         self.db_path = os.path.join(STORAGE_FOLDER, db_name)
         self.meta_file = os.path.join(self.db_path, 'metadata.json')
         self.tables: dict[str, Table] = {}
+        # Signature của metadata.json lúc load: đổi khi metadata.json bị sửa (plan cache dùng làm key)
+        self.catalog_version: tuple[int, ...] | None = None
+        self._reload_lock = threading.Lock()
 
         if not os.path.exists(self.db_path):
             raise dpapi2_exception.DatabaseError(f"Database folder '{self.db_path}' does not exist.")
@@ -17,9 +23,10 @@ class DB:
         self.load_db()
 
     def load_db(self):
+        signature = file_signature(self.meta_file)
         try:
             with open(self.meta_file, "r", encoding="utf-8") as f:
-                self.meta_data = json.load(f)
+                meta_data = json.load(f)
         except FileNotFoundError:
             raise dpapi2_exception.DatabaseError(f"Metadata file not found for database '{self.db_name}'.")
         except json.JSONDecodeError as e:
@@ -27,25 +34,50 @@ class DB:
         except Exception as e:
             raise dpapi2_exception.InternalError(f"Unexpected error loading metadata: {e}") from e
 
-        for table_name in self.meta_data[self.db_name]:
+        # Build bộ bảng mới rồi mới thay, query đang chạy vẫn dùng bộ cũ nhất quán
+        tables: dict[str, Table] = {}
+        for table_name in meta_data[self.db_name]:
             try:
-                self.load_table(table_name)
+                tables[table_name] = self.load_table(table_name, meta_data)
             except Exception as e:
                 raise dpapi2_exception.DatabaseError(f"Failed to load table '{table_name}' from DB '{self.db_name}': {e}") from e
 
-    def load_table(self, table_name: str):
+        # INSERT đã commit vào WAL nhưng chưa kịp ghi vào CSV trước khi process dừng
+        for table in tables.values():
+            try:
+                wal.logs.recover(table)
+            except Exception as e:
+                raise dpapi2_exception.DatabaseError(f"Failed to recover write-ahead log of table '{table.name}': {e}") from e
+
+        self.meta_data = meta_data
+        self.tables = tables
+        self.catalog_version = tuple(signature) if signature else None
+
+    def refresh(self) -> None:
+        """
+        Load lại metadata.json (và các Table) nếu file đã đổi từ lần load trước.
+        """
+        signature = file_signature(self.meta_file)
+        if signature is not None and tuple(signature) == self.catalog_version:
+            return
+        with self._reload_lock:
+            signature = file_signature(self.meta_file)
+            if signature is None or tuple(signature) != self.catalog_version:
+                self.load_db()
+
+    def load_table(self, table_name: str, meta_data: dict | None = None) -> Table:
+        meta_data = self.meta_data if meta_data is None else meta_data
         try:
-            columns_metadata = self.meta_data[self.db_name][table_name]
+            columns_metadata = meta_data[self.db_name][table_name]
         except KeyError:
             raise dpapi2_exception.DatabaseError(f"Metadata for table '{table_name}' not found.")
 
         try:
-            table = Table(
+            return Table(
                 table_name = table_name,
                 db_name = self.db_name,
                 columns_metadata = columns_metadata
             )
-            self.tables[table_name] = table
         except Exception as e:
             raise dpapi2_exception.InternalError(f"Failed to initialize Table object for '{table_name}': {e}") from e
 
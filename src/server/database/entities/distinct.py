@@ -0,0 +1,79 @@
+from typing import Any, Iterable, Iterator
+from server.database.entities.spill import SpillDirectory, SpillPartitions, SpillRun
+
+# =========================================
+# SELECT DISTINCT over a stream of result rows (dicts), applied after the WHERE filter
+# (and after GROUP BY), before ORDER BY / LIMIT. Streaming hash deduplication:
+#   - while the set of seen rows holds fewer than `memory_rows` rows, a row is yielded
+#     the first time it is seen, so the first rows come out as soon as the scan finds them
+#     and a LIMIT stops the scan early;
+#   - once the set is full it stops growing: a row found in it is a duplicate, any other
+#     row goes to a hash partition on disk (spill.SpillPartitions). Those rows were never
+#     yielded, and equal rows land in the same partition, so at the end each partition is
+#     deduplicated on its own (split again with another hash if it is still too big).
+# =========================================
+
+# Số lần chia lại tối đa một partition vẫn vượt budget (sau đó khử trùng trong RAM)
+MAX_DISTINCT_LEVELS = 3
+
+
+def distinct_rows(rows: Iterable[dict[str, Any]], names: list[str] | None, memory_rows: int, spill_dir: str, partitions: int) -> Iterator[dict[str, Any]]:
+    """
+    Các dòng khác nhau của rows trên các cột `names` (dict chỉ gồm các cột đó; None: mọi
+    cột của dòng), theo thứ tự xuất hiện đầu tiên cho tới khi vượt memory_rows. Đóng rows khi xong.
+    """
+    memory_rows = max(1, memory_rows)
+    seen: set[tuple] = set()
+    directory: SpillDirectory | None = None
+    spilled: SpillPartitions | None = None
+    try:
+        for row in rows:
+            if names is None:
+                names = list(row)
+            key = tuple([row[name] for name in names])
+            if key in seen:
+                continue
+            if len(seen) < memory_rows:
+                seen.add(key)
+                yield dict(zip(names, key))
+                continue
+            if spilled is None:
+                directory = SpillDirectory(spill_dir)
+                spilled = SpillPartitions(directory, partitions)
+            spilled.add(key, key)
+        if spilled is None:
+            return
+        # Các dòng đã spill đều không có trong seen: giải phóng set trước khi đọc lại các partition
+        seen.clear()
+        spilled.finish()
+        for run in spilled.runs:
+            for key in _distinct_run(run, memory_rows, directory, partitions, 1):
+                yield dict(zip(names, key))
+    finally:
+        if hasattr(rows, "close"):
+            rows.close()
+        if directory is not None:
+            directory.close()
+
+
+def _distinct_run(run: SpillRun, memory_rows: int, directory: SpillDirectory, partitions: int, level: int) -> Iterator[tuple]:
+    seen: set[tuple] = set()
+    keys = iter(run)
+    for key in keys:
+        if key in seen:
+            continue
+        if len(seen) >= memory_rows and level < MAX_DISTINCT_LEVELS:
+            # Partition vẫn quá lớn: chia phần chưa đọc theo hash khác; các key đã yield
+            # không bị yield lại vì mỗi partition con chỉ nhận key chưa có trong seen
+            parts = SpillPartitions(directory, partitions, level)
+            parts.add(key, key)
+            for rest in keys:
+                if rest not in seen:
+                    parts.add(rest, rest)
+            parts.finish()
+            seen.clear()
+            for sub in parts.runs:
+                yield from _distinct_run(sub, memory_rows, directory, partitions, level + 1)
+            return
+        seen.add(key)
+        yield key
@@ -0,0 +1,188 @@
+import bisect
+from array import array
+from typing import Any
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import column_comparison, in_list
+
+# =========================================
+# Compact encodings of the columnar / resident copies of a table.
+#
+# Dictionary (string columns with few distinct values): the distinct values sorted,
+# stored once, and one small unsigned code per row. Codes follow the sort order of the
+# values, so =, !=, <, <=, >, >= against a literal become comparisons on the codes.
+#
+# Frame of reference (integer columns): value = reference + code, with reference the
+# column minimum and code the narrowest unsigned type that holds max - min.
+#
+# WHERE comparisons `column op literal` on an encoded column are rewritten once per
+# query into comparisons on the pseudo-column "<column>#code" (see code_predicates),
+# so filters read the codes and never decode the values they reject.
+# =========================================
+
+# Dictionary chỉ dùng khi số giá trị khác nhau <= DICT_MAX_ENTRIES (code tối đa 2 byte)
+# và <= DICT_MAX_FRACTION số dòng của bảng
+DICT_MAX_ENTRIES = 1 << 16
+DICT_MAX_FRACTION = 0.5
+
+CODE_SUFFIX = "#code"
+
+
+def code_column(column: str) -> str:
+    return f"{column}{CODE_SUFFIX}"
+
+
+def code_typecode(max_code: int) -> str | None:
+    """
+    Typecode array unsigned nhỏ nhất chứa được max_code (None nếu cần 8 byte, không lợi gì).
+    """
+    for typecode in ("B", "H", "I"):
+        if max_code < 1 << (8 * array(typecode).itemsize):
+            return typecode
+    return None
+
+
+class DictionaryTracker:
+    """
+    Gán id theo thứ tự gặp cho các giá trị của một cột chuỗi; bỏ cuộc khi vượt DICT_MAX_ENTRIES.
+    """
+    def __init__(self):
+        self.ids: dict[str, int] | None = {}
+
+    def add(self, value: str) -> int | None:
+        ids = self.ids
+        if ids is None:
+            return None
+        code = ids.get(value)
+        if code is None:
+            if len(ids) >= DICT_MAX_ENTRIES:
+                self.ids = None
+                return None
+            code = ids[value] = len(ids)
+        return code
+
+    def finish(self, row_count: int) -> tuple[list[str], list[int], str] | None:
+        """
+        (dictionary đã sort, remap id theo thứ tự gặp -> code, typecode của code),
+        hoặc None nếu cột không nên dictionary-encode.
+        """
+        ids = self.ids
+        if not ids or len(ids) > row_count * DICT_MAX_FRACTION:
+            return None
+        values = sorted(ids)
+        remap = [0] * len(values)
+        for code, value in enumerate(values):
+            remap[ids[value]] = code
+        return values, remap, code_typecode(len(values) - 1)
+
+
+class RangeTracker:
+    """
+    Min / max của một cột integer, để chọn frame of reference.
+    """
+    def __init__(self):
+        self.low: int | None = None
+        self.high: int | None = None
+
+    def add_many(self, values: Any) -> None:
+        if len(values) == 0:
+            return
+        low, high = min(values), max(values)
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+
+    def finish(self) -> tuple[int, str] | None:
+        """
+        (reference, typecode của code), hoặc None nếu không thu nhỏ được.
+        """
+        if self.low is None:
+            return None
+        typecode = code_typecode(self.high - self.low)
+        if typecode is None:
+            return None
+        return self.low, typecode
+
+
+def _translate_dictionary(dictionary: list[str], op: str, value: str) -> tuple[str, int] | bool:
+    # Code giữ thứ tự của giá trị: so sánh với literal = so sánh code với vị trí của literal
+    if op in ("=", "!="):
+        i = bisect.bisect_left(dictionary, value)
+        if i < len(dictionary) and dictionary[i] == value:
+            return op, i
+        return op == "!="
+    if op == "<":
+        return "<", bisect.bisect_left(dictionary, value)
+    if op == "<=":
+        return "<", bisect.bisect_right(dictionary, value)
+    if op == ">":
+        return ">=", bisect.bisect_right(dictionary, value)
+    return ">=", bisect.bisect_left(dictionary, value)
+
+
+def _translate_reference(reference: int, max_code: int, op: str, value: int | float) -> tuple[str, int | float] | bool:
+    # column op value  <=>  code op (value - reference), code trong [0, max_code]
+    target = value - reference
+    if target < 0:
+        return op in ("!=", ">", ">=")
+    if target > max_code:
+        return op in ("!=", "<", "<=")
+    return op, target
+
+
+def _translate_members(encoding: tuple, values: frozenset) -> frozenset | None:
+    # Tập code của các giá trị IN có trong miền của cột (None: không dịch được, giữ nguyên)
+    if encoding[0] == "dict":
+        dictionary = encoding[1]
+        if not all(isinstance(v, str) for v in values):
+            return None
+        codes = set()
+        for value in values:
+            i = bisect.bisect_left(dictionary, value)
+            if i < len(dictionary) and dictionary[i] == value:
+                codes.add(i)
+        return frozenset(codes)
+    reference, max_code = encoding[1], encoding[2]
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    return frozenset(v - reference for v in values if 0 <= v - reference <= max_code)
+
+
+def code_predicates(ast: Any, column_types: dict[str, str], encodings: dict[str, Any]) -> tuple[Any, dict[str, str]]:
+    """
+    Viết lại các so sánh `column op literal` (và `column IN (...)`) trên cột đã encode thành
+    so sánh trên "<column>#code" (hoặc hằng True / False nếu literal nằm ngoài miền giá trị).
+    encodings: {column: ("dict", dictionary) | ("for", reference, max_code)}.
+    Trả về (AST mới, column_types có thêm các cột code). AST gốc không bị sửa.
+    """
+    types = dict(column_types)
+    if ast is None or not encodings:
+        return ast, types
+
+    def rewrite(n: ExpressionNode) -> ExpressionNode:
+        if n is None or (n.left is None and n.right is None):
+            return n
+        members = in_list(n, column_types)
+        if members is not None and members[0] in encodings:
+            column, values = members
+            codes = _translate_members(encodings[column], values)
+            if codes is not None:
+                if not codes:
+                    return ExpressionNode(False)
+                types[code_column(column)] = "integer"
+                return ExpressionNode(n.value, ExpressionNode(code_column(column)), ExpressionNode(codes))
+        comparison = column_comparison(n, column_types)
+        if comparison is not None and comparison[0] in encodings:
+            column, op, value = comparison
+            encoding = encodings[column]
+            translated = None
+            if encoding[0] == "dict" and isinstance(value, str):
+                translated = _translate_dictionary(encoding[1], op, value)
+            elif encoding[0] == "for" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                translated = _translate_reference(encoding[1], encoding[2], op, value)
+            if isinstance(translated, bool):
+                return ExpressionNode(translated)
+            if translated is not None:
+                types[code_column(column)] = "integer"
+                return ExpressionNode(translated[0], ExpressionNode(code_column(column)), ExpressionNode(translated[1]))
+        return ExpressionNode(n.value, rewrite(n.left), rewrite(n.right))
+
+    return rewrite(ast), types
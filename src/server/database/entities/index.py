@@ -0,0 +1,483 @@
+import os
+import sys
+import mmap
+import bisect
+import hashlib
+import operator
+import itertools
+from array import array
+from typing import Any, Iterator
+from server.database.entities.predicates import conjuncts, column_comparison, in_list, sorted_members
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import atomic_write_bytes, atomic_write_json, read_json, append_state, appended_since
+
+try:
+    import numpy as np
+except ImportError:  # NumPy không bắt buộc: extend hash index bằng Python thuần
+    np = None
+
+# =========================================
+# Secondary indexes declared per column in metadata.json, e.g.
+#   {"name": "id", "type": "integer", "index": "sorted"}
+#
+# Sorted index (integer/float columns): a static, read-only equivalent of a B-tree
+# leaf level -- every (key, row byte offset) pair of the CSV sorted by key, stored as
+#   <table>.<column>.sorted.keys   int64/float64 keys, ascending
+#   <table>.<column>.sorted.offs   uint64 byte offset of the row in <table>.csv
+#   <table>.<column>.sorted.json   description + signature of the CSV it indexes
+# Range lookups are two binary searches over the memory-mapped keys.
+# `col IN (v1, v2, ...)` is a set of point lookups (two binary searches per value).
+#
+# Hash index (any column, equality only): open hashing laid out flat on disk
+#   <table>.<column>.hash.buckets  uint64 start of each bucket in .entries (n_buckets + 1)
+#   <table>.<column>.hash.entries  uint64 pairs (64-bit key hash, row byte offset), by bucket
+#   <table>.<column>.hash.json     description + signature of the CSV it indexes
+# A point lookup reads one bucket, i.e. O(1) pages whatever the table size;
+# `col IN (...)` reads one bucket per value.
+#
+# When the CSV only grew by appended rows (INSERT, see wal.py) an index is extended
+# instead of rebuilt: only the appended bytes are parsed, their entries are merged into
+# the existing arrays (a hash index is re-bucketed from its stored hashes when it
+# outgrows its bucket count), like the row offset index (row_index.py).
+# =========================================
+
+INDEX_VERSION = 1
+
+_KEY_TYPECODES = {"integer": "q", "float": "d"}
+_OFFSET_TYPECODE = "Q"
+
+# Toán tử có thể dùng index (sargable)
+SARGABLE_OPS = {"=", "<", "<=", ">", ">="}
+
+
+def index_base_path(db_path: str, table_name: str, column: str, kind: str) -> str:
+    return os.path.join(db_path, f"{table_name}.{column}.{kind}")
+
+
+def _map_array(path: str, typecode: str) -> tuple[mmap.mmap | None, Any]:
+    """
+    Memory-map a binary array file; (None, empty array) for an empty file.
+    """
+    if os.path.getsize(path) == 0:
+        return None, array(typecode)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), length=0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast(typecode)
+
+
+class KeyRange:
+    """
+    Khoảng key [low, high] (mỗi đầu có thể mở / không giới hạn) trên một cột;
+    values: tập giá trị rời rạc của `column IN (...)` (None: mọi key trong khoảng).
+    """
+    def __init__(self, column: str):
+        self.column = column
+        self.low: Any = None
+        self.low_inclusive = True
+        self.high: Any = None
+        self.high_inclusive = True
+        self.values: frozenset | None = None
+        self.empty = False
+
+    def restrict(self, values: frozenset) -> None:
+        """
+        Giao với điều kiện `column IN values`: tập giá trị, và khoảng [min, max] của nó.
+        """
+        self.values = values if self.values is None else self.values & values
+        if not self.values:
+            self.empty = True
+            return
+        ordered = sorted_members(self.values)
+        self.narrow(">=", ordered[0])
+        self.narrow("<=", ordered[-1])
+
+    def members(self) -> list[Any]:
+        """
+        Các giá trị của values nằm trong khoảng, tăng dần ([] nếu khoảng rỗng).
+        """
+        if self.empty or self.values is None:
+            return []
+        return [
+            v for v in sorted_members(self.values)
+            if (self.low is None or v > self.low or (v == self.low and self.low_inclusive))
+            and (self.high is None or v < self.high or (v == self.high and self.high_inclusive))
+        ]
+
+    def narrow(self, op: str, value: Any) -> None:
+        """
+        Giao khoảng hiện tại với điều kiện `column op value`.
+        """
+        if op in ("=", ">", ">="):
+            inclusive = op != ">"
+            if self.low is None or value > self.low or (value == self.low and not inclusive):
+                self.low, self.low_inclusive = value, inclusive
+        if op in ("=", "<", "<="):
+            inclusive = op != "<"
+            if self.high is None or value < self.high or (value == self.high and not inclusive):
+                self.high, self.high_inclusive = value, inclusive
+        if self.low is not None and self.high is not None:
+            if self.low > self.high or (self.low == self.high and not (self.low_inclusive and self.high_inclusive)):
+                self.empty = True
+
+    def __repr__(self):
+        lo = "(" if not self.low_inclusive else "["
+        hi = ")" if not self.high_inclusive else "]"
+        if self.values is not None:
+            return f"{self.column} in {len(self.values)} values of {lo}{self.low}, {self.high}{hi}"
+        return f"{self.column} in {lo}{self.low}, {self.high}{hi}"
+
+
+def key_ranges(ast: Any, column_types: dict[str, str], columns: set[str]) -> dict[str, KeyRange]:
+    """
+    Gom các conjunct sargable (`col op literal`, op trong SARGABLE_OPS, và `col IN (...)`)
+    trên các cột trong `columns` thành một KeyRange cho mỗi cột.
+    """
+    ranges: dict[str, KeyRange] = {}
+    for term in conjuncts(ast):
+        members = in_list(term, column_types)
+        if members is not None:
+            column, values = members
+            if column in columns and all(isinstance(v, str) == (column_types[column] == "string") for v in values):
+                ranges.setdefault(column, KeyRange(column)).restrict(values)
+            continue
+        comparison = column_comparison(term, column_types)
+        if comparison is None:
+            continue
+        column, op, value = comparison
+        if column not in columns or op not in SARGABLE_OPS:
+            continue
+        if isinstance(value, str) != (column_types[column] == "string"):
+            continue
+        ranges.setdefault(column, KeyRange(column)).narrow(op, value)
+    return ranges
+
+
+def build_sorted_index(table: Any, column: str, previous: "SortedIndex | None" = None) -> dict[str, Any]:
+    """
+    Build sorted index của một cột số: sort (key, offset) rồi ghi hai file mảng.
+    previous: index cũ còn đúng cho phần đầu file, chỉ đọc các dòng được append sau nó
+    rồi trộn vào các mảng cũ.
+    """
+    col_type = table.column_types.get(column)
+    if col_type not in _KEY_TYPECODES:
+        raise dpapi2_exception.NotSupportedError(
+            f"Sorted index requires an integer or float column, '{column}' is '{col_type}'."
+        )
+    signature = table.csv_signature()
+    if signature is None:
+        raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{table.csv_path}'.")
+    headers = table.read_headers()
+    idx = headers.index(column)
+    cast = table._type_to_cast_fn[col_type]
+    start = None if previous is None else previous.size
+    pairs = sorted((cast(vals[idx]), row) for row, _, vals in table.iter_row_offsets(start=start, end=signature[1]))
+
+    keys = array(_KEY_TYPECODES[col_type])
+    offs = array(_OFFSET_TYPECODE)
+    if previous is None:
+        keys.extend(k for k, _ in pairs)
+        offs.extend(o for _, o in pairs)
+    else:
+        # Dòng mới có offset lớn hơn mọi dòng cũ: đứng sau các key bằng nó (bisect_right)
+        last = 0
+        for key, offset in pairs:
+            pos = bisect.bisect_right(previous.keys, key, last)
+            keys.frombytes(previous.keys[last:pos].tobytes())
+            offs.frombytes(previous.offsets[last:pos].tobytes())
+            keys.append(key)
+            offs.append(offset)
+            last = pos
+        keys.frombytes(previous.keys[last:previous.count].tobytes())
+        offs.frombytes(previous.offsets[last:previous.count].tobytes())
+
+    base = index_base_path(table.db_path, table.name, column, "sorted")
+    atomic_write_bytes(f"{base}.keys", keys.tobytes())
+    atomic_write_bytes(f"{base}.offs", offs.tobytes())
+    meta = {
+        "version": INDEX_VERSION,
+        "kind": "sorted",
+        "column": column,
+        "type": col_type,
+        "byteorder": sys.byteorder,
+        "source": signature,
+        "count": len(keys),
+        **append_state(table.csv_path, signature[1]),
+    }
+    atomic_write_json(f"{base}.json", meta)
+    return meta
+
+
+def _open_index(cls: Any, table: Any, column: str, kind: str, build: Any) -> Any:
+    """
+    Mở index của cột: None nếu chưa build / CSV đã đổi khác ngoài việc được append;
+    extend (build với previous) nếu CSV chỉ được append thêm dòng từ lúc build.
+    """
+    base = index_base_path(table.db_path, table.name, column, kind)
+    meta = read_json(f"{base}.json")
+    if not meta or meta.get("version") != INDEX_VERSION or meta.get("byteorder") != sys.byteorder:
+        return None
+    signature = table.csv_signature()
+    if meta.get("source") != signature and not appended_since(table.csv_path, meta, signature):
+        return None
+    try:
+        index = cls(base, meta)
+    except (OSError, ValueError, KeyError):
+        return None
+    if meta["source"] == signature:
+        return index
+    build(table, column, index)
+    try:
+        return cls(base, read_json(f"{base}.json"))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+class SortedIndex:
+    def __init__(self, base: str, meta: dict[str, Any]):
+        self.column: str = meta["column"]
+        self.count: int = meta["count"]
+        self.source = meta["source"]
+        # Số byte đầu của CSV đã được index (None: sidecar cũ, không extend được)
+        self.size: int | None = meta.get("size")
+        self._keys_mm, self.keys = _map_array(f"{base}.keys", _KEY_TYPECODES[meta["type"]])
+        self._offs_mm, self.offsets = _map_array(f"{base}.offs", _OFFSET_TYPECODE)
+
+    @classmethod
+    def open(cls, table: Any, column: str) -> "SortedIndex | None":
+        """
+        Index của cột (extend nếu CSV chỉ được append), hoặc None nếu chưa build / CSV
+        đã đổi theo cách khác từ lúc build.
+        """
+        return _open_index(cls, table, column, "sorted", build_sorted_index)
+
+    def bounds(self, key_range: KeyRange) -> tuple[int, int]:
+        """
+        [lo, hi) vị trí trong mảng keys thỏa key_range (hai lần binary search).
+        """
+        if key_range.empty:
+            return 0, 0
+        lo, hi = 0, self.count
+        if key_range.low is not None:
+            search = bisect.bisect_left if key_range.low_inclusive else bisect.bisect_right
+            lo = search(self.keys, key_range.low)
+        if key_range.high is not None:
+            search = bisect.bisect_right if key_range.high_inclusive else bisect.bisect_left
+            hi = search(self.keys, key_range.high)
+        return lo, max(lo, hi)
+
+    def matched(self, key_range: KeyRange) -> int:
+        """
+        Số dòng thỏa key_range (tính cả values của IN).
+        """
+        if key_range.values is not None:
+            return sum(hi - lo for lo, hi in self.member_bounds(key_range))
+        lo, hi = self.bounds(key_range)
+        return hi - lo
+
+    def member_bounds(self, key_range: KeyRange) -> list[tuple[int, int]]:
+        """
+        [lo, hi) của từng giá trị trong key_range.members() (key_range có values).
+        """
+        bounds = []
+        for value in key_range.members():
+            lo = bisect.bisect_left(self.keys, value)
+            hi = bisect.bisect_right(self.keys, value, lo)
+            if hi > lo:
+                bounds.append((lo, hi))
+        return bounds
+
+    def row_offsets(self, lo: int, hi: int) -> list[int]:
+        """
+        Byte offset của các dòng trong [lo, hi), sắp theo thứ tự trong file.
+        """
+        return sorted(self.offsets[lo:hi].tolist())
+
+    def ordered_offsets(self, lo: int, hi: int, descending: bool = False, chunk: int = 4096) -> Iterator[int]:
+        """
+        Byte offset của các dòng trong [lo, hi) theo thứ tự key (giảm dần nếu descending),
+        đọc lười từng đoạn `chunk` vị trí (ORDER BY ... LIMIT chỉ cần vài dòng đầu).
+        """
+        if not descending:
+            for start in range(lo, hi, chunk):
+                yield from self.offsets[start:min(hi, start + chunk)].tolist()
+            return
+        for end in range(hi, lo, -chunk):
+            yield from reversed(self.offsets[max(lo, end - chunk):end].tolist())
+
+
+def hash_key(col_type: str, value: Any) -> bytes | None:
+    """
+    Bytes được hash cho một giá trị (đã cast như Table.select) của cột.
+    None nếu literal không thể bằng giá trị nào của cột (vd. 1.5 với cột integer).
+    """
+    if col_type == "integer":
+        if isinstance(value, float):
+            if not value.is_integer():
+                return None
+            value = int(value)
+        return str(value).encode("utf-8")
+    if col_type == "float":
+        return repr(float(value)).encode("utf-8")
+    return str(value).encode("utf-8")
+
+
+def _hash64(key: bytes) -> int:
+    # Hash ổn định giữa các process (hash() của Python bị random hoá theo process)
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _shift_buckets(buckets: Any, added: list[int]) -> array:
+    """
+    Mảng bucket sau khi thêm một entry vào cuối mỗi bucket trong added: cuối bucket b
+    dời thêm số entry mới của các bucket <= b.
+    """
+    n_buckets = len(buckets) - 1
+    if np is not None:
+        counts = np.bincount(np.array(added, dtype=np.int64), minlength=n_buckets).astype(np.uint64)
+        shifted = np.frombuffer(buckets, dtype=np.uint64, offset=8) + np.cumsum(counts, dtype=np.uint64)
+        return array(_OFFSET_TYPECODE, [0]) + array(_OFFSET_TYPECODE, shifted.tobytes())
+    counts = [0] * n_buckets
+    for bucket in added:
+        counts[bucket] += 1
+    shifted = array(_OFFSET_TYPECODE, [0])
+    shifted.extend(map(operator.add, buckets[1:].tolist(), itertools.accumulate(counts)))
+    return shifted
+
+
+def build_hash_index(table: Any, column: str, previous: "HashIndex | None" = None) -> dict[str, Any]:
+    """
+    Build hash index của một cột: nhóm (hash, offset) theo bucket rồi ghi hai file mảng.
+    previous: index cũ còn đúng cho phần đầu file, chỉ đọc các dòng được append sau nó.
+    """
+    col_type = table.column_types[column]
+    signature = table.csv_signature()
+    if signature is None:
+        raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{table.csv_path}'.")
+    headers = table.read_headers()
+    idx = headers.index(column)
+    cast = table._type_to_cast_fn[col_type]
+    start = None if previous is None else previous.size
+    entries = [
+        (_hash64(hash_key(col_type, cast(vals[idx]))), row)
+        for row, _, vals in table.iter_row_offsets(start=start, end=signature[1])
+    ]
+
+    if previous is not None and previous.count + len(entries) <= previous.n_buckets:
+        # Còn đủ bucket: chèn entry mới vào cuối bucket của nó (offset lớn hơn mọi dòng cũ)
+        n_buckets = previous.n_buckets
+        entries.sort(key=lambda e: (e[0] % n_buckets, e[1]))
+        flat = array(_OFFSET_TYPECODE)
+        last = 0
+        for h, offset in entries:
+            pos = previous.buckets[h % n_buckets + 1]
+            flat.frombytes(previous.entries[2 * last:2 * pos].tobytes())
+            flat.append(h)
+            flat.append(offset)
+            last = pos
+        flat.frombytes(previous.entries[2 * last:2 * previous.count].tobytes())
+        buckets = _shift_buckets(previous.buckets, [h % n_buckets for h, _ in entries])
+    else:
+        if previous is not None:
+            # Vượt số bucket: chia lại bucket từ các hash đã lưu (không đọc lại phần đầu CSV)
+            pairs = previous.entries[:2 * previous.count].tolist()
+            entries = list(zip(pairs[0::2], pairs[1::2])) + entries
+        n_buckets = 1
+        while n_buckets < len(entries):
+            n_buckets *= 2
+        entries.sort(key=lambda e: (e[0] % n_buckets, e[1]))
+
+        buckets = array(_OFFSET_TYPECODE, [0] * (n_buckets + 1))
+        for h, _ in entries:
+            buckets[h % n_buckets + 1] += 1
+        for b in range(n_buckets):
+            buckets[b + 1] += buckets[b]
+        flat = array(_OFFSET_TYPECODE)
+        for h, offset in entries:
+            flat.append(h)
+            flat.append(offset)
+
+    base = index_base_path(table.db_path, table.name, column, "hash")
+    atomic_write_bytes(f"{base}.buckets", buckets.tobytes())
+    atomic_write_bytes(f"{base}.entries", flat.tobytes())
+    meta = {
+        "version": INDEX_VERSION,
+        "kind": "hash",
+        "column": column,
+        "type": col_type,
+        "byteorder": sys.byteorder,
+        "source": signature,
+        "count": len(flat) // 2,
+        "buckets": n_buckets,
+        **append_state(table.csv_path, signature[1]),
+    }
+    atomic_write_json(f"{base}.json", meta)
+    return meta
+
+
+class HashIndex:
+    def __init__(self, base: str, meta: dict[str, Any]):
+        self.column: str = meta["column"]
+        self.col_type: str = meta["type"]
+        self.count: int = meta["count"]
+        self.source = meta["source"]
+        self.n_buckets: int = meta["buckets"]
+        self.size: int | None = meta.get("size")
+        self._buckets_mm, self.buckets = _map_array(f"{base}.buckets", _OFFSET_TYPECODE)
+        self._entries_mm, self.entries = _map_array(f"{base}.entries", _OFFSET_TYPECODE)
+
+    @classmethod
+    def open(cls, table: Any, column: str) -> "HashIndex | None":
+        """
+        Index của cột (extend nếu CSV chỉ được append), hoặc None nếu chưa build / CSV
+        đã đổi theo cách khác từ lúc build.
+        """
+        return _open_index(cls, table, column, "hash", build_hash_index)
+
+    def lookup(self, value: Any) -> list[int]:
+        """
+        Byte offset (theo thứ tự trong file) của các dòng có giá trị cột == value.
+        """
+        key = hash_key(self.col_type, value)
+        if key is None or self.count == 0:
+            return []
+        h = _hash64(key)
+        bucket = h % self.n_buckets
+        start, end = self.buckets[bucket], self.buckets[bucket + 1]
+        pairs = self.entries[2 * start:2 * end].tolist()
+        return [pairs[i + 1] for i in range(0, len(pairs), 2) if pairs[i] == h]
+
+
+class OrderedIndexScan:
+    """
+    Đọc các dòng theo thứ tự của sorted index trên `column` (ORDER BY column): vị trí
+    [lo, hi) trong mảng keys (đã thu hẹp theo key_range của WHERE), tăng / giảm dần.
+    """
+    def __init__(self, column: str, descending: bool, key_range: Any, index: SortedIndex, lo: int, hi: int):
+        self.column = column
+        self.descending = descending
+        self.key_range = key_range
+        self.index = index
+        self.lo = lo
+        self.hi = hi
+
+    @property
+    def offsets(self) -> Iterator[int]:
+        # Iterator mới mỗi lần (đọc lười), dùng được như IndexScan.offsets
+        return self.index.ordered_offsets(self.lo, self.hi, self.descending)
+
+    def __repr__(self):
+        return f"OrderedIndexScan({self.column} {'DESC' if self.descending else 'ASC'}, {self.hi - self.lo} rows)"
+
+
+class IndexScan:
+    """
+    Kết quả chọn index cho một truy vấn: đọc các dòng tại `offsets` thay vì scan file.
+    """
+    def __init__(self, column: str, kind: str, key_range: Any, offsets: list[int]):
+        self.column = column
+        self.kind = kind
+        self.key_range = key_range
+        self.offsets = offsets
+
+    def __repr__(self):
+        return f"IndexScan({self.kind} on {self.key_range}, {len(self.offsets)} rows)"
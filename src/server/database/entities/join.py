@@ -0,0 +1,323 @@
+import json
+import itertools
+import operator
+from typing import Any, Callable, Iterable, Iterator
+from server.config.settings import OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import is_leaf, conjuncts, constant_value, CANONICAL_OPS
+from server.database.entities.aggregates import Aggregate, Aggregator, HashAggregation
+from server.database.entities.planner import choose_access_path, selectivity
+from server.database.entities.optimizer import reorder_predicates, simplify
+from server.database.entities.sort import sort_rows
+from server.database.entities.distinct import distinct_rows
+from server.database.entities.spill import SpillDirectory, SpillPartitions
+from server.utils.exceptions import dpapi2_exception
+
+# =========================================
+# Equi-joins of the tables of a multi-table FROM (`FROM a, b WHERE a.x = b.y AND ...`).
+# Columns of a join are named `table.column` (LogicalValidator.validate_join), also in
+# the result rows. JoinPlan (once per plan) splits the conjuncts of the WHERE into:
+#   - filters on a single table, pushed down to the scan of that table (zone maps,
+#     indexes, the cost planner all apply as for a single-table query);
+#   - equalities `a.x = b.y` between two tables: the join keys;
+#   - the rest (conditions over several tables), checked on the joined rows.
+# Execution is a left-deep pipeline of hash joins: the largest input (estimated from the
+# ANALYZE statistics and the pushed filters) is streamed as the probe side, every other
+# table is a build side, joined in an order where it shares a key with the tables before.
+# hash_join keeps the build side in a dict {key: [rows]}; past OPERATOR_MEMORY_ROWS rows
+# both sides are hash-partitioned on the key into spill files (Grace hash join) and each
+# pair of partitions is joined on its own, split again with another hash if still too big.
+# =========================================
+
+# Số lần chia lại tối đa một partition build vẫn vượt budget (sau đó join trong RAM)
+MAX_JOIN_LEVELS = 3
+
+
+def _columns_of(node: ExpressionNode | None, column_types: dict[str, str]) -> list[str]:
+    # Các cột table.column được tham chiếu trong node (không trùng, theo thứ tự xuất hiện)
+    if node is None:
+        return []
+    if is_leaf(node):
+        return [node.value] if isinstance(node.value, str) and node.value in column_types else []
+    return list(dict.fromkeys(_columns_of(node.left, column_types) + _columns_of(node.right, column_types)))
+
+
+def _unqualify(node: ExpressionNode, column_types: dict[str, str]) -> ExpressionNode:
+    # Bản sao của node với `table.column` -> `column` (filter đẩy xuống scan của bảng)
+    if is_leaf(node):
+        if isinstance(node.value, str) and node.value in column_types:
+            return ExpressionNode(node.value.split(".", 1)[1])
+        return ExpressionNode(node.value)
+    right = None if node.right is None else _unqualify(node.right, column_types)
+    return ExpressionNode(node.value, _unqualify(node.left, column_types), right)
+
+
+def _and(terms: list[ExpressionNode]) -> ExpressionNode | None:
+    node = None
+    for term in terms:
+        node = term if node is None else ExpressionNode("AND", node, term)
+    return node
+
+
+def _join_key(node: ExpressionNode, column_types: dict[str, str]) -> tuple[str, str] | None:
+    # (a.x, b.y) nếu node là `a.x = b.y` giữa hai bảng khác nhau, ngược lại None
+    if is_leaf(node) or node.right is None or CANONICAL_OPS.get(str(node.value).upper()) != "=":
+        return None
+    left, right = node.left, node.right
+    if not (is_leaf(left) and is_leaf(right)) or left.value not in column_types or right.value not in column_types:
+        return None
+    if left.value.split(".", 1)[0] == right.value.split(".", 1)[0]:
+        return None
+    return left.value, right.value
+
+
+class JoinPlan:
+    """
+    Join của các bảng trong FROM (tables: {tên: Table}, theo thứ tự FROM) với WHERE đã tách:
+    filters[tên bảng] (tên cột không có tiền tố), keys [(a.x, b.y)], residual (cột table.column).
+    read_columns[tên bảng]: các cột cần đọc (SELECT, GROUP BY, ORDER BY, aggregate, key, residual).
+    """
+    def __init__(self, tables: dict[str, Any], ast: ExpressionNode | None, columns: list[Any], group_by: list[str] | None = None, order_by: list[tuple[Any, bool]] | None = None):
+        self.tables = tables
+        self.column_types = {f"{name}.{col}": t for name, table in tables.items() for col, t in table.column_types.items()}
+        # Gấp hằng / loại điều kiện luôn đúng; WHERE luôn sai thì không đọc bảng nào
+        ast = simplify(ast, self.column_types)
+        self.empty = constant_value(ast) is False
+        filters: dict[str, list[ExpressionNode]] = {name: [] for name in tables}
+        self.keys: list[tuple[str, str]] = []
+        residual: list[ExpressionNode] = []
+        for term in ([] if self.empty else conjuncts(ast)):
+            refs = {col.split(".", 1)[0] for col in _columns_of(term, self.column_types)}
+            key = _join_key(term, self.column_types)
+            if key is not None:
+                self.keys.append(key)
+            elif len(refs) == 1:
+                filters[refs.pop()].append(_unqualify(term, self.column_types))
+            else:
+                residual.append(term)
+        self.filters = {name: _and(terms) for name, terms in filters.items()}
+        self.residual = _and(residual)
+        self._check_connected()
+
+        needed = set(self.column_types) if columns == ["*"] else set()
+        for item in list(columns) + list(group_by or []) + [item for item, _ in order_by or []]:
+            if isinstance(item, Aggregate):
+                if item.column is not None:
+                    needed.add(item.column)
+            elif item != "*":
+                needed.add(item)
+        needed.update(col for key in self.keys for col in key)
+        needed.update(_columns_of(self.residual, self.column_types))
+        self.read_columns = {name: [col for col in table.column_types if f"{name}.{col}" in needed] for name, table in tables.items()}
+
+    def _check_connected(self) -> None:
+        # Mọi bảng phải nối với các bảng khác qua ít nhất một điều kiện bằng (không có cross join)
+        if self.empty:
+            return
+        names = list(self.tables)
+        reached = {names[0]}
+        changed = True
+        while changed:
+            changed = False
+            for left, right in self.keys:
+                a, b = left.split(".", 1)[0], right.split(".", 1)[0]
+                if (a in reached) != (b in reached):
+                    reached |= {a, b}
+                    changed = True
+        missing = [name for name in names if name not in reached]
+        if missing:
+            raise dpapi2_exception.NotSupportedError(
+                f"Cross joins are not supported: add an equality condition joining {missing} to the other tables."
+            )
+
+    def estimated_sizes(self) -> dict[str, float]:
+        """
+        Số dòng ước lượng của mỗi bảng sau filter đã đẩy xuống (thống kê ANALYZE). Nếu có
+        bảng chưa ANALYZE thì mọi bảng dùng kích thước file x selectivity mặc định để so sánh.
+        """
+        stats = {name: table.get_statistics() for name, table in self.tables.items()}
+        if all(s is not None for s in stats.values()):
+            return {name: stats[name].row_count * selectivity(self.filters[name], stats[name], table.column_types) for name, table in self.tables.items()}
+        return {
+            name: (table.data_signature() or [0, 0])[1] * selectivity(self.filters[name], None, table.column_types)
+            for name, table in self.tables.items()
+        }
+
+    def join_order(self) -> tuple[str, list[tuple[str, list[str], list[str]]]]:
+        """
+        (bảng probe, [(bảng build, cột key phía build, cột key phía probe)]): probe là input
+        lớn nhất; mỗi bước chọn bảng nhỏ nhất có key chung với các bảng đã join.
+        """
+        sizes = self.estimated_sizes()
+        probe = max(self.tables, key=lambda name: sizes[name])
+        joined = {probe}
+        steps = []
+        while len(joined) < len(self.tables):
+            pairs: dict[str, list[tuple[str, str]]] = {}
+            for left, right in self.keys:
+                for build_col, probe_col in ((left, right), (right, left)):
+                    build, other = build_col.split(".", 1)[0], probe_col.split(".", 1)[0]
+                    if build not in joined and other in joined:
+                        pairs.setdefault(build, []).append((build_col, probe_col))
+            build = min(pairs, key=lambda name: sizes[name])
+            steps.append((build, [b for b, _ in pairs[build]], [p for _, p in pairs[build]]))
+            joined.add(build)
+        return probe, steps
+
+    def __repr__(self):
+        return f"JoinPlan({list(self.tables)} ON {self.keys} FILTERS {self.filters} RESIDUAL {self.residual})"
+
+
+def _build(rows: Iterable[dict[str, Any]], key: Callable[[dict[str, Any]], Any]) -> dict[Any, list[dict[str, Any]]]:
+    table: dict[Any, list[dict[str, Any]]] = {}
+    for row in rows:
+        table.setdefault(key(row), []).append(row)
+    return table
+
+
+def _probe(table: dict[Any, list[dict[str, Any]]], rows: Iterable[dict[str, Any]], key: Callable[[dict[str, Any]], Any]) -> Iterator[dict[str, Any]]:
+    for row in rows:
+        matches = table.get(key(row))
+        if matches:
+            for match in matches:
+                yield {**row, **match}
+
+
+def hash_join(build: Iterable[dict[str, Any]], probe: Iterable[dict[str, Any]], build_key: Callable[[dict[str, Any]], Any], probe_key: Callable[[dict[str, Any]], Any], memory_rows: int, spill_dir: str, partitions: int) -> Iterator[dict[str, Any]]:
+    """
+    Inner join: mỗi cặp (dòng probe, dòng build) cùng key thành một dict gộp, theo thứ tự
+    các dòng probe. Build trong RAM tới memory_rows dòng, vượt thì chuyển sang Grace hash join.
+    """
+    table: dict[Any, list[dict[str, Any]]] = {}
+    build = iter(build)
+    count = 0
+    for row in build:
+        table.setdefault(build_key(row), []).append(row)
+        count += 1
+        if count > memory_rows:
+            held = itertools.chain.from_iterable(table.values())
+            directory = SpillDirectory(spill_dir)
+            try:
+                yield from _partitioned_join(itertools.chain(held, build), probe, build_key, probe_key, memory_rows, directory, partitions, 0)
+            finally:
+                directory.close()
+            return
+    yield from _probe(table, probe, probe_key)
+
+
+def _partitioned_join(build: Iterable[dict[str, Any]], probe: Iterable[dict[str, Any]], build_key: Callable, probe_key: Callable, memory_rows: int, directory: SpillDirectory, partitions: int, level: int) -> Iterator[dict[str, Any]]:
+    # Chia hai phía theo cùng hash của key: dòng cùng key luôn rơi vào cùng cặp partition
+    build_parts = SpillPartitions(directory, partitions, level)
+    for row in build:
+        build_parts.add(build_key(row), row)
+    build_parts.finish()
+    probe_parts = SpillPartitions(directory, partitions, level)
+    for row in probe:
+        probe_parts.add(probe_key(row), row)
+    probe_parts.finish()
+    for build_run, probe_run in zip(build_parts.runs, probe_parts.runs):
+        if not len(build_run) or not len(probe_run):
+            continue
+        if len(build_run) > memory_rows and level + 1 < MAX_JOIN_LEVELS:
+            yield from _partitioned_join(build_run, probe_run, build_key, probe_key, memory_rows, directory, partitions, level + 1)
+        else:
+            yield from _probe(_build(build_run, build_key), probe_run, probe_key)
+
+
+def _scan(name: str, table: Any, columns: list[str], ast: ExpressionNode | None, force: str | None, workers: int, chunk_bytes: int) -> Iterator[dict[str, Any]]:
+    # Scan một bảng với filter đã đẩy xuống (đường truy cập chọn theo chi phí như truy vấn một bảng)
+    ast = reorder_predicates(ast, table.column_types, table.get_statistics())
+    try:
+        path = choose_access_path(table, ast, force=force, workers=workers, chunk_bytes=chunk_bytes)
+    except dpapi2_exception.NotSupportedError:
+        # force="index" nhưng bảng này không có index dùng được
+        path = choose_access_path(table, ast, workers=workers, chunk_bytes=chunk_bytes)
+    rows = table.select_rows(columns, ast, parallel=path.parallel, index_scan=path.index_scan)
+    names = [(f"{name}.{col}", col) for col in columns]
+    try:
+        for row in rows:
+            yield {qualified: row[col] for qualified, col in names}
+    finally:
+        if hasattr(rows, "close"):
+            rows.close()
+
+
+def join_rows(plan: JoinPlan, force: str | None = None, workers: int = 1, chunk_bytes: int = 1) -> Iterator[dict[str, Any]]:
+    """
+    Các dòng đã join ({table.column: giá trị}, chỉ các cột trong plan.read_columns) thỏa toàn bộ WHERE.
+    """
+    if plan.empty:
+        return
+    probe, steps = plan.join_order()
+    rows: Iterator[dict[str, Any]] = _scan(probe, plan.tables[probe], plan.read_columns[probe], plan.filters[probe], force, workers, chunk_bytes)
+    # Mọi generator của pipeline, đóng từ ngoài vào trong (xoá file spill, đóng scan) khi xong / dừng sớm
+    stages = [rows]
+    for build, build_cols, probe_cols in steps:
+        scan = _scan(build, plan.tables[build], plan.read_columns[build], plan.filters[build], force, workers, chunk_bytes)
+        rows = hash_join(scan, rows, operator.itemgetter(*build_cols), operator.itemgetter(*probe_cols),
+                         OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+        stages += [scan, rows]
+    if plan.residual is not None:
+        # vals là dict: index của mỗi cột là chính tên cột (repr) thay vì vị trí
+        col_to_idx = {col: repr(col) for col in plan.column_types}
+        residual = plan.tables[probe]._compile_filter(plan.residual, col_to_idx, typed=True, column_types=plan.column_types)
+        rows = filter(residual, rows)
+    try:
+        yield from rows
+    finally:
+        for stage in reversed(stages):
+            stage.close()
+
+
+def select_join(plan: JoinPlan, columns: list[Any], aggregates: list[Aggregate], group_by: list[str] | None, order_by: list[tuple[Any, bool]] | None, limit: int | None, offset: int, distinct: bool = False, force: str | None = None, workers: int = 1, chunk_bytes: int = 1) -> Iterator[str]:
+    """
+    Giống Table.select / select_aggregates / select_groups cho một join: các dòng JSON
+    (cột tên table.column), sau GROUP BY / aggregate, DISTINCT, ORDER BY, OFFSET / LIMIT.
+    """
+    if limit == 0:
+        return
+    rows = join_rows(plan, force, workers, chunk_bytes)
+    names = list(plan.column_types) if columns == ["*"] else [c.label if isinstance(c, Aggregate) else c for c in columns]
+    order_by = order_by or []
+    if group_by is not None or aggregates:
+        # Aggregate chỉ có trong ORDER BY được tính thêm rồi bỏ khỏi kết quả
+        wanted = list(dict.fromkeys(aggregates + [item for item, _ in order_by if isinstance(item, Aggregate)]))
+        aggregator = Aggregator(wanted, plan.column_types)
+        if group_by is None:
+            state = aggregator.new_state()
+            try:
+                aggregator.add_rows(state, ([row[c] for c in aggregator.columns] for row in rows))
+            finally:
+                rows.close()
+            if offset == 0:
+                yield json.dumps(aggregator.result(state))
+            return
+        groups = HashAggregation(aggregator, len(group_by), OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+        read_cols = group_by + aggregator.columns
+        try:
+            groups.add_rows([row[c] for c in read_cols] for row in rows)
+        except BaseException:
+            groups.close()
+            raise
+        finally:
+            rows.close()
+        rows = groups.result_rows(group_by)
+        order_by = [(item.label if isinstance(item, Aggregate) else item, desc) for item, desc in order_by]
+    if distinct:
+        rows = distinct_rows(rows, names, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+    if order_by:
+        rows = sort_rows(rows, order_by, limit, offset, OPERATOR_MEMORY_ROWS, SPILL_DIR)
+    elif limit is not None or offset:
+        rows = _limit_rows(rows, offset, None if limit is None else offset + limit)
+    try:
+        for row in rows:
+            yield json.dumps({name: row[name] for name in names})
+    finally:
+        rows.close()
+
+
+def _limit_rows(rows: Iterator[dict[str, Any]], offset: int, stop: int | None) -> Iterator[dict[str, Any]]:
+    try:
+        yield from itertools.islice(rows, offset, stop)
+    finally:
+        rows.close()
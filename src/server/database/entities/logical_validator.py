@@ -1,4 +1,5 @@
 from server.database.entities.ast import ExpressionNode
+from server.database.entities.aggregates import Aggregate
 from server.utils.exceptions import dpapi2_exception
 
 def quote_enclosed(value: str) -> bool:
@@ -80,6 +81,18 @@ class LogicalValidator:
             raise dpapi2_exception.ProgrammingError(f"Column '{col}' not found in schema of {db_name}.{table_name}")
         return schema[col]
 
+    def _column_name(self, full: str) -> str:
+        """
+        Tên cột dùng trong plan từ tên đầy đủ db.table.column: `column` khi FROM chỉ có
+        một bảng, `table.column` khi FROM có nhiều bảng (join).
+        """
+        _, table_name, col = full.split(".")
+        if len(self.tables) == 1:
+            return col
+        if table_name not in self.tables:
+            raise dpapi2_exception.ProgrammingError(f"Table '{table_name}' not found in FROM clause.")
+        return f"{table_name}.{col}"
+
     def _validate_condition_ast(self, node: ExpressionNode) -> str:
         if node.left is None and node.right is None:
             # Leaf node: identifier or literal
@@ -102,6 +115,17 @@ class LogicalValidator:
                 raise dpapi2_exception.ProgrammingError("NOT operator requires boolean operand")
             return "bool"
 
+        elif node.value == "IN":
+            # Vế phải là frozenset các literal (đã bỏ nháy), mỗi giá trị phải so sánh được với vế trái
+            left_type = self._validate_condition_ast(node.left)
+            for value in node.right.value:
+                value_type = "string" if isinstance(value, str) else "integer" if isinstance(value, int) else "float"
+                if value_type != left_type and {"integer", "float"} != {left_type, value_type}:
+                    raise dpapi2_exception.ProgrammingError(
+                        f"Incompatible types in IN list: {left_type} IN ({value_type})"
+                    )
+            return "bool"
+
         else:
             left_type = self._validate_condition_ast(node.left)
             right_type = self._validate_condition_ast(node.right)
@@ -120,6 +144,13 @@ class LogicalValidator:
                     )
                 return "bool"
 
+            elif node.value == "LIKE":
+                if left_type != "string" or right_type != "string":
+                    raise dpapi2_exception.ProgrammingError(
+                        f"LIKE requires string operands: {left_type} LIKE {right_type}"
+                    )
+                return "bool"
+
             elif node.value in ("+", "-", "*", "/", "%"):
                 if left_type not in ("integer", "float") or right_type not in ("integer", "float"):
                     raise dpapi2_exception.ProgrammingError(
@@ -130,11 +161,75 @@ class LogicalValidator:
             else:
                 raise dpapi2_exception.ProgrammingError(f"Unknown operator: {node.value}")
 
-    def validate_logic(self, columns: list[str], table: str, condition_ast: ExpressionNode | None):
-        # Reset tables state for each validation
-        self.tables = {}
+    def _validate_aggregate(self, aggregate: Aggregate) -> Aggregate:
+        """
+        Resolve cột của hàm aggregate; SUM / AVG chỉ nhận cột số.
+        """
+        if aggregate.column is None:
+            return aggregate
+        full = self._validate_column(aggregate.column)
+        col_type = self._get_column_type(full)
+        if aggregate.func in ("sum", "avg") and col_type not in ("integer", "float"):
+            raise dpapi2_exception.ProgrammingError(
+                f"{aggregate.func.upper()} requires a numeric column, '{aggregate.column}' is {col_type}"
+            )
+        return Aggregate(aggregate.func, self._column_name(full))
 
-        # 1. Parse and validate table (ensure db_name matches metadata)
+    def validate_group_by(self, group_by: list[str], columns: list[str | Aggregate]) -> list[str]:
+        """
+        Resolve các cột GROUP BY (gọi sau validate_logic); mọi cột thường trong SELECT
+        (columns đã chuẩn hoá) phải nằm trong GROUP BY.
+        """
+        if columns == ["*"]:
+            raise dpapi2_exception.ProgrammingError("SELECT * cannot be used with GROUP BY")
+        keys = []
+        for col in group_by:
+            name = self._column_name(self._validate_column(col))
+            if name not in keys:
+                keys.append(name)
+        for col in columns:
+            if not isinstance(col, Aggregate) and col not in keys:
+                raise dpapi2_exception.ProgrammingError(
+                    f"Column '{col}' must appear in the GROUP BY clause or be used in an aggregate function"
+                )
+        return keys
+
+    def validate_order_by(self, order_by: list[tuple[str | Aggregate, bool]], columns: list[str | Aggregate], group_by: list[str] | None, distinct: bool = False) -> list[tuple[str | Aggregate, bool]]:
+        """
+        Resolve các mục ORDER BY (gọi sau validate_logic / validate_group_by):
+        - truy vấn thường: cột bất kỳ của bảng, không có hàm aggregate;
+        - có aggregate / GROUP BY: hàm aggregate, hoặc cột nằm trong GROUP BY;
+        - SELECT DISTINCT: chỉ các mục có trong danh sách SELECT.
+        """
+        grouped = group_by is not None or any(isinstance(c, Aggregate) for c in columns)
+        resolved: list[tuple[str | Aggregate, bool]] = []
+        for item, descending in order_by:
+            if isinstance(item, Aggregate):
+                if not grouped:
+                    raise dpapi2_exception.ProgrammingError(
+                        f"Aggregate '{item.label}' in ORDER BY requires aggregates in the SELECT list or GROUP BY"
+                    )
+                resolved.append((self._validate_aggregate(item), descending))
+                continue
+            name = self._column_name(self._validate_column(item))
+            if grouped and name not in (group_by or []):
+                raise dpapi2_exception.ProgrammingError(
+                    f"ORDER BY column '{item}' must appear in the GROUP BY clause or be used in an aggregate function"
+                )
+            resolved.append((name, descending))
+        if distinct and columns != ["*"]:
+            for item, _ in resolved:
+                if item not in columns:
+                    label = item.label if isinstance(item, Aggregate) else item
+                    raise dpapi2_exception.ProgrammingError(
+                        f"For SELECT DISTINCT, ORDER BY item '{label}' must appear in the SELECT list"
+                    )
+        return resolved
+
+    def _resolve_table_ref(self, table: str) -> tuple[str, str]:
+        """
+        (db_name, table_name) của `table` hoặc `db_name.table` trong FROM.
+        """
         parts = table.split('.')
         metadata_dbs = list(self.metadata.keys())
 
@@ -144,36 +239,36 @@ class LogicalValidator:
                 raise dpapi2_exception.ProgrammingError(
                     f"Database '{user_db_name}' not found. Expected one of: {metadata_dbs}"
                 )
-            db_name = user_db_name
+            return user_db_name, table_name
         elif len(parts) == 1:
             if len(self.metadata) != 1:
                 raise dpapi2_exception.ProgrammingError(
                     "Ambiguous database. Please specify [db_name].[table_name]."
                 )
-            db_name = metadata_dbs[0]
-            table_name = parts[0]
+            return metadata_dbs[0], parts[0]
         else:
             raise dpapi2_exception.ProgrammingError(f"Invalid table format: '{table}'")
 
-        # 2. Validate FROM clause
-        self._validate_from(db_name, [table_name])
-
-        # 3. Normalize columns
+    def _normalize_select(self, columns: list[str | Aggregate], condition_ast: ExpressionNode | None) -> tuple[list[str | Aggregate], ExpressionNode | None]:
+        # Chuẩn hoá danh sách cột + validate / rewrite AST của WHERE (sau _validate_from)
         if columns == ["*"]:
             final_columns = ["*"]
         else:
             final_columns = []
             for col in columns:
+                if isinstance(col, Aggregate):
+                    final_columns.append(self._validate_aggregate(col))
+                    continue
                 if quote_enclosed(col):
                     # Nếu là literal nhưng nằm trong danh sách cột, coi là lỗi
                     raise dpapi2_exception.ProgrammingError(
                         f"Invalid column name: '{col}' appears to be a string literal but columns list cannot include literals."
                     )
                 full = self._validate_column(col)  # raises if invalid
-                # Chỉ giữ phần column_name (không bao gồm db.table)
-                final_columns.append(full.split(".")[-1])
+                # Chỉ giữ phần column_name (table.column nếu join), không bao gồm db
+                final_columns.append(self._column_name(full))
 
-        # 4. Validate and rewrite AST
+        # Validate and rewrite AST
         def rewrite_ast(node: ExpressionNode | None):
             if node is None:
                 return None
@@ -181,7 +276,7 @@ class LogicalValidator:
                 if isinstance(node.value, str) and not quote_enclosed(node.value):
                     # Only rewrite identifiers (lúc này node.value chắc chắn là tên cột đã tồn tại)
                     resolved = self._validate_column(node.value)
-                    node.value = resolved.split(".")[-1]
+                    node.value = self._column_name(resolved)
             else:
                 rewrite_ast(node.left)
                 rewrite_ast(node.right)
@@ -192,4 +287,76 @@ class LogicalValidator:
             # Sau đó rewrite giá trị của từng node identifier
             rewrite_ast(condition_ast)
 
-        return final_columns, table_name, condition_ast
\ No newline at end of file
+        return final_columns, condition_ast
+
+    def validate_logic(self, columns: list[str | Aggregate], table: str, condition_ast: ExpressionNode | None):
+        # Reset tables state for each validation
+        self.tables = {}
+
+        # 1. Parse and validate table (ensure db_name matches metadata)
+        db_name, table_name = self._resolve_table_ref(table)
+
+        # 2. Validate FROM clause
+        self._validate_from(db_name, [table_name])
+
+        # 3-4. Normalize columns, validate and rewrite AST
+        final_columns, condition_ast = self._normalize_select(columns, condition_ast)
+        return final_columns, table_name, condition_ast
+
+    def validate_join(self, columns: list[str | Aggregate], tables: list[str], condition_ast: ExpressionNode | None):
+        """
+        Như validate_logic cho FROM nhiều bảng (cùng một database): mọi cột trong SELECT,
+        WHERE, aggregate được chuẩn hoá thành `table.column`. Trả về (columns, table_names, AST).
+        """
+        self.tables = {}
+        refs = [self._resolve_table_ref(table) for table in tables]
+        db_names = {db_name for db_name, _ in refs}
+        if len(db_names) > 1:
+            raise dpapi2_exception.NotSupportedError(f"Joins across databases are not supported: {sorted(db_names)}")
+        table_names = [table_name for _, table_name in refs]
+        if len(set(table_names)) != len(table_names):
+            raise dpapi2_exception.NotSupportedError("A table cannot appear more than once in FROM (no table aliases).")
+        self._validate_from(db_names.pop(), table_names)
+
+        final_columns, condition_ast = self._normalize_select(columns, condition_ast)
+        return final_columns, table_names, condition_ast
+
+    def validate_insert(self, table: str, columns: list[str] | None, rows: list[list]):
+        """
+        Kiểm tra một INSERT: bảng tồn tại, cột có trong schema (None: mọi cột theo thứ tự
+        schema), mỗi dòng đủ số giá trị và đúng kiểu (int được nhận cho cột float).
+        Trả về (table_name, columns, rows với giá trị float đã ép kiểu).
+        """
+        self.tables = {}
+        db_name, table_name = self._resolve_table_ref(table)
+        self._validate_from(db_name, [table_name])
+        schema = self.tables[table_name][1]
+
+        if columns is None:
+            columns = list(schema)
+        for col in columns:
+            if col not in schema:
+                raise dpapi2_exception.ProgrammingError(f"Column '{col}' not found in table '{table_name}'.")
+        if len(set(columns)) != len(columns):
+            raise dpapi2_exception.ProgrammingError("A column cannot appear more than once in INSERT.")
+
+        checked = []
+        for n, row in enumerate(rows, 1):
+            if len(row) != len(columns):
+                raise dpapi2_exception.ProgrammingError(
+                    f"VALUES row {n} has {len(row)} values, expected {len(columns)}."
+                )
+            values = []
+            for col, value in zip(columns, row):
+                col_type = schema[col]
+                if col_type == "string" and not isinstance(value, str):
+                    raise dpapi2_exception.ProgrammingError(f"Column '{col}' expects a string, got {value!r}.")
+                if col_type == "integer" and not isinstance(value, int):
+                    raise dpapi2_exception.ProgrammingError(f"Column '{col}' expects an integer, got {value!r}.")
+                if col_type == "float":
+                    if not isinstance(value, (int, float)):
+                        raise dpapi2_exception.ProgrammingError(f"Column '{col}' expects a number, got {value!r}.")
+                    value = float(value)
+                values.append(value)
+            checked.append(values)
+        return table_name, columns, checked
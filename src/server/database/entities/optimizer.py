@@ -0,0 +1,280 @@
+import operator
+from typing import Any, Callable
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import (
+    is_leaf, literal_value, constant_value, like_prefix, like_regex, prefix_upper_bound, CANONICAL_OPS, FLIPPED_OPS,
+)
+from server.database.entities.index import key_ranges
+from server.database.entities.planner import selectivity
+from server.database.entities.statistics import TableStatistics
+
+# =========================================
+# Rewrite passes over a validated WHERE tree, run before the filter is compiled.
+# The tree of a cached plan is shared between queries, so every pass builds new
+# nodes and never modifies the tree it is given.
+#
+# simplify (once per plan, after LogicalValidator):
+#   - folds literal-only arithmetic and comparisons (`1000 * 12` -> 12000, `1 = 0` -> False)
+#     with the same Python semantics the compiled filter would use;
+#   - moves literals to the right and isolates an integer column (`id + 5 > 20` ->
+#     `id > 15`, `2 * age <= 61` -> `age <= 30`) so zone maps and indexes can use it.
+#     Only integer expressions are rewritten: integer arithmetic is exact, float is not;
+#   - rewrites LIKE without wildcard as `=`, `LIKE 'abc%'` as the range
+#     `>= 'abc' AND < 'abd'` (zone maps, dictionary codes and indexes can use it; only
+#     other patterns run a regex), and IN with one value as `=`;
+#   - removes AND / OR terms decided by constants, and turns conjunctions whose ranges
+#     cannot overlap (`id > 5 AND id < 3`, `id IN (1, 2) AND id > 5`) into False.
+# The WHERE then is None (always true), False (no row, nothing is read) or a smaller tree.
+#
+# reorder_predicates: flattens AND / OR chains and sorts their terms so that the
+# short-circuit of the compiled filter rejects (AND) / accepts (OR) a row as early and
+# as cheaply as possible. A term t with cost c and selectivity s goes first when
+#   AND: c / (1 - s) is smallest (cheap and rejects many rows)
+#   OR:  c / s is smallest (cheap and accepts many rows)
+# Selectivity comes from ANALYZE statistics when the table has them (planner.selectivity),
+# otherwise from fixed defaults; costs are rough per-row operation counts.
+# =========================================
+
+# Chi phí tương đối khi đánh giá một node cho một dòng
+_COLUMN_COST = 2.0        # đọc + cast field
+_COMPARISON_COST = 1.0
+_ARITHMETIC_COST = 1.0
+_DIVISION_COST = 2.0      # / và %: thêm kiểm tra chia cho 0
+_NOT_COST = 0.5
+_LIKE_COST = 4.0          # LIKE còn lại sau simplify: regex trên chuỗi
+
+
+def _chain(node: ExpressionNode, op: str) -> list[ExpressionNode]:
+    # a AND (b AND c) -> [a, b, c] (cùng toán tử liên tiếp)
+    if not is_leaf(node) and node.right is not None and str(node.value).upper() == op:
+        return _chain(node.left, op) + _chain(node.right, op)
+    return [node]
+
+
+def reorder_predicates(ast: ExpressionNode | None, column_types: dict[str, str], stats: TableStatistics | None = None) -> ExpressionNode | None:
+    """
+    Sắp lại các điều kiện của mọi chuỗi AND / OR trong WHERE theo chi phí x selectivity.
+    Trả về cây mới (cây gốc không bị sửa).
+    """
+    if ast is None:
+        return None
+
+    def visit(n: ExpressionNode) -> tuple[ExpressionNode, float, float]:
+        # (node mới, chi phí kỳ vọng mỗi dòng, selectivity)
+        if is_leaf(n):
+            cost = _COLUMN_COST if isinstance(n.value, str) and n.value in column_types else 0.0
+            return n, cost, selectivity(n, stats, column_types)
+        op = str(n.value).upper()
+        if op == "NOT" and n.right is None:
+            child, cost, sel = visit(n.left)
+            return ExpressionNode(n.value, child, None), cost + _NOT_COST, 1.0 - sel
+        if op in ("AND", "OR"):
+            terms = [visit(t) for t in _chain(n, op)]
+            if op == "AND":
+                terms.sort(key=lambda t: t[1] / (1.0 - t[2]) if t[2] < 1.0 else float("inf"))
+            else:
+                terms.sort(key=lambda t: t[1] / t[2] if t[2] > 0.0 else float("inf"))
+            node, cost, sel = terms[0]
+            # Chi phí kỳ vọng: term sau chỉ chạy khi các term trước chưa quyết định được
+            reach = sel if op == "AND" else 1.0 - sel
+            for term, term_cost, term_sel in terms[1:]:
+                node = ExpressionNode(n.value, node, term)
+                cost += reach * term_cost
+                if op == "AND":
+                    sel *= term_sel
+                    reach = sel
+                else:
+                    sel = sel + term_sel - sel * term_sel
+                    reach = 1.0 - sel
+            return node, cost, sel
+        # So sánh / số học: giữ nguyên thứ tự toán hạng
+        left, left_cost, _ = visit(n.left)
+        right, right_cost, _ = visit(n.right)
+        own = _DIVISION_COST if op in ("/", "%") else _ARITHMETIC_COST if op in ("+", "-", "*") else _LIKE_COST if op == "LIKE" else _COMPARISON_COST
+        return ExpressionNode(n.value, left, right), own + left_cost + right_cost, selectivity(n, stats, column_types)
+
+    return visit(ast)[0]
+
+
+_FOLD_OPS: dict[str, Callable[[Any, Any], Any]] = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "%": operator.mod,
+    "=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+def _literal(n: ExpressionNode) -> tuple[bool, Any]:
+    if is_leaf(n) and isinstance(n.value, bool):
+        return False, None
+    return literal_value(n)
+
+
+def _is_integer_expr(n: ExpressionNode, column_types: dict[str, str]) -> bool:
+    # Biểu thức chỉ gồm cột integer, literal int và + - * (tính toán chính xác)
+    if is_leaf(n):
+        v = n.value
+        if isinstance(v, str):
+            return column_types.get(v) == "integer"
+        return isinstance(v, int) and not isinstance(v, bool)
+    if n.right is None or str(n.value) not in ("+", "-", "*"):
+        return False
+    return _is_integer_expr(n.left, column_types) and _is_integer_expr(n.right, column_types)
+
+
+def _int_literal(n: ExpressionNode) -> int | None:
+    ok, value = _literal(n)
+    if ok and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _isolate(expr: ExpressionNode, op: str, bound: int, column_types: dict[str, str]) -> ExpressionNode:
+    """
+    Viết lại `expr op bound` (expr integer, bound int) bằng cách chuyển dần các literal
+    của expr sang vế phải, tới khi vế trái không còn dạng `A (+|-|*) literal`.
+    """
+    while not is_leaf(expr) and expr.right is not None and _is_integer_expr(expr, column_types):
+        arith = str(expr.value)
+        right_k, left_k = _int_literal(expr.right), _int_literal(expr.left)
+        if right_k is not None:
+            inner, k, literal_left = expr.left, right_k, False
+        elif left_k is not None:
+            inner, k, literal_left = expr.right, left_k, True
+        else:
+            break
+        if arith == "+":
+            bound -= k
+        elif arith == "-" and not literal_left:
+            bound += k
+        elif arith == "-":
+            # k - A op c  <=>  A flip(op) k - c
+            op, bound = FLIPPED_OPS[op], k - bound
+        else:
+            if k == 0:
+                break
+            if k < 0:
+                op, bound, k = FLIPPED_OPS[op], -bound, -k
+            # A * k op c (k > 0), A nguyên
+            if op in ("=", "!="):
+                if bound % k:
+                    return ExpressionNode(op == "!=")
+                bound //= k
+            elif op in (">", "<="):
+                bound //= k
+            else:
+                bound = -(-bound // k)
+        expr = inner
+    return ExpressionNode(op, expr, ExpressionNode(bound))
+
+
+def _fold_comparison(op: str, left: ExpressionNode, right: ExpressionNode, column_types: dict[str, str]) -> ExpressionNode:
+    left_ok, left_value = _literal(left)
+    right_ok, right_value = _literal(right)
+    if left_ok and right_ok:
+        try:
+            return ExpressionNode(bool(_FOLD_OPS[op](left_value, right_value)))
+        except TypeError:
+            return ExpressionNode(op, left, right)
+    if left_ok:
+        # literal op expr -> expr flip(op) literal
+        left, right, op = right, left, FLIPPED_OPS[op]
+        right_ok, right_value = left_ok, left_value
+    if is_leaf(left) and is_leaf(right) and left.value == right.value and column_types.get(left.value) in ("integer", "string"):
+        # col op col (NaN chỉ có ở cột float)
+        return ExpressionNode(op in ("=", "<=", ">="))
+    bound = _int_literal(right)
+    if bound is not None and not is_leaf(left) and _is_integer_expr(left, column_types):
+        return _isolate(left, op, bound, column_types)
+    return ExpressionNode(op, left, right)
+
+
+def simplify(ast: ExpressionNode | None, column_types: dict[str, str]) -> ExpressionNode | None:
+    """
+    Gấp hằng, chuẩn hoá so sánh và loại điều kiện luôn đúng / luôn sai trong WHERE.
+    Trả về None nếu WHERE luôn đúng, ExpressionNode(False) nếu luôn sai.
+    """
+    if ast is None:
+        return None
+
+    def fold(n: ExpressionNode) -> ExpressionNode:
+        if is_leaf(n):
+            return n
+        op = str(n.value).upper()
+        if op == "NOT" and n.right is None:
+            child = fold(n.left)
+            value = constant_value(child)
+            if value is not None:
+                return ExpressionNode(not value)
+            if not is_leaf(child) and child.right is None and str(child.value).upper() == "NOT":
+                return child.left
+            return ExpressionNode(n.value, child, None)
+        left, right = fold(n.left), fold(n.right)
+        if op == "IN":
+            return _fold_in(n, left, right, column_types)
+        if op == "LIKE":
+            return _fold_like(n, left, right, column_types)
+        if op in ("AND", "OR"):
+            # AND: False thắng, True bị bỏ; OR ngược lại
+            decisive = op == "OR"
+            for side, other in ((left, right), (right, left)):
+                value = constant_value(side)
+                if value is decisive:
+                    return side
+                if value is not None:
+                    return other
+            node = ExpressionNode(n.value, left, right)
+            if op == "AND" and any(r.empty for r in key_ranges(node, column_types, set(column_types)).values()):
+                return ExpressionNode(False)
+            return node
+        canonical = CANONICAL_OPS.get(op)
+        if canonical is not None:
+            return _fold_comparison(canonical, left, right, column_types)
+        left_ok, left_value = _literal(left)
+        right_ok, right_value = _literal(right)
+        if left_ok and right_ok and op in _FOLD_OPS and isinstance(left_value, (int, float)) and isinstance(right_value, (int, float)):
+            try:
+                return ExpressionNode(_FOLD_OPS[op](left_value, right_value))
+            except ZeroDivisionError:
+                # Để filter báo lỗi khi chạy như trước
+                pass
+        return ExpressionNode(n.value, left, right)
+
+    result = fold(ast)
+    if constant_value(result) is True:
+        return None
+    return result
+
+
+def _literal_node(value: Any) -> ExpressionNode:
+    # Leaf literal như parser sinh ra: chuỗi giữ nháy
+    return ExpressionNode(f"'{value}'" if isinstance(value, str) else value)
+
+
+def _fold_in(n: ExpressionNode, left: ExpressionNode, right: ExpressionNode, column_types: dict[str, str]) -> ExpressionNode:
+    values = right.value
+    left_ok, left_value = _literal(left)
+    if left_ok:
+        return ExpressionNode(left_value in values)
+    if len(values) == 1:
+        return _fold_comparison("=", left, _literal_node(next(iter(values))), column_types)
+    return ExpressionNode(n.value, left, right)
+
+
+def _fold_like(n: ExpressionNode, left: ExpressionNode, right: ExpressionNode, column_types: dict[str, str]) -> ExpressionNode:
+    pattern = right.value[1:-1]
+    left_ok, left_value = _literal(left)
+    if left_ok:
+        return ExpressionNode(like_regex(pattern).fullmatch(left_value) is not None)
+    prefix = like_prefix(pattern)
+    if prefix is None:
+        return ExpressionNode(n.value, left, right)
+    text, exact = prefix
+    if exact:
+        return _fold_comparison("=", left, _literal_node(text), column_types)
+    if not text:
+        # 'abc%' với prefix rỗng: mọi chuỗi
+        return ExpressionNode(True)
+    low = ExpressionNode(">=", left, _literal_node(text))
+    bound = prefix_upper_bound(text)
+    if bound is None:
+        return low
+    return ExpressionNode("AND", low, ExpressionNode("<", left, _literal_node(bound)))
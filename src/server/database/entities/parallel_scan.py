@@ -0,0 +1,160 @@
+import mmap
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterator
+from server.utils.exceptions import dpapi2_exception
+
+# =========================================
+# Parallel scan of one CSV file over byte ranges.
+# The data part of the file (after the header) is cut into ranges that end on a
+# newline; each range is scanned (filter + cast) by a worker process which rebuilds
+# the Table and its compiled filter itself, then results are merged back in file
+# order (ordered) or in completion order (unordered).
+# Only valid for "simple" CSV files (no quoted fields, see Table._csv_layout), otherwise
+# a newline inside quotes could be taken as a row boundary: Table checks that before
+# choosing this path. Workers split rows and fields directly on bytes.
+# The same pool scans compressed segments (segments.py): there each task is a group of
+# blocks, which are cut on row boundaries, and the worker decompresses them itself.
+# For aggregate queries (aggregates.py) a worker folds its range into the aggregate
+# state and sends back only that state instead of the rows.
+# =========================================
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_lock = threading.Lock()
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool shared by all queries; recreated if the worker count changes.
+    Workers are spawned (not forked) since the server runs threads.
+    """
+    global _executor, _executor_workers
+    with _lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown)
+
+
+def split_ranges(mm: mmap.mmap, start: int, end: int, chunk_bytes: int) -> list[tuple[int, int]]:
+    """
+    Cut [start, end) into ranges of about chunk_bytes, each ending right after a newline.
+    """
+    ranges: list[tuple[int, int]] = []
+    pos = start
+    while pos < end:
+        cut = min(pos + chunk_bytes, end)
+        if cut < end:
+            nl = mm.find(b"\n", cut - 1, end)
+            cut = end if nl == -1 else nl + 1
+        ranges.append((pos, cut))
+        pos = cut
+    return ranges
+
+
+def _scan_range(table_args: tuple, byte_range: tuple[int, int], headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, crlf: bool, max_rows: int | None) -> list[list[Any]]:
+    # Chạy trong worker process: import ở đây để tránh import vòng với table.py
+    from server.database.entities.table import Table
+    table = Table(*table_args)
+    start, end = byte_range
+    return table._scan_csv_range(start, end, headers, select_cols, ast, use_vectorized, crlf, max_rows)
+
+
+def _scan_blocks(table_args: tuple, block_ids: list[int], headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, crlf: bool, max_rows: int | None) -> list[list[Any]]:
+    from server.database.entities.table import Table
+    table = Table(*table_args)
+    return table._scan_segment_blocks(block_ids, headers, select_cols, ast, use_vectorized, max_rows)
+
+
+def _aggregate_range(table_args: tuple, byte_range: tuple[int, int], headers: list[str], aggregates: list[Any], group_by: list[str] | None, ast: Any, use_vectorized: bool, crlf: bool) -> list[Any]:
+    from server.database.entities.table import Table
+    table = Table(*table_args)
+    return table._aggregate_task(byte_range, headers, aggregates, group_by, ast, use_vectorized, crlf, segments=False)
+
+
+def _aggregate_blocks(table_args: tuple, block_ids: list[int], headers: list[str], aggregates: list[Any], group_by: list[str] | None, ast: Any, use_vectorized: bool, crlf: bool) -> list[Any]:
+    from server.database.entities.table import Table
+    table = Table(*table_args)
+    return table._aggregate_task(block_ids, headers, aggregates, group_by, ast, use_vectorized, crlf, segments=True)
+
+
+def scan(
+    table_args: tuple,
+    ranges: list[Any],
+    headers: list[str],
+    select_cols: list[str],
+    ast: Any,
+    use_vectorized: bool,
+    workers: int,
+    ordered: bool = True,
+    crlf: bool = False,
+    max_rows: int | None = None,
+    segments: bool = False,
+    aggregates: list[Any] | None = None,
+    group_by: list[str] | None = None,
+) -> Iterator[Any]:
+    """
+    Yield typed projected rows of all ranges. At most 2 * workers ranges are in flight,
+    so memory stays bounded however far ahead the pool is; pending ranges are cancelled
+    when the consumer closes the generator.
+    max_rows (LIMIT): no range returns more rows than that, and no new range is
+    submitted once that many rows have come back.
+    segments=True: mỗi phần tử của ranges là một nhóm block của segments thay vì byte range.
+    aggregates: mỗi worker trả về state của các aggregate trên range của nó thay vì các
+    dòng (select_cols không dùng): yield một state cho mỗi range, hoặc với group_by
+    (GROUP BY) các cặp (key của nhóm, state) của mọi nhóm gặp trong range.
+    """
+    executor = get_executor(workers)
+    tasks = iter(ranges)
+    pending: deque[Future] = deque()
+
+    def submit_next() -> None:
+        for task in tasks:
+            if aggregates is not None:
+                worker_fn = _aggregate_blocks if segments else _aggregate_range
+                pending.append(executor.submit(worker_fn, table_args, task, headers, aggregates, group_by, ast, use_vectorized, crlf))
+            else:
+                worker_fn = _scan_blocks if segments else _scan_range
+                pending.append(executor.submit(worker_fn, table_args, task, headers, select_cols, ast, use_vectorized, crlf, max_rows))
+            return
+
+    produced = 0
+    try:
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            if ordered:
+                done = pending.popleft()
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = next(iter(finished))
+                pending.remove(done)
+            rows = done.result()
+            produced += len(rows)
+            if max_rows is None or produced < max_rows:
+                submit_next()
+            yield from rows
+    except BrokenProcessPool as e:
+        shutdown()
+        raise dpapi2_exception.OperationalError("Parallel scan worker died unexpectedly.") from e
+    finally:
+        for future in pending:
+            future.cancel()
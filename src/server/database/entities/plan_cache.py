@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+# =========================================
+# LRU cache of validated query plans.
+# Key: (database, catalog version = signature of metadata.json, normalized SQL text),
+# so a change of metadata.json makes every older entry unreachable (they age out of
+# the LRU). A cached plan is shared by concurrent queries and must be treated as
+# read-only.
+# =========================================
+
+
+class QueryPlan:
+    """
+    Kết quả parse + validate một câu truy vấn: cột đã chuẩn hoá, Table đã resolve, AST
+    của WHERE (filter compile từ AST được memo trong table.py), các hàm aggregate, cột GROUP BY, ORDER BY và DISTINCT. Chạy bằng
+    DatabaseEngine.execute_plan.
+    """
+    def __init__(self, columns: list[Any], table: Any, ast: Any, limit: int | None, offset: int, aggregates: list[Any] | None = None, group_by: list[str] | None = None, order_by: list[tuple[Any, bool]] | None = None, distinct: bool = False, join: Any = None):
+        self.columns = columns
+        # Các hàm aggregate của SELECT (aggregates.Aggregate), rỗng nếu truy vấn trả về từng dòng
+        self.aggregates = aggregates or []
+        # Các cột GROUP BY (None nếu không có GROUP BY)
+        self.group_by = group_by
+        # Các mục ORDER BY: (tên cột hoặc Aggregate, descending); None nếu không sắp xếp
+        self.order_by = order_by
+        # SELECT DISTINCT: khử dòng trùng (distinct.py) trước ORDER BY / LIMIT
+        self.distinct = distinct
+        # FROM nhiều bảng: join.JoinPlan (table / ast là None, WHERE đã tách trong JoinPlan)
+        self.join = join
+        self.table = table
+        self.ast = ast
+        self.limit = limit
+        self.offset = offset
+
+    def __repr__(self):
+        source = self.join if self.join is not None else self.table.name
+        return f"QueryPlan({self.columns} FROM {source} WHERE {self.ast} LIMIT {self.limit} OFFSET {self.offset})"
+
+
+class PlanCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._plans: OrderedDict[tuple, QueryPlan] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_plan(self, key: tuple, plan_fn: Callable[[], QueryPlan]) -> QueryPlan:
+        """
+        Plan đã cache cho key, hoặc gọi plan_fn() rồi cache kết quả (lỗi parse /
+        validate không được cache). max_size = 0 tắt cache.
+        """
+        if self.max_size <= 0:
+            return plan_fn()
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = plan_fn()
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def __len__(self):
+        return len(self._plans)
@@ -0,0 +1,313 @@
+import os
+import bisect
+from typing import Any
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import is_leaf, column_comparison, in_list
+from server.database.entities.index import IndexScan, KeyRange, OrderedIndexScan, key_ranges
+from server.database.entities.statistics import TableStatistics
+from server.database.entities.zone_map import ZoneMap, block_may_match
+from server.utils.exceptions import dpapi2_exception
+
+# =========================================
+# Cost-based choice of the physical access path of a single-table query, made at
+# execution time (after plan_cache) from the table's ANALYZE statistics:
+#   "scan"      sequential scan of the best copy of the table (resident / columnar /
+#               compressed segments / CSV through the mmap, skipping zone map blocks)
+#   "parallel"  the same CSV / segments scan split over the process pool
+#   "index"     row offsets from a sorted / hash index, then one seek per row
+# Selectivity of the WHERE is estimated from the equi-depth histograms and distinct
+# counts; costs are in microseconds, calibrated on a 200k rows table.
+# Without statistics the old rules apply (index if it returns few enough rows,
+# parallel above PARALLEL_MIN_BYTES).
+#
+# ORDER BY on one column with a sorted index (choose_order_path): reading the rows in
+# index order needs no sort and stops after offset + limit matching rows; it is chosen
+# when that is cheaper than the access path above followed by a sort (sort.py).
+# =========================================
+
+ACCESS_PATHS = ("auto", "scan", "parallel", "index")
+
+# Selectivity mặc định khi không ước lượng được (biểu thức, kiểu không khớp...)
+DEFAULT_EQ_SELECTIVITY = 0.005
+DEFAULT_SELECTIVITY = 1 / 3
+# Số giá trị đầu của một IN list được ước lượng riêng (list vài nghìn ID: ngoại suy phần còn lại)
+IN_ESTIMATE_VALUES = 64
+
+# Chi phí (µs): filter một dòng khi scan CSV / bản đã có kiểu (columnar, resident),
+# cast + serialize một dòng kết quả, đọc một dòng qua index (seek + parse),
+# gửi task cho process pool, gửi một dòng kết quả từ worker về
+SCAN_ROW_COST = 1.2
+TYPED_SCAN_ROW_COST = 0.2
+OUTPUT_ROW_COST = 2.8
+INDEX_ROW_COST = 4.0
+INDEX_LOOKUP_COST = 50.0
+PARALLEL_STARTUP_COST = 20_000.0
+PARALLEL_ROW_TRANSFER_COST = 5.0
+# Sort một dòng khớp (so sánh key + giữ dòng trong heap / run)
+SORT_ROW_COST = 1.5
+
+
+class AccessPath:
+    """
+    Đường truy cập đã chọn: kind (xem ACCESS_PATHS), index_scan nếu kind == "index",
+    parallel truyền cho Table.select (None = để scan tự quyết như trước).
+    """
+    def __init__(self, kind: str, cost: float | None = None, rows: float | None = None, index_scan: IndexScan | None = None, parallel: bool | None = None):
+        self.kind = kind
+        self.cost = cost
+        self.rows = rows
+        self.index_scan = index_scan
+        self.parallel = parallel
+
+    def __repr__(self):
+        cost = "" if self.cost is None else f", cost={self.cost:.0f}us, rows={self.rows:.0f}"
+        return f"AccessPath({self.kind}{cost})"
+
+
+def _fraction_below(histogram: list[Any], value: Any) -> float | None:
+    """
+    Tỉ lệ giá trị < value theo histogram equi-depth (nội suy tuyến tính trong bucket với cột số).
+    """
+    if len(histogram) < 2:
+        return None
+    try:
+        pos = bisect.bisect_left(histogram, value)
+    except TypeError:
+        return None
+    if pos == 0:
+        return 0.0
+    if pos == len(histogram):
+        return 1.0
+    lo, hi = histogram[pos - 1], histogram[pos]
+    inside = 0.5
+    if isinstance(value, (int, float)) and isinstance(lo, (int, float)) and hi != lo:
+        inside = (value - lo) / (hi - lo)
+    return (pos - 1 + inside) / (len(histogram) - 1)
+
+
+def _equal_selectivity(column: dict[str, Any], value: Any, non_empty: float) -> float:
+    low, high = column.get("min"), column.get("max")
+    try:
+        if low is None or value < low or value > high:
+            return 0.0
+    except TypeError:
+        return DEFAULT_EQ_SELECTIVITY
+    distinct = column.get("distinct") or 0
+    return non_empty / distinct if distinct else 0.0
+
+
+def comparison_selectivity(stats: TableStatistics | None, column: str, op: str, value: Any) -> float:
+    """
+    Tỉ lệ dòng thỏa `column op value` theo thống kê của cột (mặc định cố định nếu không có).
+    """
+    info = stats.column(column) if stats is not None else None
+    if info is None or not stats.row_count:
+        if op in ("=", "!="):
+            return DEFAULT_EQ_SELECTIVITY if op == "=" else 1.0 - DEFAULT_EQ_SELECTIVITY
+        return DEFAULT_SELECTIVITY
+    # Histogram / distinct chỉ tính trên các field không rỗng
+    non_empty = 1.0 - info.get("empty", 0) / stats.row_count
+    equal = _equal_selectivity(info, value, non_empty)
+    if op == "=":
+        return equal
+    if op == "!=":
+        return max(0.0, 1.0 - equal)
+    below = _fraction_below(info.get("histogram") or [], value)
+    if below is None:
+        return DEFAULT_SELECTIVITY
+    below *= non_empty
+    if op == "<":
+        return below
+    if op == "<=":
+        return min(1.0, below + equal)
+    if op == ">":
+        return max(0.0, non_empty - below - equal)
+    return max(0.0, non_empty - below)
+
+
+def selectivity(node: ExpressionNode | None, stats: TableStatistics | None, column_types: dict[str, str]) -> float:
+    """
+    Ước lượng tỉ lệ dòng thỏa WHERE (AND: nhân, OR: a + b - ab, coi các điều kiện độc lập).
+    """
+    if node is None:
+        return 1.0
+    if is_leaf(node):
+        if isinstance(node.value, bool):
+            return 1.0 if node.value else 0.0
+        return DEFAULT_SELECTIVITY
+    op = str(node.value).upper()
+    if op == "NOT" and node.right is None:
+        return 1.0 - selectivity(node.left, stats, column_types)
+    if op == "AND":
+        return selectivity(node.left, stats, column_types) * selectivity(node.right, stats, column_types)
+    if op == "OR":
+        left, right = selectivity(node.left, stats, column_types), selectivity(node.right, stats, column_types)
+        return left + right - left * right
+    members = in_list(node, column_types)
+    if members is not None:
+        column, values = members
+        if any(isinstance(v, str) != (column_types[column] == "string") for v in values):
+            return DEFAULT_SELECTIVITY
+        return in_selectivity(stats, column, values)
+    comparison = column_comparison(node, column_types)
+    if comparison is None:
+        return DEFAULT_SELECTIVITY
+    column, op, value = comparison
+    if isinstance(value, str) != (column_types[column] == "string"):
+        return DEFAULT_SELECTIVITY
+    return comparison_selectivity(stats, column, op, value)
+
+
+def in_selectivity(stats: TableStatistics | None, column: str, values: Any) -> float:
+    """
+    Tỉ lệ dòng thỏa `column IN values`: tổng selectivity của từng giá trị (ước lượng trên
+    tối đa IN_ESTIMATE_VALUES giá trị rồi nhân theo số giá trị).
+    """
+    values = list(values)
+    if not values:
+        return 0.0
+    sample = values[:IN_ESTIMATE_VALUES]
+    equal = sum(comparison_selectivity(stats, column, "=", v) for v in sample)
+    return min(1.0, equal * len(values) / len(sample))
+
+
+def key_range_selectivity(stats: TableStatistics, key_range: KeyRange) -> float:
+    if key_range.empty:
+        return 0.0
+    if key_range.values is not None:
+        return in_selectivity(stats, key_range.column, key_range.members())
+    if key_range.low is not None and key_range.low == key_range.high:
+        return comparison_selectivity(stats, key_range.column, "=", key_range.low)
+    fraction = 1.0
+    if key_range.high is not None:
+        fraction = comparison_selectivity(stats, key_range.column, "<=" if key_range.high_inclusive else "<", key_range.high)
+    if key_range.low is not None:
+        fraction -= comparison_selectivity(stats, key_range.column, "<" if key_range.low_inclusive else "<=", key_range.low)
+    return max(0.0, fraction)
+
+
+def _scanned_fraction(table: Any, ast: Any) -> float:
+    # Tỉ lệ dòng nằm trong các block zone map không loại được (1.0 nếu không có zone map)
+    if ast is None:
+        return 1.0
+    zone_map = ZoneMap.load(table.db_path, table.name, table.csv_path)
+    if zone_map is None or not zone_map.blocks:
+        return 1.0
+    # Các dòng được append sau khi build zone map luôn phải scan
+    appended = zone_map.appended_rows()
+    total = sum(b["rows"] for b in zone_map.blocks) + appended
+    kept = sum(b["rows"] for b in zone_map.blocks if block_may_match(ast, b, table.column_types)) + appended
+    return kept / total if total else 1.0
+
+
+def _typed_source(table: Any) -> bool:
+    columnar = table._open_columnar()
+    if columnar is None:
+        return False
+    columnar.close()
+    return True
+
+
+def choose_access_path(table: Any, ast: Any, limit: int | None = None, offset: int = 0, force: str | None = None, workers: int = 1, chunk_bytes: int = 1) -> AccessPath:
+    """
+    Chọn đường truy cập rẻ nhất cho `SELECT ... FROM table WHERE ast LIMIT limit OFFSET offset`.
+    workers / chunk_bytes: process pool của parallel scan (mỗi task ~chunk_bytes).
+    force: "scan" / "parallel" / "index" để ép một đường (test, so sánh), "auto" / None để chọn theo chi phí.
+    """
+    force = force or "auto"
+    if force not in ACCESS_PATHS:
+        raise dpapi2_exception.ProgrammingError(f"Unknown access path '{force}', expected one of {list(ACCESS_PATHS)}.")
+    if force == "scan":
+        return AccessPath("scan", parallel=False)
+    if force == "parallel":
+        return AccessPath("parallel", parallel=True)
+    if force == "index":
+        index_scan = _forced_index(table, ast)
+        return AccessPath("index", rows=len(index_scan.offsets), index_scan=index_scan)
+
+    stats = table.get_statistics()
+    if stats is None:
+        index_scan = table.choose_index(ast)
+        return AccessPath("index" if index_scan is not None else "scan", index_scan=index_scan)
+
+    rows = stats.row_count
+    matched = rows * selectivity(ast, stats, table.column_types)
+    # Không ORDER BY: scan dừng khi đủ offset + limit dòng khớp
+    wanted = matched if limit is None else min(matched, offset + limit)
+    stop_fraction = wanted / matched if matched else 1.0
+
+    typed = _typed_source(table)
+    scan_fraction = 1.0 if typed else _scanned_fraction(table, ast)
+    scan_cost = rows * scan_fraction * (TYPED_SCAN_ROW_COST if typed else SCAN_ROW_COST)
+    paths = [AccessPath("scan", scan_cost * stop_fraction + wanted * OUTPUT_ROW_COST, wanted, parallel=False)]
+    # Số worker thực sự chạy: không nhiều hơn số chunk cần scan
+    scan_bytes = (table.data_signature() or [0, 0])[1] * scan_fraction
+    degree = min(workers, -(-int(scan_bytes) // max(1, chunk_bytes)))
+    if not typed and degree > 1 and not (ast is None and limit is not None):
+        # Filter chia cho các worker; dòng kết quả vẫn đi qua pipe rồi được serialize ở process chính
+        cost = PARALLEL_STARTUP_COST + scan_cost / degree + matched * (PARALLEL_ROW_TRANSFER_COST + OUTPUT_ROW_COST)
+        paths.append(AccessPath("parallel", cost, wanted, parallel=True))
+
+    index_paths = []
+    for column, kind, key_range, index in table.index_candidates(ast):
+        if kind == "sorted":
+            fetched = index.matched(key_range)
+        else:
+            fetched = rows * key_range_selectivity(stats, key_range)
+        # Index trả về mọi dòng thỏa key_range trước khi áp LIMIT; IN: một lookup mỗi giá trị
+        lookups = len(key_range.members()) if key_range.values is not None else 1
+        cost = INDEX_LOOKUP_COST * lookups + fetched * INDEX_ROW_COST + wanted * OUTPUT_ROW_COST
+        index_paths.append((cost, column, kind, key_range, index))
+    if index_paths:
+        cost, column, kind, key_range, index = min(index_paths, key=lambda p: p[0])
+        paths.append(AccessPath("index", cost, wanted, index_scan=(column, kind, key_range, index)))
+
+    best = min(paths, key=lambda p: p.cost)
+    if best.kind == "index":
+        best.index_scan = table.index_scan(*best.index_scan)
+    return best
+
+
+def _forced_index(table: Any, ast: Any) -> IndexScan:
+    scans = [table.index_scan(*candidate) for candidate in table.index_candidates(ast)]
+    if not scans:
+        raise dpapi2_exception.NotSupportedError(f"No index of table '{table.name}' can be used for this WHERE clause.")
+    return min(scans, key=lambda scan: len(scan.offsets))
+
+
+def choose_order_path(table: Any, ast: Any, order_by: list[tuple[str, bool]], limit: int | None = None, offset: int = 0, force: str | None = None) -> OrderedIndexScan | None:
+    """
+    `SELECT ... WHERE ast ORDER BY column [DESC] LIMIT limit OFFSET offset`: trả về
+    OrderedIndexScan nếu đọc theo sorted index của column (không sort) rẻ hơn scan + sort,
+    ngược lại None. force "scan" / "parallel" tắt đường này, "index" chọn nó nếu có index.
+    """
+    force = force or "auto"
+    if force in ("scan", "parallel") or len(order_by) != 1:
+        return None
+    column, descending = order_by[0]
+    if table.indexes.get(column) != "sorted" or not os.path.exists(table.csv_path):
+        return None
+    try:
+        index = table._get_index("sorted", column)
+    except dpapi2_exception.NotSupportedError:
+        return None
+    if index is None:
+        return None
+    # Chỉ đọc phần index nằm trong khoảng WHERE cho phép trên column
+    key_range = key_ranges(ast, table.column_types, {column}).get(column, KeyRange(column)) if ast is not None else KeyRange(column)
+    lo, hi = index.bounds(key_range)
+    order_scan = OrderedIndexScan(column, descending, key_range, index, lo, hi)
+    if force == "index":
+        return order_scan
+
+    stats = table.get_statistics()
+    rows = stats.row_count if stats is not None else index.count
+    matched = rows * selectivity(ast, stats, table.column_types)
+    wanted = matched if limit is None else min(matched, offset + limit)
+    # Dòng trong [lo, hi) khớp phần còn lại của WHERE với tỉ lệ matched / (hi - lo): đọc tới khi đủ wanted
+    fetched = hi - lo if not matched else min(hi - lo, wanted * (hi - lo) / matched)
+    index_cost = INDEX_LOOKUP_COST + fetched * INDEX_ROW_COST + wanted * OUTPUT_ROW_COST
+    typed = _typed_source(table)
+    scan_fraction = 1.0 if typed else _scanned_fraction(table, ast)
+    sort_cost = rows * scan_fraction * (TYPED_SCAN_ROW_COST if typed else SCAN_ROW_COST) + matched * SORT_ROW_COST + wanted * OUTPUT_ROW_COST
+    return order_scan if index_cost < sort_cost else None
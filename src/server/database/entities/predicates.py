@@ -0,0 +1,149 @@
+import functools
+import re
+from typing import Any
+from server.database.entities.ast import ExpressionNode
+
+# =========================================
+# Helpers to read simple predicates out of a validated WHERE tree
+# (used by zone maps and indexes to decide what a query can skip).
+# =========================================
+
+# Chuẩn hoá toán tử so sánh: "==" -> "=", "<>" -> "!="
+CANONICAL_OPS = {"=": "=", "==": "=", "!=": "!=", "<>": "!=", "<": "<", ">": ">", "<=": "<=", ">=": ">="}
+
+# Số pattern LIKE đã compile giữ lại (regex dùng chung giữa các truy vấn)
+_LIKE_CACHE_SIZE = 256
+
+# Đảo chiều khi literal nằm bên trái: 5 < id  <=>  id > 5
+FLIPPED_OPS = {"=": "=", "!=": "!=", "<": ">", ">": "<", "<=": ">=", ">=": "<="}
+
+
+def is_leaf(node: ExpressionNode) -> bool:
+    return node.left is None and node.right is None
+
+
+def constant_value(node: ExpressionNode | None) -> bool | None:
+    """
+    True / False nếu node là hằng boolean (sau khi rút gọn WHERE), ngược lại None.
+    """
+    if node is not None and is_leaf(node) and isinstance(node.value, bool):
+        return node.value
+    return None
+
+
+def literal_value(node: ExpressionNode) -> tuple[bool, Any]:
+    """
+    (True, value) nếu node là literal số hoặc chuỗi (đã bỏ nháy), ngược lại (False, None).
+    """
+    if not is_leaf(node):
+        return False, None
+    v = node.value
+    if isinstance(v, (int, float)):
+        return True, v
+    if isinstance(v, str) and len(v) >= 2 and ((v[0] == v[-1] == '"') or (v[0] == v[-1] == "'")):
+        return True, v[1:-1]
+    return False, None
+
+
+def column_comparison(node: ExpressionNode, column_types: dict[str, str]) -> tuple[str, str, Any] | None:
+    """
+    Nếu node có dạng `column op literal` (hoặc `literal op column`) thì trả về
+    (column, canonical_op, literal) với column luôn ở bên trái; ngược lại None.
+    """
+    if node is None or is_leaf(node) or node.right is None:
+        return None
+    op = CANONICAL_OPS.get(str(node.value).upper())
+    if op is None:
+        return None
+    left, right = node.left, node.right
+    if is_leaf(left) and isinstance(left.value, str) and left.value in column_types:
+        ok, value = literal_value(right)
+        if ok:
+            return left.value, op, value
+    if is_leaf(right) and isinstance(right.value, str) and right.value in column_types:
+        ok, value = literal_value(left)
+        if ok:
+            return right.value, FLIPPED_OPS[op], value
+    return None
+
+
+def conjuncts(node: ExpressionNode | None) -> list[ExpressionNode]:
+    """
+    Tách cây AND thành danh sách các điều kiện con (a AND (b AND c) -> [a, b, c]).
+    """
+    if node is None:
+        return []
+    if not is_leaf(node) and node.right is not None and str(node.value).upper() == "AND":
+        return conjuncts(node.left) + conjuncts(node.right)
+    return [node]
+
+
+def in_list(node: ExpressionNode, column_types: dict[str, str]) -> tuple[str, frozenset] | None:
+    """
+    Nếu node có dạng `column IN (literal, ...)` thì trả về (column, frozenset các giá trị), ngược lại None.
+    """
+    if node is None or is_leaf(node) or node.right is None or str(node.value).upper() != "IN":
+        return None
+    left = node.left
+    if is_leaf(left) and isinstance(left.value, str) and left.value in column_types:
+        return left.value, node.right.value
+    return None
+
+
+def sorted_members(values: frozenset) -> list[Any]:
+    """
+    Các giá trị của một IN list theo thứ tự ổn định (số trước chuỗi): source sinh ra từ
+    cùng một list luôn giống nhau, nên memo filter theo source vẫn trúng.
+    """
+    return sorted(values, key=lambda v: (isinstance(v, str), v))
+
+
+def like_prefix(pattern: str) -> tuple[str, bool] | None:
+    """
+    LIKE không cần regex: (text, True) nếu pattern không có wildcard (so sánh bằng),
+    (prefix, False) nếu pattern là `prefix%` (một khoảng chuỗi); ngược lại None.
+    `\\` escape ký tự ngay sau nó (vd. `50\\%` là chuỗi "50%").
+    """
+    chars = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            chars.append(pattern[i + 1])
+            i += 2
+            continue
+        if c == "_":
+            return None
+        if c == "%":
+            return ("".join(chars), False) if pattern[i:].strip("%") == "" else None
+        chars.append(c)
+        i += 1
+    return "".join(chars), True
+
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    """
+    Chuỗi nhỏ nhất lớn hơn mọi chuỗi bắt đầu bằng prefix (prefix <= s < bound), None nếu không có.
+    """
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+@functools.lru_cache(maxsize=_LIKE_CACHE_SIZE)
+def like_regex(pattern: str) -> re.Pattern:
+    """
+    Regex (dùng với fullmatch) của một pattern LIKE: `%` mọi chuỗi, `_` đúng một ký tự.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        parts.append(".*" if c == "%" else "." if c == "_" else re.escape(c))
+        i += 1
+    return re.compile("".join(parts), re.DOTALL)
@@ -0,0 +1,234 @@
+import os
+import copy
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Iterable
+from server.database.entities.columnar import ColumnarTable, column_files, _encode_strings, _FIXED_TYPECODES, _OFFSET_TYPECODE
+from server.database.entities.encoding import DictionaryTracker, RangeTracker
+from server.config.settings import RESIDENT_MEMORY_BYTES
+from server.utils.file_utils import appended_since
+from server.utils.exceptions import dpapi2_exception
+
+# =========================================
+# Resident ("hot") tables: the whole table decoded once into typed in-memory arrays
+# with the same layout as the columnar copy (int64 / float64 arrays, strings as uint64
+# offsets + one utf-8 buffer, or their dictionary / frame-of-reference encodings),
+# served through the ColumnarTable read interface.
+# Tables listed in settings.RESIDENT_TABLES are loaded on first query. All resident
+# copies share one memory budget; the least recently used ones are dropped (the table
+# goes back to being read from disk) when a new copy does not fit.
+# Rows appended to the CSV (INSERT) are read from the CSV after the copy (see
+# ColumnarTable.appended) until they exceed MAX_APPENDED_FRACTION of it; the copy is
+# then loaded again.
+# =========================================
+
+# Phần CSV được append sau khi load (theo byte) tối đa so với phần đã có trong RAM
+MAX_APPENDED_FRACTION = 0.25
+
+
+class ResidentTable(ColumnarTable):
+    """
+    Bản in-memory của một bảng. Giống ColumnarTable (cùng layout và encoding) nhưng các
+    "file" cột là buffer trong RAM; close() không giải phóng gì vì bản này được nhiều
+    truy vấn dùng chung.
+    """
+    def __init__(self, columns: list[dict[str, Any]], buffers: dict[str, Any], row_count: int, source: list[int] | None, source_state: dict[str, Any] | None = None):
+        self.headers = [c["name"] for c in columns]
+        self.columns = {c["name"]: c for c in columns}
+        self.row_count = row_count
+        self.source = source
+        # {"source", append_state của CSV}: None nếu không nhận dòng append (vd. load từ segments)
+        self.source_state = source_state
+        self.appended: tuple[int, int] | None = None
+        self._buffers = buffers
+        self._dictionaries: dict[str, list[str]] = {}
+        self.nbytes = sum(memoryview(b).nbytes for b in buffers.values())
+
+    def _view(self, filename: str, typecode: str | None) -> memoryview | None:
+        buffer = self._buffers[filename]
+        if len(buffer) == 0:
+            return None
+        return memoryview(buffer)
+
+    def close(self) -> None:
+        pass
+
+    def with_appended(self, csv_path: str, signature: list[int]) -> "ResidentTable | None":
+        """
+        Bản này nhìn từ CSV có signature: chính nó nếu khớp, bản sao nông với `appended`
+        nếu CSV chỉ được append thêm (không quá MAX_APPENDED_FRACTION), ngược lại None.
+        """
+        if self.source == signature:
+            return self
+        state = self.source_state
+        if state is None or not appended_since(csv_path, state, signature):
+            return None
+        if signature[1] - state["size"] > MAX_APPENDED_FRACTION * state["size"]:
+            return None
+        view = copy.copy(self)
+        view.appended = (state["size"], signature[1])
+        return view
+
+
+def load_from_rows(headers: list[str], column_types: dict[str, str], rows: Iterable[tuple], source: list[int] | None, source_state: dict[str, Any] | None = None) -> ResidentTable:
+    """
+    Decode các dòng đã cast (theo thứ tự header) thành mảng từng cột, rồi encode các
+    cột có lợi (dictionary / frame of reference) như bản columnar.
+    """
+    values: list[list[Any]] = [[] for _ in headers]
+    appends = [v.append for v in values]
+    row_count = 0
+    for row in rows:
+        for append, value in zip(appends, row):
+            append(value)
+        row_count += 1
+
+    columns: list[dict[str, Any]] = []
+    buffers: dict[str, Any] = {}
+    for name, column in zip(headers, values):
+        meta, column_buffers = _encode_column(name, column_types[name], column, row_count)
+        columns.append(meta)
+        buffers.update(column_buffers)
+    return ResidentTable(columns, buffers, row_count, source, source_state)
+
+
+def _encode_column(name: str, col_type: str, values: list[Any], row_count: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    """
+    (mô tả cột như trong manifest columnar, {tên "file": buffer}) của một cột.
+    """
+    if col_type == "string":
+        tracker = DictionaryTracker()
+        ids = [tracker.add(v) for v in values] if values else []
+        plan = tracker.finish(row_count)
+        if plan is not None:
+            dictionary, remap, typecode = plan
+            offsets, data = _encode_strings(dictionary)
+            meta = {"name": name, "type": col_type, "codes": f"{name}.codes", "dict_offsets": f"{name}.dict.off",
+                    "dict_data": f"{name}.dict.dat", "encoding": "dict", "code_type": typecode, "dict_size": len(dictionary)}
+            return meta, {meta["codes"]: array(typecode, [remap[i] for i in ids]), meta["dict_offsets"]: offsets, meta["dict_data"]: data}
+        offsets, data = _encode_strings(values)
+        meta = {"name": name, "type": col_type, "offsets": f"{name}.off", "data": f"{name}.dat"}
+        return meta, {meta["offsets"]: offsets, meta["data"]: data}
+
+    if col_type == "integer":
+        tracker = RangeTracker()
+        tracker.add_many(values)
+        plan = tracker.finish()
+        if plan is not None:
+            reference, typecode = plan
+            meta = {"name": name, "type": col_type, "file": f"{name}.for", "encoding": "for", "code_type": typecode,
+                    "reference": reference, "max_code": tracker.high - reference}
+            return meta, {meta["file"]: array(typecode, [v - reference for v in values])}
+    meta = {"name": name, "type": col_type, "file": f"{name}.col"}
+    return meta, {meta["file"]: array(_FIXED_TYPECODES[col_type], values)}
+
+
+def load_from_columnar(columnar: ColumnarTable, source: list[int] | None, source_state: dict[str, Any] | None = None) -> ResidentTable:
+    """
+    Copy nguyên các file của bản columnar vào RAM (cùng layout / encoding, không decode lại).
+    """
+    buffers: dict[str, Any] = {}
+    for name in columnar.headers:
+        for filename, typecode in column_files(columnar.columns[name]):
+            with open(os.path.join(columnar.directory, filename), "rb") as f:
+                raw = f.read()
+            if typecode is None:
+                buffers[filename] = raw
+            else:
+                values = array(typecode)
+                values.frombytes(raw)
+                if typecode == _OFFSET_TYPECODE and len(values) == 0:
+                    values.append(0)
+                buffers[filename] = values
+    return ResidentTable([columnar.columns[name] for name in columnar.headers], buffers, columnar.row_count, source, source_state)
+
+
+class ResidentStore:
+    """
+    Các bản resident của mọi bảng, LRU trong giới hạn memory_bytes.
+    """
+    def __init__(self, memory_bytes: int):
+        self.memory_bytes = memory_bytes
+        self._tables: OrderedDict[tuple[str, str], ResidentTable] = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+        self._load_locks: dict[tuple[str, str], threading.Lock] = {}
+        # Bảng lớn hơn cả budget: signature CSV lúc thử load, để không load lại mỗi truy vấn
+        self._too_large: dict[tuple[str, str], list[int]] = {}
+
+    def get(self, table: Any) -> ResidentTable | None:
+        """
+        Bản resident còn khớp với CSV của bảng, load nếu chưa có / đã cũ.
+        None nếu bảng không vừa memory budget (khi đó đọc từ đĩa như bình thường).
+        """
+        key = (table.db_path, table.name)
+        signature = table.data_signature()
+        if signature is None:
+            raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{table.csv_path}'.")
+        resident = self._lookup(key, table.csv_path, signature)
+        if resident is not None or self._too_large.get(key) == signature:
+            return resident
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # Truy vấn khác có thể vừa load xong trong lúc chờ lock
+            resident = self._lookup(key, table.csv_path, signature)
+            if resident is not None or self._too_large.get(key) == signature:
+                return resident
+            resident = table.load_resident()
+            if resident.source != signature:
+                # CSV đổi trong lúc load: dùng cho truy vấn này nhưng không giữ lại
+                return resident
+            if not self._insert(key, resident):
+                self._too_large[key] = signature
+                return None
+            return resident
+
+    def _lookup(self, key: tuple[str, str], csv_path: str, signature: list[int]) -> ResidentTable | None:
+        with self._lock:
+            resident = self._tables.get(key)
+            if resident is None:
+                return None
+            view = resident.with_appended(csv_path, signature)
+            if view is None:
+                self._evict(key)
+                return None
+            self._tables.move_to_end(key)
+            return view
+
+    def _insert(self, key: tuple[str, str], resident: ResidentTable) -> bool:
+        with self._lock:
+            if key in self._tables:
+                self._evict(key)
+            if resident.nbytes > self.memory_bytes:
+                return False
+            self._too_large.pop(key, None)
+            while self._tables and self._used + resident.nbytes > self.memory_bytes:
+                self._evict(next(iter(self._tables)))
+            self._tables[key] = resident
+            self._used += resident.nbytes
+            return True
+
+    def _evict(self, key: tuple[str, str]) -> None:
+        # Truy vấn đang chạy vẫn giữ tham chiếu tới bản cũ; RAM được trả khi chúng xong
+        resident = self._tables.pop(key)
+        self._used -= resident.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
+            self._too_large.clear()
+            self._used = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "tables": [f"{os.path.basename(db_path)}.{name}" for db_path, name in self._tables],
+                "bytes": self._used,
+                "budget": self.memory_bytes,
+            }
+
+
+store = ResidentStore(RESIDENT_MEMORY_BYTES)
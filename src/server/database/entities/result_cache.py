@@ -0,0 +1,194 @@
+import os
+import io
+import atexit
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator
+
+# =========================================
+# Cache of serialized query results, in front of the scan.
+# Key: (plan cache key, signature [mtime_ns, size, inode] of the table's CSV), so any
+# change of the table file makes its old results unreachable (they age out of the LRU).
+# Value: the complete JSON response body ('[' + rows joined by ',\n' + ']').
+#   - in memory while the total stays within the memory budget (LRU by bytes);
+#   - entries pushed out of memory (or too large for it) spill to one file each in
+#     a per-process directory, itself bounded by a disk budget (LRU by bytes).
+# A result is only stored once its scan ran to the end (not on error / early close).
+# =========================================
+
+BODY_OPEN = "["
+ROW_SEPARATOR = ",\n"
+BODY_CLOSE = "]"
+
+# Kích thước mỗi lần đọc file spill khi gửi cho client
+READ_CHUNK_BYTES = 1 << 20
+
+
+class CachedResult:
+    """
+    Body JSON đã serialize của một kết quả: bytes trong RAM, hoặc file spill đã mở
+    sẵn lúc lookup (vẫn đọc được kể cả khi entry bị evict và file bị xoá sau đó).
+    """
+    def __init__(self, size: int, data: bytes | None = None, file: io.BufferedReader | None = None):
+        self.size = size
+        self.data = data
+        self.file = file
+
+    def iter_chunks(self, chunk_bytes: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+        if self.data is not None:
+            yield self.data
+            return
+        try:
+            while True:
+                chunk = self.file.read(chunk_bytes)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Các dòng JSON của kết quả (cùng dạng Table.select), cho caller không stream body.
+        """
+        body = self.data if self.data is not None else b"".join(self.iter_chunks())
+        inner = body.decode("utf-8")[len(BODY_OPEN):-len(BODY_CLOSE)]
+        if inner:
+            yield from inner.split(ROW_SEPARATOR)
+
+
+class ResultCache:
+    def __init__(self, memory_bytes: int, disk_bytes: int, max_entry_bytes: int, cache_dir: str):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.cache_dir = cache_dir
+        self._spill_dir: str | None = None
+        self._memory: OrderedDict[tuple, bytes] = OrderedDict()
+        self._disk: OrderedDict[tuple, tuple[str, int]] = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entry_bytes > 0 and (self.memory_bytes > 0 or self.disk_bytes > 0)
+
+    def get(self, key: tuple) -> CachedResult | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return CachedResult(len(data), data=data)
+            spilled = self._disk.get(key)
+            if spilled is not None:
+                path, size = spilled
+                try:
+                    f = open(path, "rb")
+                except OSError:
+                    self._drop_spilled(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.hits += 1
+                    return CachedResult(size, file=f)
+            self.misses += 1
+            return None
+
+    def capture(self, key: tuple, rows: Iterator[str]) -> Iterator[str]:
+        """
+        Yield lại các dòng JSON của `rows`, đồng thời gom lại; nếu scan chạy hết (và
+        body không vượt max_entry_bytes) thì lưu body vào cache.
+        """
+        parts: list[str] | None = []
+        # Body = '[' + các dòng nối bằng ',\n' + ']'; json.dumps mặc định chỉ ra ASCII nên len() = số byte
+        size = len(BODY_OPEN) + len(BODY_CLOSE)
+        try:
+            for row in rows:
+                if parts is not None:
+                    size += len(row) + (len(ROW_SEPARATOR) if parts else 0)
+                    if size > self.max_entry_bytes:
+                        parts = None
+                    else:
+                        parts.append(row)
+                yield row
+        finally:
+            if hasattr(rows, "close"):
+                rows.close()
+        if parts is not None:
+            self.put(key, (BODY_OPEN + ROW_SEPARATOR.join(parts) + BODY_CLOSE).encode("utf-8"))
+
+    def put(self, key: tuple, body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._memory or key in self._disk:
+                return
+            # Kết quả quá lớn so với RAM (hơn 1/4 budget) đi thẳng xuống đĩa
+            if len(body) * 4 <= self.memory_bytes:
+                self._memory[key] = body
+                self._memory_used += len(body)
+                while self._memory_used > self.memory_bytes:
+                    old_key, old_body = self._memory.popitem(last=False)
+                    self._memory_used -= len(old_body)
+                    self._spill(old_key, old_body)
+            else:
+                self._spill(key, body)
+
+    def _spill(self, key: tuple, body: bytes) -> None:
+        if len(body) > self.disk_bytes:
+            return
+        while self._disk and self._disk_used + len(body) > self.disk_bytes:
+            self._drop_spilled(next(iter(self._disk)))
+        try:
+            path = os.path.join(self._get_spill_dir(), hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest())
+            with open(path, "wb") as f:
+                f.write(body)
+        except OSError:
+            # Không ghi được cache thì chỉ mất entry, truy vấn vẫn đúng
+            return
+        self._disk[key] = (path, len(body))
+        self._disk_used += len(body)
+
+    def _drop_spilled(self, key: tuple) -> None:
+        path, size = self._disk.pop(key)
+        self._disk_used -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _get_spill_dir(self) -> str:
+        # Thư mục riêng cho mỗi process (nhiều worker không dẫm lên file của nhau), xoá khi thoát
+        if self._spill_dir is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="results-", dir=self.cache_dir)
+            atexit.register(shutil.rmtree, self._spill_dir, True)
+        return self._spill_dir
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            for key in list(self._disk):
+                self._drop_spilled(key)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
@@ -0,0 +1,105 @@
+import sys
+import os
+from array import array
+from typing import Any
+from server.database.entities.index import _map_array
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import atomic_write_bytes, atomic_write_json, read_json, append_state, appended_since
+
+# =========================================
+# Row offset index: byte offset of every data row of the CSV, so that row N can be
+# reached with one array lookup instead of parsing the N rows before it (OFFSET paging).
+#   <table>.rows.offs   uint64 start of each valid row, plus one final entry = end of the last row
+#   <table>.rows.json   row count, signature of the CSV, and a hash of its last bytes
+# Built on first use. When the CSV only grew by rows appended after a trailing newline
+# (its old tail is unchanged) the index is extended from the old end instead of rebuilt.
+# =========================================
+
+ROW_INDEX_VERSION = 1
+
+_OFFSET_TYPECODE = "Q"
+
+
+def row_index_base(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.rows")
+
+
+def build_row_index(table: Any, previous: "RowOffsetIndex | None" = None) -> dict[str, Any]:
+    """
+    Ghi row index của bảng. previous: index cũ còn đúng cho phần đầu file, chỉ scan
+    các dòng được append sau nó.
+    """
+    signature = table.csv_signature()
+    if signature is None:
+        raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{table.csv_path}'.")
+    offsets = array(_OFFSET_TYPECODE)
+    start = None
+    if previous is not None:
+        offsets.extend(previous.offsets[:previous.count])
+        start = previous.size
+
+    end = None
+    for row_start, row_end, _ in table.iter_row_offsets(start=start, end=signature[1]):
+        offsets.append(row_start)
+        end = row_end
+    if end is None and previous is not None and previous.count:
+        end = previous.offsets[previous.count]
+    if end is not None:
+        offsets.append(end)
+
+    base = row_index_base(table.db_path, table.name)
+    atomic_write_bytes(f"{base}.offs", offsets.tobytes())
+    meta = {
+        "version": ROW_INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "source": signature,
+        "count": max(0, len(offsets) - 1),
+        **append_state(table.csv_path, signature[1]),
+    }
+    atomic_write_json(f"{base}.json", meta)
+    return meta
+
+
+class RowOffsetIndex:
+    def __init__(self, base: str, meta: dict[str, Any]):
+        self.count: int = meta["count"]
+        self.size: int = meta["size"]
+        self.source = meta["source"]
+        self._offs_mm, self.offsets = _map_array(f"{base}.offs", _OFFSET_TYPECODE)
+
+    @classmethod
+    def _load(cls, table: Any) -> tuple[dict[str, Any] | None, "RowOffsetIndex | None"]:
+        base = row_index_base(table.db_path, table.name)
+        meta = read_json(f"{base}.json")
+        if not meta or meta.get("version") != ROW_INDEX_VERSION or meta.get("byteorder") != sys.byteorder:
+            return None, None
+        try:
+            return meta, cls(base, meta)
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    @classmethod
+    def open(cls, table: Any) -> "RowOffsetIndex":
+        """
+        Row index của bảng, build (hoặc extend nếu CSV chỉ được append) khi thiếu / cũ.
+        """
+        signature = table.csv_signature()
+        meta, index = cls._load(table)
+        if index is not None and meta.get("source") == signature:
+            return index
+        previous = index if index is not None and appended_since(table.csv_path, meta, signature) else None
+        build_row_index(table, previous)
+        _, index = cls._load(table)
+        if index is None:
+            raise dpapi2_exception.InternalError(f"Cannot open row index of table '{table.name}'.")
+        return index
+
+    def byte_range(self, first: int, stop: int | None = None) -> tuple[int, int]:
+        """
+        [start, end) byte range chứa các dòng [first, stop) (stop=None: đến hết bảng).
+        Range rỗng nếu first >= số dòng.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if first >= stop:
+            return 0, 0
+        return self.offsets[first], self.offsets[stop]
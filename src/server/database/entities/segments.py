@@ -0,0 +1,176 @@
+import io
+import os
+import csv
+import lzma
+import zlib
+import mmap
+from typing import Any, Callable, Iterator
+from server.database.entities.zone_map import block_may_match
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import file_signature, atomic_write_json, read_json
+
+# =========================================
+# Block-compressed copy of a table ("segments"), for cold tables:
+#   <table>.seg        the data rows of the CSV cut into blocks of SEGMENT_BLOCK_ROWS rows,
+#                      each block compressed on its own (zlib or lzma)
+#   <table>.seg.json   block directory: header, codec, and per block its byte offset and
+#                      length in .seg, uncompressed size, row count and min / max per column
+# Blocks hold the raw CSV bytes of whole rows, so a decompressed block is scanned by the
+# same code as a byte range of the CSV. Blocks are read and decompressed one at a time
+# (memory stays bounded by one block), skipped when their min / max rule the WHERE out,
+# and handed to the process pool when the scan is parallel.
+# Once the segments are written the CSV may be removed: the table is then read from
+# the segments only (see Table.select_rows).
+# =========================================
+
+SEGMENT_VERSION = 1
+
+_COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    "zlib": lambda data: zlib.compress(data, 6),
+    "lzma": lambda data: lzma.compress(data, preset=6),
+}
+_DECOMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    "zlib": zlib.decompress,
+    "lzma": lzma.decompress,
+}
+
+
+def segment_paths(db_path: str, table_name: str) -> tuple[str, str]:
+    base = os.path.join(db_path, f"{table_name}.seg")
+    return base, f"{base}.json"
+
+
+def build_segments(table: Any, codec: str, block_rows: int) -> dict[str, Any]:
+    """
+    Nén CSV của bảng thành các block block_rows dòng (ranh giới dòng lấy từ row index).
+    """
+    if codec not in _COMPRESSORS:
+        raise dpapi2_exception.NotSupportedError(f"Unknown compression codec '{codec}', expected one of {sorted(_COMPRESSORS)}.")
+    compress = _COMPRESSORS[codec]
+    signature = file_signature(table.csv_path)
+    headers = table.read_headers()
+    casts = [table._type_to_cast_fn[table.column_types[h]] for h in headers]
+    index = table.get_row_index()
+    data_path, meta_path = segment_paths(table.db_path, table.name)
+
+    mm = table._open_mmap()
+    tmp_path = f"{data_path}.tmp"
+    blocks: list[dict[str, Any]] = []
+    try:
+        header_end = mm.find(b"\n")
+        header_line = mm[:] if header_end == -1 else mm[:header_end + 1]
+        simple, crlf = table._csv_layout(mm)
+        with open(tmp_path, "wb") as out:
+            offset = 0
+            for first in range(0, index.count, block_rows):
+                start, end = index.byte_range(first, first + block_rows)
+                raw = mm[start:end]
+                rows = [vals for vals in csv.reader(io.StringIO(raw.decode("utf-8"), newline="")) if vals and len(vals) >= len(headers)]
+                typed = [[cast(vals[i]) for vals in rows] for i, cast in enumerate(casts)]
+                packed = compress(raw)
+                out.write(packed)
+                blocks.append({
+                    "offset": offset,
+                    "length": len(packed),
+                    "size": len(raw),
+                    "rows": len(rows),
+                    "min": {h: min(values) for h, values in zip(headers, typed) if values},
+                    "max": {h: max(values) for h, values in zip(headers, typed) if values},
+                })
+                offset += len(packed)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, data_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        mm.close()
+
+    meta = {
+        "version": SEGMENT_VERSION,
+        "codec": codec,
+        "source": signature,
+        "data": file_signature(data_path),
+        "header": header_line.decode("utf-8"),
+        "simple": simple,
+        "crlf": crlf,
+        "row_count": sum(b["rows"] for b in blocks),
+        "blocks": blocks,
+    }
+    atomic_write_json(meta_path, meta)
+    return meta
+
+
+class SegmentFile:
+    def __init__(self, data_path: str, meta: dict[str, Any]):
+        self.data_path = data_path
+        self.codec: str = meta["codec"]
+        self.header: str = meta["header"]
+        self.simple: bool = meta["simple"]
+        self.crlf: bool = meta["crlf"]
+        self.row_count: int = meta["row_count"]
+        self.blocks: list[dict[str, Any]] = meta["blocks"]
+        self.signature = meta["data"]
+        self._decompress = _DECOMPRESSORS[self.codec]
+
+    @classmethod
+    def open(cls, db_path: str, table_name: str) -> "SegmentFile | None":
+        """
+        Segments của bảng, hoặc None nếu chưa build / file .seg không còn khớp directory.
+        """
+        data_path, meta_path = segment_paths(db_path, table_name)
+        meta = read_json(meta_path)
+        if not meta or meta.get("version") != SEGMENT_VERSION or meta.get("codec") not in _DECOMPRESSORS:
+            return None
+        if meta.get("data") != file_signature(data_path):
+            return None
+        return cls(data_path, meta)
+
+    def headers(self) -> list[str]:
+        return [h.strip() for h in next(csv.reader([self.header]), [])]
+
+    def matching_blocks(self, ast: Any, column_types: dict[str, str]) -> list[int]:
+        """
+        Số thứ tự các block có thể chứa dòng thỏa WHERE (theo min / max của block).
+        """
+        if ast is None:
+            return list(range(len(self.blocks)))
+        return [i for i, block in enumerate(self.blocks) if block["rows"] and block_may_match(ast, block, column_types)]
+
+    def iter_blocks(self, block_ids: list[int]) -> Iterator[bytes]:
+        """
+        Đọc + giải nén lần lượt từng block (chỉ một block trong RAM mỗi lúc).
+        """
+        if not block_ids:
+            return
+        with open(self.data_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), length=0, access=mmap.ACCESS_READ)
+        try:
+            for i in block_ids:
+                block = self.blocks[i]
+                try:
+                    data = self._decompress(mm[block["offset"]:block["offset"] + block["length"]])
+                except (zlib.error, lzma.LZMAError) as e:
+                    raise dpapi2_exception.DataError(f"Corrupted block {i} in '{self.data_path}'.") from e
+                yield data
+        finally:
+            mm.close()
+
+    def group_blocks(self, block_ids: list[int], chunk_bytes: int) -> list[list[int]]:
+        """
+        Gom các block liên tiếp thành các nhóm ~chunk_bytes (chưa nén), mỗi nhóm là một task
+        của parallel scan.
+        """
+        groups: list[list[int]] = []
+        size = 0
+        for i in block_ids:
+            if not groups or size >= chunk_bytes:
+                groups.append([])
+                size = 0
+            groups[-1].append(i)
+            size += self.blocks[i]["size"]
+        return groups
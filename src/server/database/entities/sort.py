@@ -0,0 +1,95 @@
+import heapq
+import itertools
+from typing import Any, Callable, Iterable, Iterator
+from server.database.entities.spill import SpillDirectory, SpillRun
+
+# =========================================
+# ORDER BY over a stream of result rows (dicts), applied after the WHERE filter
+# (and after GROUP BY). `order_by` is a list of (column / aggregate label, descending).
+#   - LIMIT k (+ OFFSET m) with k + m within the memory budget: top-K with a bounded
+#     heap (heapq.nsmallest), never more than k + m rows held;
+#   - otherwise: external merge sort. Rows are buffered up to `memory_rows`, each full
+#     buffer is sorted and written as a run (spill.SpillRun), and the runs are merged
+#     with heapq.merge at the end (one row of each run in memory at a time).
+# All sorts are stable: rows with equal keys keep the order in which they came.
+# When a sorted index covers the key, the planner reads rows in index order instead
+# and no sort runs at all (planner.choose_order_path).
+# =========================================
+
+
+class _Descending:
+    """
+    Bọc một giá trị để so sánh ngược chiều (cột DESC trong key có cả ASC và DESC).
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: "_Descending") -> bool:
+        return self.value == other.value
+
+
+def sort_key(order_by: list[tuple[str, bool]]) -> tuple[Callable[[dict[str, Any]], Any], bool]:
+    """
+    (key(row), reverse) cho order_by. Mọi cột cùng chiều: key là giá trị / tuple giá trị
+    và reverse = DESC; ngược lại các cột DESC được bọc trong _Descending.
+    """
+    names = [name for name, _ in order_by]
+    directions = {descending for _, descending in order_by}
+    if len(directions) == 1:
+        if len(names) == 1:
+            name = names[0]
+            return (lambda row: row[name]), directions.pop()
+        return (lambda row: tuple([row[n] for n in names])), directions.pop()
+    return (lambda row: tuple([_Descending(row[n]) if desc else row[n] for n, desc in order_by])), False
+
+
+def sort_rows(rows: Iterable[dict[str, Any]], order_by: list[tuple[str, bool]], limit: int | None, offset: int, memory_rows: int, spill_dir: str) -> Iterator[dict[str, Any]]:
+    """
+    Các dòng của rows theo order_by, đã áp OFFSET / LIMIT. Đóng rows khi xong.
+    """
+    key, reverse = sort_key(order_by)
+    stop = None if limit is None else offset + limit
+    try:
+        if stop is not None and stop <= memory_rows:
+            top = heapq.nlargest(stop, rows, key=key) if reverse else heapq.nsmallest(stop, rows, key=key)
+            yield from top[offset:]
+            return
+        yield from itertools.islice(external_sort(rows, key, reverse, memory_rows, spill_dir), offset, stop)
+    finally:
+        if hasattr(rows, "close"):
+            rows.close()
+
+
+def external_sort(rows: Iterable[dict[str, Any]], key: Callable[[dict[str, Any]], Any], reverse: bool, memory_rows: int, spill_dir: str) -> Iterator[dict[str, Any]]:
+    """
+    Sort ngoài: các run đã sort (tối đa memory_rows dòng mỗi run) ghi ra file tạm rồi merge.
+    """
+    memory_rows = max(1, memory_rows)
+    directory: SpillDirectory | None = None
+    runs: list[SpillRun] = []
+    try:
+        rows = iter(rows)
+        while True:
+            buffer = list(itertools.islice(rows, memory_rows))
+            buffer.sort(key=key, reverse=reverse)
+            if len(buffer) < memory_rows:
+                break
+            # Buffer đầy: ghi thành một run (có thể còn dòng phía sau)
+            if directory is None:
+                directory = SpillDirectory(spill_dir)
+            run = SpillRun(directory)
+            run.extend(buffer)
+            run.finish()
+            runs.append(run)
+        if not runs:
+            yield from buffer
+            return
+        yield from heapq.merge(*runs, buffer, key=key, reverse=reverse)
+    finally:
+        if directory is not None:
+            directory.close()
@@ -0,0 +1,113 @@
+import os
+import pickle
+import tempfile
+from typing import Any, Iterator
+from server.utils.exceptions import dpapi2_exception
+
+# =========================================
+# Temporary files for operators whose state outgrows their memory budget
+# (settings.OPERATOR_MEMORY_ROWS): hash aggregation, sort, hash join, DISTINCT.
+#   SpillRun        one append-only file of pickled batches of items, read back in order
+#   SpillPartitions items hashed on a key into `partitions` runs, so that each
+#                   partition can be processed on its own (about 1 / partitions of the data)
+# Everything lives in one private directory under settings.SPILL_DIR, removed by close()
+# (operators close it when their output generator finishes or is closed).
+# =========================================
+
+# Số item gom trong RAM trước khi ghi một batch xuống file
+SPILL_BATCH_ITEMS = 4096
+
+
+class SpillDirectory:
+    """
+    Thư mục tạm riêng của một operator; close() xoá mọi file trong đó.
+    """
+    def __init__(self, parent: str):
+        try:
+            os.makedirs(parent, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix="spill-", dir=parent)
+        except OSError as e:
+            raise dpapi2_exception.OperationalError(f"Cannot create spill directory in '{parent}'.") from e
+        self._count = 0
+
+    def new_file(self) -> str:
+        self._count += 1
+        return os.path.join(self.path, f"{self._count}.spill")
+
+    def close(self) -> None:
+        try:
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+
+class SpillRun:
+    """
+    File append-only chứa các batch item (pickle); đọc lại theo đúng thứ tự đã ghi.
+    """
+    def __init__(self, directory: SpillDirectory):
+        self.path = directory.new_file()
+        self.items = 0
+        self._buffer: list[Any] = []
+        self._file = open(self.path, "wb")
+
+    def append(self, item: Any) -> None:
+        self._buffer.append(item)
+        if len(self._buffer) >= SPILL_BATCH_ITEMS:
+            self._flush()
+
+    def extend(self, items: list[Any]) -> None:
+        for item in items:
+            self.append(item)
+
+    def _flush(self) -> None:
+        if self._buffer:
+            try:
+                pickle.dump(self._buffer, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError as e:
+                raise dpapi2_exception.OperationalError(f"Cannot write spill file '{self.path}'.") from e
+            self.items += len(self._buffer)
+            self._buffer = []
+
+    def finish(self) -> None:
+        # Ghi nốt buffer, sau đó chỉ còn đọc
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+    def __iter__(self) -> Iterator[Any]:
+        self.finish()
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                yield from batch
+
+    def __len__(self):
+        return self.items + len(self._buffer)
+
+
+class SpillPartitions:
+    """
+    `partitions` SpillRun, item đi vào partition hash((level, key)) % partitions.
+    level: khác nhau giữa các lần chia lại một partition vẫn quá lớn, để chia ra được.
+    """
+    def __init__(self, directory: SpillDirectory, partitions: int, level: int = 0):
+        self.directory = directory
+        self.level = level
+        self.runs = [SpillRun(directory) for _ in range(max(2, partitions))]
+
+    def partition_of(self, key: Any) -> int:
+        return hash((self.level, key)) % len(self.runs)
+
+    def add(self, key: Any, item: Any) -> None:
+        self.runs[self.partition_of(key)].append(item)
+
+    def finish(self) -> None:
+        for run in self.runs:
+            run.finish()
@@ -1,19 +1,59 @@
 from server.utils.exceptions import dpapi2_exception
 from server.database.entities.ast import AST
+from server.database.entities.aggregates import Aggregate, AGGREGATE_FUNCTIONS
 import re
 
+# Mệnh đề GROUP BY (tách khỏi câu truy vấn trước khi tìm SELECT / FROM / WHERE)
+_GROUP_BY_RE = re.compile(r"\s+GROUP\s+BY\s+", re.IGNORECASE)
+
+# Mệnh đề ORDER BY và một mục của nó: `expr [ASC | DESC]`
+_ORDER_BY_RE = re.compile(r"\s+ORDER\s+BY\s+", re.IGNORECASE)
+_SORT_ITEM_RE = re.compile(r"^(.*?)(?:\s+(ASC|DESC))?$", re.IGNORECASE)
+
+# SELECT DISTINCT (chỉ ngay sau SELECT; DISTINCT ở chỗ khác vẫn bị _validate_query từ chối)
+_SELECT_DISTINCT_RE = re.compile(r"^SELECT\s+DISTINCT\s+", re.IGNORECASE)
+
+# Hàm aggregate trong danh sách SELECT: COUNT(*), SUM(col), MIN(t.col)...
+_AGGREGATE_RE = re.compile(r"^(" + "|".join(AGGREGATE_FUNCTIONS) + r")\s*\(\s*(.*?)\s*\)$", re.IGNORECASE)
+
+# INSERT INTO tbl [(c1, c2, ...)] VALUES (...), (...)
+_INSERT_RE = re.compile(r"^\s*INSERT\s", re.IGNORECASE)
+_INSERT_HEAD_RE = re.compile(r"^INSERT\s+INTO\s+([^\s(]+)\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.IGNORECASE)
+
+# Literal số trong VALUES: int hoặc float (có dấu, phần thập phân, số mũ)
+_NUMBER_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
 class SQLParser:
-    def parse_query(self, query: str):
-        # 1. Remove leading/trailing whitespace and semicolons.
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Bước 1-2 của parse_query: bỏ khoảng trắng / dấu ';' ở hai đầu, gộp newline, tab
+        và khoảng trắng liên tiếp. Hai câu có cùng dạng chuẩn hoá cho cùng kết quả parse
+        (dùng làm key của plan cache).
+        """
         if query is None:
             # None is not valid SQL
             raise dpapi2_exception.InterfaceError("Query cannot be None")
-        query = query.strip(' ;')
+        return ' '.join(query.strip(' ;').replace('\n', ' ').replace('\t', ' ').split())
+
+    def parse_query(self, query: str):
+        # 1. Remove leading/trailing whitespace and semicolons.
+        # 2. Normalize query: remove newlines/tabs and extra spaces
+        query = self.normalize_query(query)
         if not query:
             raise dpapi2_exception.ProgrammingError("Empty query is not allowed")
 
-        # 2. Normalize query: remove newlines/tabs and extra spaces
-        query = ' '.join(query.replace('\n', ' ').replace('\t', ' ').split())
+        # 2b. Strip the trailing LIMIT n / OFFSET m clauses (only allowed at the very end)
+        query, limit, offset = self._extract_limit_offset(query)
+
+        # 2c. Strip the trailing ORDER BY, then GROUP BY clauses (after WHERE, before LIMIT)
+        query, order_by = self._extract_order_by(query)
+        query, group_by = self._extract_group_by(query)
+
+        # 2d. SELECT DISTINCT -> SELECT + cờ distinct
+        distinct = _SELECT_DISTINCT_RE.match(query)
+        if distinct:
+            query = "SELECT " + query[distinct.end():]
 
         # 3. Check for multiple statements and unsupported characters/keywords
         try:
@@ -55,7 +95,7 @@ class SQLParser:
 
         # 8. Check for wildcard '*' rules and parse columns.
         #    - Only "*" alone is valid; không cho "* , col" hay "col, *"
-        columns = []
+        columns: list[str | Aggregate] = []
         if column_str == "*":
             columns = ["*"]
         else:
@@ -66,11 +106,15 @@ class SQLParser:
             if "*" in raw_cols:
                 raise dpapi2_exception.ProgrammingError("Wildcard '*' must be alone if used")
 
-            # Validate each column identifier (allow 1-, 2- hoặc 3-part)
+            # Validate each column identifier (allow 1-, 2- hoặc 3-part) hoặc hàm aggregate
             for col in raw_cols:
+                aggregate = self._parse_aggregate(col)
+                if aggregate is not None:
+                    columns.append(aggregate)
+                    continue
                 if not self._is_valid_column_name(col):
                     raise dpapi2_exception.ProgrammingError(f"Invalid column name: '{col}'")
-            columns = raw_cols
+                columns.append(col)
 
         # 9. Extract FROM and WHERE clause strings
         if where_start is not None:
@@ -110,10 +154,204 @@ class SQLParser:
 
         return {
             "columns": columns,
+            "aggregates": [c for c in columns if isinstance(c, Aggregate)],
+            "group_by": group_by,
+            "order_by": order_by,
+            "distinct": distinct is not None,
             "tables": table_names,
-            "condition_ast": condition_ast
+            "condition_ast": condition_ast,
+            "limit": limit,
+            "offset": offset
         }
 
+    @staticmethod
+    def is_insert(query: str) -> bool:
+        """
+        True nếu câu lệnh là INSERT (đi đường ghi, không qua plan / result cache).
+        """
+        return query is not None and _INSERT_RE.match(query) is not None
+
+    def parse_insert(self, query: str) -> dict:
+        """
+        Parse `INSERT INTO tbl [(c1, c2, ...)] VALUES (v1, v2, ...)[, (...)]`.
+        Giá trị chỉ là literal: số (int / float) hoặc chuỗi '...' / "..." (dấu nháy lặp
+        đôi để escape). Không dùng normalize_query: nó gộp khoảng trắng bên trong chuỗi.
+        Trả về {"table", "columns" (None: mọi cột theo thứ tự schema), "rows"}.
+        """
+        if query is None:
+            raise dpapi2_exception.InterfaceError("Query cannot be None")
+        query = query.strip().strip(";").strip()
+        head = _INSERT_HEAD_RE.match(query)
+        if head is None:
+            raise dpapi2_exception.ProgrammingError("Expected INSERT INTO <table> [(columns)] VALUES (...)")
+
+        table = head.group(1)
+        if not self._is_valid_table_name(table):
+            raise dpapi2_exception.ProgrammingError(f"Invalid table reference: '{table}'")
+
+        columns = None
+        if head.group(2) is not None:
+            columns = [c.strip() for c in head.group(2).split(",")]
+            for col in columns:
+                if not self._is_valid_identifier(col):
+                    raise dpapi2_exception.ProgrammingError(f"Invalid column name in INSERT: '{col}'")
+
+        rows = []
+        i = head.end()
+        while True:
+            row, i = self._parse_values_row(query, i)
+            rows.append(row)
+            i = self._skip_spaces(query, i)
+            if i >= len(query):
+                break
+            if query[i] != ",":
+                raise dpapi2_exception.ProgrammingError(f"Unexpected '{query[i:i + 10]}' after VALUES row")
+            i = self._skip_spaces(query, i + 1)
+
+        return {"table": table, "columns": columns, "rows": rows}
+
+    @staticmethod
+    def _skip_spaces(query: str, i: int) -> int:
+        while i < len(query) and query[i].isspace():
+            i += 1
+        return i
+
+    def _parse_values_row(self, query: str, i: int) -> tuple[list, int]:
+        # Một bộ `(v1, v2, ...)` bắt đầu tại i; trả về (các giá trị, vị trí sau dấu ')')
+        if i >= len(query) or query[i] != "(":
+            raise dpapi2_exception.ProgrammingError("Expected '(' to start a VALUES row")
+        values = []
+        i += 1
+        while True:
+            i = self._skip_spaces(query, i)
+            if i >= len(query):
+                raise dpapi2_exception.ProgrammingError("Unterminated VALUES row")
+            char = query[i]
+            if char in "'\"":
+                text = []
+                j = i + 1
+                while True:
+                    end = query.find(char, j)
+                    if end < 0:
+                        raise dpapi2_exception.ProgrammingError("Unterminated string literal")
+                    text.append(query[j:end])
+                    if query.startswith(char, end + 1):
+                        # '' trong chuỗi '...' là một dấu nháy
+                        text.append(char)
+                        j = end + 2
+                        continue
+                    break
+                values.append("".join(text))
+                i = end + 1
+            else:
+                number = _NUMBER_RE.match(query, i)
+                if number is None:
+                    word = re.match(r"[^\s,)]*", query[i:]).group(0)
+                    raise dpapi2_exception.ProgrammingError(f"Only string and numeric literals are allowed in VALUES, got '{word}'")
+                raw = number.group(0)
+                values.append(float(raw) if any(c in raw for c in ".eE") else int(raw))
+                i = number.end()
+            i = self._skip_spaces(query, i)
+            if i < len(query) and query[i] == ",":
+                i += 1
+                continue
+            if i < len(query) and query[i] == ")":
+                return values, i + 1
+            raise dpapi2_exception.ProgrammingError("Expected ',' or ')' in VALUES row")
+
+    def _parse_aggregate(self, item: str) -> Aggregate | None:
+        """
+        Aggregate nếu item có dạng `func(column)` / `COUNT(*)`, None nếu không phải lời gọi hàm aggregate.
+        """
+        match = _AGGREGATE_RE.match(item)
+        if match is None:
+            return None
+        func, arg = match.group(1).lower(), match.group(2)
+        if arg == "*":
+            if func != "count":
+                raise dpapi2_exception.ProgrammingError(f"Only COUNT accepts '*', got '{item}'")
+            return Aggregate(func, None)
+        if not self._is_valid_column_name(arg):
+            raise dpapi2_exception.ProgrammingError(f"Invalid argument of {func.upper()}: '{arg}'")
+        return Aggregate(func, arg)
+
+    def _extract_group_by(self, query: str) -> tuple[str, list[str] | None]:
+        """
+        Tách mệnh đề `GROUP BY col1, col2...` ở cuối câu truy vấn (ngoài literal chuỗi).
+        Trả về (query không còn GROUP BY, danh sách cột hoặc None).
+        """
+        start = self._find_outside_strings(query, _GROUP_BY_RE)
+        if start is None:
+            return query, None
+        match = _GROUP_BY_RE.match(query, start)
+        raw_cols = [col.strip() for col in query[match.end():].split(",")]
+        if any(not col for col in raw_cols):
+            raise dpapi2_exception.ProgrammingError("Invalid column list in GROUP BY clause")
+        for col in raw_cols:
+            if not self._is_valid_column_name(col):
+                raise dpapi2_exception.ProgrammingError(f"Invalid column name in GROUP BY: '{col}'")
+        return query[:start].rstrip(), raw_cols
+
+    def _extract_order_by(self, query: str) -> tuple[str, list[tuple[str | Aggregate, bool]] | None]:
+        """
+        Tách mệnh đề `ORDER BY item [ASC | DESC], ...` ở cuối câu truy vấn; item là cột
+        hoặc hàm aggregate. Trả về (query không còn ORDER BY, [(item, descending)] hoặc None).
+        """
+        start = self._find_outside_strings(query, _ORDER_BY_RE)
+        if start is None:
+            return query, None
+        match = _ORDER_BY_RE.match(query, start)
+        order_by = []
+        for raw in query[match.end():].split(","):
+            item = _SORT_ITEM_RE.match(raw.strip())
+            expr = item.group(1) if item else ""
+            if not expr:
+                raise dpapi2_exception.ProgrammingError("Invalid item list in ORDER BY clause")
+            descending = (item.group(2) or "ASC").upper() == "DESC"
+            aggregate = self._parse_aggregate(expr)
+            if aggregate is not None:
+                order_by.append((aggregate, descending))
+            elif self._is_valid_column_name(expr):
+                order_by.append((expr, descending))
+            else:
+                raise dpapi2_exception.ProgrammingError(f"Invalid ORDER BY item: '{expr}'")
+        return query[:start].rstrip(), order_by
+
+    def _find_outside_strings(self, query: str, pattern: re.Pattern) -> int | None:
+        """
+        Vị trí đầu tiên pattern khớp nằm ngoài literal chuỗi ('...', escape bằng '\\'), hoặc None.
+        """
+        in_string = False
+        i = 0
+        while i < len(query):
+            char = query[i]
+            if char == "\\":
+                i += 2
+                continue
+            if char == "'":
+                in_string = not in_string
+            elif not in_string and pattern.match(query, i):
+                return i
+            i += 1
+        return None
+
+    def _extract_limit_offset(self, query: str) -> tuple[str, int | None, int]:
+        """
+        Tách mệnh đề `LIMIT n [OFFSET m]` (hoặc chỉ `OFFSET m`) ở cuối câu truy vấn.
+        Trả về (query không còn LIMIT/OFFSET, limit hoặc None, offset).
+        LIMIT/OFFSET ở vị trí khác vẫn bị _validate_query từ chối.
+        """
+        match = re.search(r"(?:\s+LIMIT\s+([^\s'\"]+))?(?:\s+OFFSET\s+([^\s'\"]+))?$", query, re.IGNORECASE)
+        if match is None or not match.group(0):
+            return query, None, 0
+        limit_str, offset_str = match.group(1), match.group(2)
+        for name, raw in (("LIMIT", limit_str), ("OFFSET", offset_str)):
+            if raw is not None and not raw.isdigit():
+                raise dpapi2_exception.ProgrammingError(f"{name} must be a non-negative integer, got '{raw}'")
+        limit = int(limit_str) if limit_str is not None else None
+        offset = int(offset_str) if offset_str is not None else 0
+        return query[:match.start()], limit, offset
+
     def _find_keyword_positions(self, query: str, keywords: list[str]) -> dict[str, int]:
         """
         Find the first (and only) occurrence of each keyword in order.
@@ -171,9 +409,8 @@ class SQLParser:
             "join", "left join", "right join", "inner join", "outer join",
             "union", "intersect", "except",
             "insert", "update", "delete", "create", "drop", "alter",
-            "in(", "between ", "like ", "is null", "exists ",
-            "distinct", "top ", "into ",
-            "count(", "min(", "max(", "sum(", "avg("
+            "is null", "exists ",
+            "distinct", "top ", "into "
         ]
         lower = query.lower()
         i = 0
@@ -191,7 +428,8 @@ class SQLParser:
                 i += 1
                 continue
 
-            if not in_string:
+            # Chỉ khớp keyword ở đầu một từ ("in(" không khớp trong "min(")
+            if not in_string and not (i > 0 and (lower[i - 1].isalnum() or lower[i - 1] == "_")):
                 for kw in unsupported:
                     if lower.startswith(kw, i):
                         raise dpapi2_exception.NotSupportedError(
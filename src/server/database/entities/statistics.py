@@ -0,0 +1,280 @@
+import io
+import os
+import csv
+import heapq
+import math
+import random
+from collections import Counter
+from typing import Any, Iterable, Iterator
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import atomic_write_json, read_json, append_state, appended_since
+
+# =========================================
+# Column statistics of a table, written by ANALYZE to storage/<db>/<table>.stats.json
+# together with the signature of the data file they describe:
+#   row_count                  exact (row index / full scan)
+#   per column: empty          number of empty fields (the CSV has no other NULL)
+#               distinct       estimated number of distinct non-empty values
+#               min / max      over the non-empty values
+#               histogram      equi-depth bucket bounds: `buckets` buckets holding about
+#                              the same number of rows each, bounds[i] <= bucket i <= bounds[i + 1]
+# Full scan: one pass over all rows; distinct counts from a KMV sketch (the k smallest
+# value hashes), histograms from a fixed-size reservoir sample.
+# Sampled (sample_rows): only runs of consecutive rows at random positions of the CSV
+# are read (through the row index); counts are scaled to the row count and distinct
+# counts are extrapolated with the GEE estimator.
+# Rows appended to the CSV after ANALYZE (INSERT) do not invalidate the statistics:
+# counts are scaled by the number of bytes appended (TableStatistics.appended_rows)
+# until the next ANALYZE, and they are no longer used as exact answers.
+# =========================================
+
+STATS_VERSION = 1
+
+# Số hash nhỏ nhất giữ lại để ước lượng số giá trị khác nhau (sai số ~ 1 / sqrt(k))
+KMV_SIZE = 1024
+# Số giá trị giữ lại (reservoir) mỗi cột để dựng histogram khi scan toàn bộ
+HISTOGRAM_SAMPLE = 1 << 16
+# Khi lấy mẫu: đọc các đoạn SAMPLE_RUN_ROWS dòng liên tiếp (ít lần seek)
+SAMPLE_RUN_ROWS = 64
+# Khi lấy mẫu: tỉ lệ giá trị chỉ gặp 1 lần từ đó coi cột là (gần như) unique
+UNIQUE_SAMPLE_FRACTION = 0.9
+
+_HASH_SPACE = 1 << 64
+
+
+def stats_path_for(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.stats.json")
+
+
+class ColumnCollector:
+    """
+    Gom thống kê của một cột từ các field thô (str) của CSV.
+    frequencies=True (khi lấy mẫu): đếm tần suất từng giá trị cho ước lượng GEE.
+    """
+    def __init__(self, cast_fn: Any, frequencies: bool, rng: random.Random):
+        self.cast_fn = cast_fn
+        self.rng = rng
+        self.seen = 0
+        self.empty = 0
+        self.low: Any = None
+        self.high: Any = None
+        self.reservoir: list[Any] = []
+        self.counts: Counter | None = Counter() if frequencies else None
+        # Max-heap (lưu số âm) của KMV_SIZE hash nhỏ nhất + tập hash đang giữ
+        self._heap: list[int] = []
+        self._hashes: set[int] = set()
+
+    def add(self, raw: str) -> None:
+        self.seen += 1
+        if raw.strip() == "":
+            self.empty += 1
+            return
+        value = self.cast_fn(raw)
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+
+        n = self.seen - self.empty
+        if len(self.reservoir) < HISTOGRAM_SAMPLE:
+            self.reservoir.append(value)
+        else:
+            j = self.rng.randrange(n)
+            if j < HISTOGRAM_SAMPLE:
+                self.reservoir[j] = value
+
+        if self.counts is not None:
+            self.counts[value] += 1
+            return
+        h = hash((value,)) % _HASH_SPACE
+        heap = self._heap
+        if len(heap) < KMV_SIZE:
+            if h not in self._hashes:
+                self._hashes.add(h)
+                heapq.heappush(heap, -h)
+        elif h < -heap[0] and h not in self._hashes:
+            self._hashes.discard(-heapq.heappushpop(heap, -h))
+            self._hashes.add(h)
+
+    def _distinct(self, row_count: int) -> int:
+        non_empty = self.seen - self.empty
+        if non_empty == 0:
+            return 0
+        if self.counts is not None:
+            # GEE: sqrt(N / n) * (số giá trị gặp đúng 1 lần) + số giá trị gặp >= 2 lần.
+            # Gần như mọi giá trị chỉ gặp 1 lần (cột kiểu khoá): GEE đánh giá thấp, ngoại suy tuyến tính
+            once = sum(1 for c in self.counts.values() if c == 1)
+            if once >= UNIQUE_SAMPLE_FRACTION * non_empty:
+                estimate = len(self.counts) * row_count / self.seen
+            else:
+                estimate = math.sqrt(row_count / self.seen) * once + (len(self.counts) - once)
+            return int(min(max(estimate, len(self.counts)), row_count))
+        if len(self._heap) < KMV_SIZE:
+            return len(self._heap)
+        kth = -self._heap[0]
+        return int(min((KMV_SIZE - 1) * _HASH_SPACE / (kth + 1), non_empty))
+
+    def _histogram(self, buckets: int) -> list[Any]:
+        values = sorted(self.counts.elements()) if self.counts is not None else sorted(self.reservoir)
+        if not values:
+            return []
+        buckets = max(1, min(buckets, len(values)))
+        last = len(values) - 1
+        return [values[i * last // buckets] for i in range(buckets + 1)]
+
+    def finish(self, row_count: int, buckets: int) -> dict[str, Any]:
+        scale = row_count / self.seen if self.seen else 0
+        return {
+            "empty": round(self.empty * scale),
+            "distinct": self._distinct(row_count),
+            "min": self.low,
+            "max": self.high,
+            "histogram": self._histogram(buckets),
+        }
+
+
+def _sample_rows(table: Any, sample_rows: int, rng: random.Random) -> tuple[int, Iterator[list[str]]] | None:
+    """
+    (số dòng của bảng, các dòng mẫu) đọc qua row index; None nếu không lấy mẫu được
+    (không có CSV / field có xuống dòng / mẫu không nhỏ hơn bảng).
+    """
+    if not os.path.exists(table.csv_path):
+        return None
+    try:
+        index = table.get_row_index()
+    except dpapi2_exception.NotSupportedError:
+        return None
+    runs = -(-index.count // SAMPLE_RUN_ROWS)
+    wanted = -(-sample_rows // SAMPLE_RUN_ROWS)
+    if wanted >= runs:
+        return None
+
+    def rows() -> Iterator[list[str]]:
+        mm = table._open_mmap()
+        try:
+            for run in sorted(rng.sample(range(runs), wanted)):
+                start, end = index.byte_range(run * SAMPLE_RUN_ROWS, (run + 1) * SAMPLE_RUN_ROWS)
+                try:
+                    text = mm[start:end].decode("utf-8")
+                except UnicodeDecodeError as e:
+                    raise dpapi2_exception.DataError(f"Invalid UTF-8 data in '{table.csv_path}'.") from e
+                yield from csv.reader(io.StringIO(text, newline=""))
+        finally:
+            mm.close()
+
+    return index.count, rows()
+
+
+def _all_rows(table: Any, end: int) -> Iterator[list[str]]:
+    segments = table.cold_segments()
+    if segments is None:
+        for _, _, vals in table.iter_row_offsets(end=end):
+            yield vals
+        return
+    blocks = segments.iter_blocks(list(range(len(segments.blocks))))
+    try:
+        for data in blocks:
+            yield from csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    finally:
+        blocks.close()
+
+
+def collect_statistics(table: Any, buckets: int, sample_rows: int | None = None) -> dict[str, Any]:
+    """
+    ANALYZE: scan (hoặc lấy mẫu sample_rows dòng) bảng rồi ghi sidecar thống kê.
+    """
+    signature = table.data_signature()
+    if signature is None:
+        raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{table.csv_path}'.")
+    segments = table.cold_segments()
+    headers = segments.headers() if segments is not None else table.read_headers()
+    table._check_headers(headers)
+    # Seed cố định: ANALYZE lại trên cùng dữ liệu cho cùng kết quả
+    rng = random.Random(0)
+
+    sampled = _sample_rows(table, sample_rows, rng) if sample_rows else None
+    row_count, rows = sampled if sampled is not None else (None, _all_rows(table, signature[1]))
+    collectors = [
+        ColumnCollector(table._type_to_cast_fn[table.column_types[h]], sampled is not None, rng)
+        for h in headers
+    ]
+    scanned = _collect(collectors, rows, len(headers))
+    if row_count is None:
+        row_count = scanned
+
+    stats = {
+        "version": STATS_VERSION,
+        "source": signature,
+        "row_count": row_count,
+        "sampled_rows": scanned if sampled is not None else None,
+        "buckets": buckets,
+        "columns": {h: c.finish(row_count, buckets) for h, c in zip(headers, collectors)},
+    }
+    if segments is None:
+        stats.update(append_state(table.csv_path, signature[1]))
+    atomic_write_json(stats_path_for(table.db_path, table.name), stats)
+    return stats
+
+
+def _collect(collectors: list[ColumnCollector], rows: Iterable[list[str]], n_headers: int) -> int:
+    count = 0
+    adds = [c.add for c in collectors]
+    for vals in rows:
+        if not vals or len(vals) < n_headers:
+            continue
+        for add, raw in zip(adds, vals):
+            add(raw)
+        count += 1
+    return count
+
+
+class TableStatistics:
+    def __init__(self, payload: dict[str, Any]):
+        self.row_count: int = payload["row_count"]
+        self.sampled_rows: int | None = payload.get("sampled_rows")
+        self.columns: dict[str, dict[str, Any]] = payload["columns"]
+        # Ước lượng số dòng được append sau ANALYZE (0: thống kê khớp đúng dữ liệu)
+        self.appended_rows: int = payload.get("appended_rows", 0)
+        self.payload = payload
+
+    @classmethod
+    def load(cls, db_path: str, table_name: str, signature: list[int] | None, csv_path: str | None = None) -> "TableStatistics | None":
+        """
+        Thống kê của bảng, hoặc None nếu chưa ANALYZE hoặc dữ liệu đã đổi từ lúc ANALYZE.
+        csv_path: CSV chỉ được append thêm dòng từ lúc ANALYZE thì vẫn dùng, với các số
+        đếm được scale theo số byte được append (xem _scale_appended).
+        """
+        payload = read_json(stats_path_for(db_path, table_name))
+        if not payload or payload.get("version") != STATS_VERSION:
+            return None
+        if signature is None:
+            return None
+        if payload.get("source") == signature:
+            return cls(payload)
+        if csv_path is None or not appended_since(csv_path, payload, signature):
+            return None
+        return cls(_scale_appended(payload, signature[1]))
+
+    def column(self, name: str) -> dict[str, Any] | None:
+        return self.columns.get(name)
+
+
+def _scale_appended(payload: dict[str, Any], size: int) -> dict[str, Any]:
+    """
+    Payload thống kê cho CSV đã được append tới size byte: số dòng mới ước lượng theo
+    số byte trung bình mỗi dòng lúc ANALYZE; empty (và distinct của cột gần như unique)
+    scale theo cùng tỉ lệ, min / max / histogram giữ nguyên.
+    """
+    row_count = payload["row_count"]
+    appended = round((size - payload["size"]) * row_count / payload["size"]) if payload["size"] else 0
+    factor = (row_count + appended) / row_count if row_count else 1.0
+    columns = {}
+    for name, info in payload["columns"].items():
+        info = dict(info)
+        non_empty = row_count - info.get("empty", 0)
+        if info.get("empty"):
+            info["empty"] = round(info["empty"] * factor)
+        if info.get("distinct") and info["distinct"] >= UNIQUE_SAMPLE_FRACTION * non_empty:
+            info["distinct"] = round(info["distinct"] * factor)
+        columns[name] = info
+    return {**payload, "row_count": row_count + appended, "appended_rows": appended, "columns": columns}
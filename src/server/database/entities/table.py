@@ -1,12 +1,36 @@
 import os
 import io
+import re
 import csv
 import json
 import mmap
-from typing import Any, Callable
-from server.config.settings import STORAGE_FOLDER
+import itertools
+import threading
+import functools
+from typing import Any, Callable, Iterable, Iterator
+from server.config.settings import (
+    STORAGE_FOLDER, EXECUTION_MODE, VECTOR_BATCH_SIZE,
+    PARALLEL_WORKERS, PARALLEL_MIN_BYTES, PARALLEL_CHUNK_BYTES, PARALLEL_ORDERED,
+    ZONE_MAP_BLOCK_ROWS, INDEX_AUTO_BUILD, INDEX_MAX_FRACTION, PLAN_CACHE_SIZE, RESIDENT_TABLES,
+    SEGMENT_CODEC, SEGMENT_BLOCK_ROWS, STATS_HISTOGRAM_BUCKETS, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS
+)
+from server.database.entities import vectorized, parallel_scan, resident, wal
 from server.database.entities.ast import ExpressionNode
+from server.database.entities.columnar import ColumnarTable, write_columnar, BATCH_ROWS as COLUMNAR_BATCH_ROWS
+from server.database.entities.zone_map import ZoneMap, build_zone_map
+from server.database.entities.row_index import RowOffsetIndex
+from server.database.entities.encoding import code_predicates, CODE_SUFFIX
+from server.database.entities.predicates import constant_value, like_regex, sorted_members
+from server.database.entities.segments import SegmentFile, build_segments
+from server.database.entities.statistics import TableStatistics, collect_statistics, stats_path_for
+from server.database.entities.aggregates import Aggregate, Aggregator, HashAggregation
+from server.database.entities.sort import sort_rows
+from server.database.entities.distinct import distinct_rows
+from server.database.entities.index import (
+    SortedIndex, HashIndex, IndexScan, OrderedIndexScan, KeyRange, build_sorted_index, build_hash_index, key_ranges
+)
 from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import file_signature, append_state
  
 # =========================================
 # Hàm cast module-level để tránh lỗi pickle hoặc exec lặp
@@ -26,7 +50,100 @@ def cast_float(raw: str) -> float:
  
 def cast_string(raw: str) -> str:
     return raw.strip()
+
+# Cùng ngữ nghĩa nhưng nhận field dạng bytes (fast path cho CSV không có dấu nháy):
+# int()/float() đọc thẳng bytes nên cột số không cần decode.
+def cast_int_bytes(raw: bytes) -> int:
+    try:
+        return int(raw) if raw else 0
+    except ValueError as e:
+        raise dpapi2_exception.DataError(f"Cannot cast '{raw.decode('utf-8', 'replace')}' to integer.") from e
+
+def cast_float_bytes(raw: bytes) -> float:
+    try:
+        return float(raw) if raw else 0.0
+    except ValueError as e:
+        raise dpapi2_exception.DataError(f"Cannot cast '{raw.decode('utf-8', 'replace')}' to float.") from e
+
+def cast_string_bytes(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8").strip()
+    except UnicodeDecodeError as e:
+        raise dpapi2_exception.DataError("Invalid UTF-8 data in CSV field.") from e
+
+def cast_bytes_column(values: list[bytes], cast_fn: Callable[[bytes], Any]) -> list[Any]:
+    """
+    Cast cả một cột bytes: thử int/float/decode trực tiếp qua map (chạy trong C), nếu
+    lỗi (field rỗng, giá trị sai) thì cast lại từng giá trị bằng cast_fn để có cùng
+    kết quả / lỗi như khi cast từng dòng.
+    """
+    try:
+        if cast_fn is cast_int_bytes:
+            return list(map(int, values))
+        if cast_fn is cast_float_bytes:
+            return list(map(float, values))
+        if cast_fn is cast_string_bytes:
+            return list(map(str.strip, map(bytes.decode, values)))
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return [cast_fn(v) for v in values]
+
+@functools.lru_cache(maxsize=max(1, PLAN_CACHE_SIZE))
+def _exec_filter(code: str) -> Callable[[Any], Any]:
+    """
+    Compile source của row_filter do _compile_filter sinh ra. Memo theo source: plan
+    lấy từ plan cache sinh lại đúng source đó nên không exec lại mỗi truy vấn.
+    """
+    # _like: regex đã compile của một pattern LIKE (cache chung, xem predicates.like_regex)
+    namespace: dict[str, Any] = {"_like": like_regex}
+    exec(code, namespace)
+    return namespace["row_filter"]
+
+# Kích thước (byte) mỗi lần cắt mmap ra để split dòng trong fast path;
+# truy vấn có LIMIT bắt đầu từ _BYTE_SCAN_FIRST_CHUNK rồi gấp đôi dần
+_BYTE_SCAN_CHUNK = 1 << 20
+_BYTE_SCAN_FIRST_CHUNK = 1 << 16
+# Batch (số dòng) nhỏ nhất khi batch được thu nhỏ theo LIMIT
+_LIMIT_MIN_BATCH_ROWS = 1024
+
+def batch_sizes(full: int, first: int | None = None) -> Iterator[int]:
+    """
+    Kích thước các batch liên tiếp của một scan. first=None: luôn `full`; ngược lại
+    (truy vấn có LIMIT) bắt đầu từ `first` rồi gấp đôi tới `full`, để scan không
+    đọc / filter cả một batch lớn khi chỉ cần vài dòng đầu.
+    """
+    size = full if first is None else max(1, min(full, first))
+    while True:
+        yield size
+        size = min(full, size * 2)
+
+def batch_ranges(first: int, last: int, sizes: Iterator[int]) -> Iterator[tuple[int, int]]:
+    """
+    Cắt [first, last) thành các khoảng [start, stop) liên tiếp theo kích thước từ sizes.
+    """
+    start = first
+    while start < last:
+        stop = min(start + next(sizes), last)
+        yield start, stop
+        start = stop
+
+def limit_batch_rows(full: int, row_limit: int | None) -> int | None:
+    """
+    Batch đầu tiên (số dòng) cho scan chỉ cần tối đa row_limit dòng; None nếu không giới hạn.
+    """
+    if row_limit is None:
+        return None
+    return min(full, max(_LIMIT_MIN_BATCH_ROWS, row_limit))
+# '\r' không đứng trước '\n': csv.reader coi là xuống dòng, split theo b"\n" thì không
+_LONE_CR = re.compile(rb"\r(?!\n)")
  
+# Loại index -> (class đọc, hàm build)
+_INDEX_TYPES = {
+    "sorted": (SortedIndex, build_sorted_index),
+    "hash": (HashIndex, build_hash_index),
+}
+INDEX_KINDS = tuple(_INDEX_TYPES)
+
 class MMapReader(io.RawIOBase):
     """
     Wrapper cho mmap.mmap để cung cấp interface cần thiết (readable, read, readline, seek, tell),
@@ -69,41 +186,863 @@ class MMapReader(io.RawIOBase):
 class Table:
     def __init__(self, table_name: str, db_name: str, columns_metadata: list[dict[str, Any]]):
         self.name = table_name
-        self.csv_path = os.path.join(STORAGE_FOLDER, db_name, f"{table_name}.csv")
+        self.db_name = db_name
+        self.db_path = os.path.join(STORAGE_FOLDER, db_name)
+        self.csv_path = os.path.join(self.db_path, f"{table_name}.csv")
         self.column_metadata = columns_metadata
         # Map tên cột -> kiểu ('integer','float','string')
         self.column_types = {meta["name"]: meta["type"] for meta in self.column_metadata}
+        # Map tên cột -> loại index khai báo trong metadata ({"index": "sorted" | "hash"})
+        self.indexes: dict[str, str] = {}
+        for meta in self.column_metadata:
+            kind = meta.get("index")
+            if kind is None:
+                continue
+            if kind not in INDEX_KINDS:
+                raise dpapi2_exception.DatabaseError(f"Unknown index kind '{kind}' on column '{meta['name']}'.")
+            self.indexes[meta["name"]] = kind
+        # Bảng "resident": giữ bản decode trong RAM (xem resident.py)
+        self.resident = f"{db_name}.{table_name}" in RESIDENT_TABLES
+        self._index_lock = threading.Lock()
+        self._open_indexes: dict[tuple[str, str], SortedIndex | HashIndex] = {}
+        self._row_index: RowOffsetIndex | None = None
         # Map kiểu -> hàm cast tương ứng
         self._type_to_cast_fn: dict[str, Callable[[str], Any]] = {
             "integer": cast_int,
             "float": cast_float,
             "string": cast_string
         }
+        self._bytes_cast_fn: dict[str, Callable[[bytes], Any]] = {
+            "integer": cast_int_bytes,
+            "float": cast_float_bytes,
+            "string": cast_string_bytes
+        }
+        # (signature CSV, simple, crlf) - xem _csv_layout
+        self._layout: tuple[list[int] | None, bool, bool] | None = None
+        # ((signature dữ liệu, signature file thống kê), TableStatistics | None) - xem get_statistics
+        self._statistics: tuple[tuple, TableStatistics | None] | None = None
  
     def _open_mmap(self) -> mmap.mmap:
         """
         Mở file CSV dưới dạng memory-mapped; trả về mmap object đọc-only.
         """
+        return self._map_csv()[0]
+
+    def _map_csv(self) -> tuple[mmap.mmap, list[int]]:
+        """
+        (mmap đọc-only của CSV, file_signature của đúng phần đã được map).
+        """
         try:
             fd = os.open(self.csv_path, os.O_RDONLY)
         except OSError as e:
             raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{self.csv_path}'.") from e
         try:
-            # length=0 để ánh xạ toàn bộ file
-            mm = mmap.mmap(fd, length=0, access=mmap.ACCESS_READ)
+            # length=0 để ánh xạ toàn bộ file; dưới append lock của WAL để không thấy
+            # một batch INSERT đang được ghi dở vào cuối file
+            with wal.append_lock(self.csv_path):
+                st = os.fstat(fd)
+                mm = mmap.mmap(fd, length=0, access=mmap.ACCESS_READ)
         except (ValueError, OSError) as e:
             os.close(fd)
             raise dpapi2_exception.InternalError(f"Cannot memory-map file '{self.csv_path}'.") from e
         os.close(fd)
-        return mm
+        return mm, [st.st_mtime_ns, st.st_size, st.st_ino]
  
-    def select(self, columns: list[str], ast: Any = None):
+    def _check_headers(self, headers: list[str]) -> None:
+        # Kiểm tra metadata cover tất cả header
+        for col in headers:
+            if col not in self.column_types:
+                raise dpapi2_exception.ProgrammingError(f"Column '{col}' missing in metadata.")
+
+    def _resolve_select_cols(self, headers: list[str], columns: list[str]) -> list[str]:
+        if columns == ["*"]:
+            return headers[:]
+        select_cols = columns[:]
+        for c in select_cols:
+            if c not in headers:
+                raise dpapi2_exception.ProgrammingError(f"Selected column '{c}' not in CSV header.")
+        return select_cols
+
+    def _ast_columns(self, ast: Any, column_types: dict[str, str] | None = None) -> list[str]:
+        """
+        Tên các cột (không trùng, theo thứ tự xuất hiện) được tham chiếu trong AST.
+        column_types: mặc định các cột của bảng (truyền vào khi AST có cột code, xem encoding.py).
+        """
+        column_types = self.column_types if column_types is None else column_types
+        found: dict[str, None] = {}
+        def walk(n: ExpressionNode | None):
+            if n is None:
+                return
+            if n.left is None and n.right is None:
+                if isinstance(n.value, str) and n.value in column_types:
+                    found[n.value] = None
+                return
+            walk(n.left)
+            walk(n.right)
+        walk(ast)
+        return list(found)
+
+    def _compile_filter(self, ast: Any, col_to_idx: dict[str, int], typed: bool = False, raw_bytes: bool = False, batch: bool = False, column_types: dict[str, str] | None = None) -> Callable[[Any], Any]:
+        """
+        Build row_filter(vals) từ AST (nếu có). typed=True khi vals đã được cast sẵn
+        (ví dụ đọc từ bản columnar), ngược lại vals là list chuỗi thô từ csv.reader
+        (raw_bytes=True: field dạng bytes từ fast path _byte_batches).
+        batch=True: build batch_filter(columns) nhận list các cột, trả về list kết quả
+        (truthy / falsy) cho từng dòng - một list comprehension, không gọi hàm mỗi dòng.
+        """
+        if ast is None:
+            return lambda vals: True
+        try:
+            column_types = self.column_types if column_types is None else column_types
+            expr_str = self._ast_to_python_expr(ast, col_to_idx, column_types, typed=typed, raw_bytes=raw_bytes)
+            if batch:
+                code = f"def row_filter(columns):\n    return [{expr_str} for vals in zip(*columns)]"
+            else:
+                code = f"def row_filter(vals):\n    return {expr_str}"
+            return _exec_filter(code)
+        except dpapi2_exception.ProgrammingError:
+            raise
+        except Exception as e:
+            raise dpapi2_exception.ProgrammingError("Error compiling WHERE expression.") from e
+
+    def select(self, columns: list[str], ast: Any = None, mode: str | None = None, parallel: bool | None = None, ordered: bool | None = None, index_scan: IndexScan | None = None, limit: int | None = None, offset: int = 0, order_by: list[tuple[str, bool]] | None = None, index_order: OrderedIndexScan | None = None, distinct: bool = False):
         """
         - columns: list tên cột user muốn SELECT (hoặc ["*"] để lấy tất cả).
         - ast: ExpressionNode (cây điều kiện WHERE). Nếu None, chọn tất cả hàng.
+        - mode: "row" | "vectorized" | "auto" (mặc định settings.EXECUTION_MODE).
+        - parallel: True/False bật/tắt parallel scan trên CSV, None = tự chọn theo kích thước.
+        - ordered: parallel scan giữ thứ tự dòng của file (mặc định settings.PARALLEL_ORDERED).
+        - index_scan: kết quả choose_index(ast); nếu có thì chỉ đọc các dòng index trả về.
+        - limit / offset: bỏ qua `offset` dòng đầu của kết quả rồi trả về tối đa `limit` dòng.
+        - order_by: [(cột, descending)] của ORDER BY; index_order: đọc sẵn theo thứ tự sorted index (planner.choose_order_path).
+        - distinct: SELECT DISTINCT, khử dòng trùng trước ORDER BY / LIMIT (distinct.py).
  
         Trả về một generator, mỗi yield là JSON string (đã lọc + cast).
         """
+        if order_by:
+            rows = self.select_rows_ordered(columns, order_by, ast, mode, parallel, index_scan, index_order, limit, offset, distinct)
+        elif distinct:
+            rows = self.select_rows_distinct(columns, ast, mode, parallel, ordered, index_scan, limit, offset)
+        else:
+            rows = self.select_rows(columns, ast, mode, parallel, ordered, index_scan, limit, offset)
+        try:
+            for out in rows:
+                yield json.dumps(out)
+        finally:
+            # Đóng scan ngay (giải phóng mmap, huỷ worker) khi caller dừng sớm
+            if hasattr(rows, "close"):
+                rows.close()
+
+    def select_rows(self, columns: list[str], ast: Any = None, mode: str | None = None, parallel: bool | None = None, ordered: bool | None = None, index_scan: IndexScan | None = None, limit: int | None = None, offset: int = 0):
+        """
+        Giống select nhưng yield dict {column: typed value}. Dùng bản resident (RAM) hoặc
+        bản columnar nếu có và còn khớp với file CSV, ngược lại parse CSV qua mmap
+        (hoặc giải nén segments nếu bảng chỉ còn bản nén, xem segments.py).
+        Không có WHERE thì OFFSET được đẩy xuống nguồn dữ liệu: seek thẳng tới dòng
+        đầu tiên (row index / vị trí trong bản columnar) thay vì đọc rồi bỏ.
+        LIMIT được đẩy xuống scan: batch đầu nhỏ rồi lớn dần, worker của parallel scan
+        trả về tối đa offset + limit dòng, và scan bị đóng ngay khi đủ dòng.
+        """
+        if limit == 0 or constant_value(ast) is False:
+            # WHERE luôn sai (xem optimizer.simplify): không đọc gì
+            return iter(())
+        stop = None if limit is None else offset + limit
+        if index_scan is not None:
+            rows = self._select_index(columns, ast, index_scan)
+        else:
+            columnar = self._open_columnar()
+            use_vectorized = self._use_vectorized(ast, mode, typed_source=columnar is not None)
+            if columnar is not None and ast is None and columnar.appended is None:
+                return self._select_columnar(columnar, columns, row_range=(offset, stop), row_limit=limit)
+            segments = self.cold_segments() if columnar is None else None
+            if columnar is not None:
+                rows = self._with_appended(columnar, self._select_columnar(columnar, columns, ast, use_vectorized, row_limit=stop), columns, ast, use_vectorized)
+            elif segments is not None:
+                # Không WHERE: bỏ qua nguyên các block nằm trước OFFSET
+                rows, skipped = self._select_segments(segments, columns, ast, use_vectorized, parallel, ordered, row_limit=stop, first_row=offset if ast is None else 0)
+                offset -= skipped
+                stop = None if stop is None else stop - skipped
+            else:
+                ranges = self._row_ranges(offset, stop) if ast is None and offset > 0 else None
+                rows = self._select_csv(columns, ast, use_vectorized, parallel, ordered, ranges=ranges, row_limit=stop)
+                if ranges is not None:
+                    return rows
+        if limit is None and offset == 0:
+            return rows
+        return self._limit_rows(rows, offset, stop)
+
+    def select_rows_ordered(self, columns: list[str], order_by: list[tuple[str, bool]], ast: Any = None, mode: str | None = None, parallel: bool | None = None, index_scan: IndexScan | None = None, index_order: OrderedIndexScan | None = None, limit: int | None = None, offset: int = 0, distinct: bool = False):
+        """
+        select_rows + ORDER BY (xem sort.py): với index_order các dòng đã đúng thứ tự nên
+        chỉ cần dừng sau offset + limit dòng khớp; ngược lại scan toàn bộ rồi sort (top-K
+        bằng heap nếu có LIMIT, sort ngoài qua SPILL_DIR nếu vượt OPERATOR_MEMORY_ROWS).
+        Cột ORDER BY không có trong SELECT được đọc thêm rồi bỏ khỏi kết quả.
+        distinct: khử dòng trùng trước khi sort / LIMIT (cột ORDER BY khi đó nằm trong SELECT).
+        """
+        if limit == 0 or constant_value(ast) is False:
+            return iter(())
+        extra = [] if columns == ["*"] else [name for name, _ in order_by if name not in columns]
+        read_cols = columns + extra
+        if index_order is not None:
+            stop = None if limit is None else offset + limit
+            rows = self._select_index(read_cols, ast, index_order)
+            if distinct:
+                rows = distinct_rows(rows, None, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+            rows = self._limit_rows(rows, offset, stop)
+        else:
+            rows = self.select_rows(read_cols, ast, mode, parallel, ordered=False, index_scan=index_scan)
+            if distinct:
+                rows = distinct_rows(rows, None, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+            rows = sort_rows(rows, order_by, limit, offset, OPERATOR_MEMORY_ROWS, SPILL_DIR)
+        if not extra:
+            return rows
+        return self._drop_columns(rows, extra)
+
+    def select_rows_distinct(self, columns: list[str], ast: Any = None, mode: str | None = None, parallel: bool | None = None, ordered: bool | None = None, index_scan: IndexScan | None = None, limit: int | None = None, offset: int = 0):
+        """
+        select_rows + DISTINCT: mỗi dòng khác nhau được trả về ngay lần đầu gặp, nên LIMIT
+        vẫn dừng scan sớm khi đã đủ offset + limit dòng khác nhau.
+        """
+        if limit == 0 or constant_value(ast) is False:
+            return iter(())
+        rows = self.select_rows(columns, ast, mode, parallel, ordered, index_scan)
+        rows = distinct_rows(rows, None, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+        return self._limit_rows(rows, offset, None if limit is None else offset + limit)
+
+    def _drop_columns(self, rows, names: list[str]):
+        try:
+            for row in rows:
+                for name in names:
+                    del row[name]
+                yield row
+        finally:
+            rows.close()
+
+    def select_aggregates(self, aggregates: list[Aggregate], ast: Any = None, mode: str | None = None, parallel: bool | None = None, index_scan: IndexScan | None = None, limit: int | None = None, offset: int = 0):
+        """
+        Giống select nhưng cho `SELECT func(col), ...` không GROUP BY: một dòng JSON duy nhất
+        {label: giá trị} (LIMIT / OFFSET áp trên dòng đó).
+        """
+        if limit == 0 or offset > 0:
+            return
+        yield json.dumps(self.aggregate(aggregates, ast, mode, parallel, index_scan))
+
+    def aggregate(self, aggregates: list[Aggregate], ast: Any = None, mode: str | None = None, parallel: bool | None = None, index_scan: IndexScan | None = None) -> dict[str, Any]:
+        """
+        Tính các hàm aggregate trên các dòng thỏa WHERE, không đưa dòng nào ra khỏi scan:
+        - không WHERE: trả lời từ metadata nếu được (số dòng của bản columnar, min / max
+          và số dòng từ thống kê ANALYZE quét toàn bộ bảng);
+        - bản columnar / resident: NumPy reduce trên từng batch cột (mask của WHERE);
+        - parallel scan: mỗi worker fold byte range / nhóm block của nó, chỉ gửi state về;
+        - còn lại: fold các dòng của scan (index, CSV, segments) theo từng batch.
+        Trả về {label: giá trị} theo thứ tự các aggregate.
+        """
+        aggregator = Aggregator(aggregates, self.column_types)
+        state = aggregator.new_state()
+        if constant_value(ast) is False:
+            return aggregator.result(state)
+        if index_scan is not None:
+            rows = self._select_index(self._aggregate_read_cols(aggregator, ast), ast, index_scan)
+            aggregator.add_rows(state, self._aggregate_values(rows, aggregator.columns))
+            return aggregator.result(state)
+
+        columnar = self._open_columnar()
+        if ast is None:
+            known = self._aggregate_from_metadata(aggregator, columnar)
+            if known is not None:
+                if columnar is not None:
+                    columnar.close()
+                return aggregator.result(known)
+        if columnar is not None:
+            read_cols = self._aggregate_read_cols(aggregator, ast, columnar.headers)
+            if self._use_vectorized(ast, mode, typed_source=True) or (ast is None and (mode or EXECUTION_MODE) != "row" and vectorized.available()):
+                self._aggregate_columnar(columnar, aggregator, state, ast)
+                rows = self._appended_rows(columnar, read_cols, ast)
+            else:
+                rows = self._with_appended(columnar, self._select_columnar(columnar, read_cols, ast), read_cols, ast)
+            aggregator.add_rows(state, self._aggregate_values(rows, aggregator.columns))
+            return aggregator.result(state)
+
+        use_vectorized = self._use_vectorized(ast, mode, typed_source=False)
+        segments = self.cold_segments()
+        partials = self._aggregate_parallel(aggregator, segments, ast, use_vectorized, parallel)
+        if partials is not None:
+            for partial in partials:
+                aggregator.merge(state, partial)
+            return aggregator.result(state)
+        if segments is not None:
+            read_cols = self._aggregate_read_cols(aggregator, ast, segments.headers())
+            rows, _ = self._select_segments(segments, read_cols, ast, use_vectorized, parallel=False)
+        else:
+            rows = self._select_csv(self._aggregate_read_cols(aggregator, ast, self.read_headers()), ast, use_vectorized, parallel=False)
+        aggregator.add_rows(state, self._aggregate_values(rows, aggregator.columns))
+        return aggregator.result(state)
+
+    def select_groups(self, group_by: list[str], columns: list[Any], ast: Any = None, mode: str | None = None, parallel: bool | None = None, index_scan: IndexScan | None = None, limit: int | None = None, offset: int = 0, order_by: list[tuple[Any, bool]] | None = None, distinct: bool = False):
+        """
+        `SELECT ... GROUP BY group_by`: một dòng JSON cho mỗi nhóm, các mục theo thứ tự
+        của columns (cột GROUP BY hoặc Aggregate). Không có order_by thì thứ tự các nhóm
+        không xác định; aggregate chỉ có trong ORDER BY được tính thêm rồi bỏ khỏi kết quả.
+        distinct: khử các dòng kết quả trùng nhau (vd. SELECT DISTINCT count(*) ... GROUP BY).
+        """
+        order_by = order_by or []
+        aggregates = list(dict.fromkeys([c for c in columns if isinstance(c, Aggregate)] + [item for item, _ in order_by if isinstance(item, Aggregate)]))
+        groups = self.group_aggregate(group_by, aggregates, ast, mode, parallel, index_scan)
+        # Tên cột của kết quả: tên cột GROUP BY hoặc label của aggregate
+        names = [c.label if isinstance(c, Aggregate) else c for c in columns]
+        rows = groups.result_rows(group_by)
+        if distinct:
+            rows = distinct_rows(rows, names, OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+        if order_by:
+            rows = sort_rows(rows, [(item.label if isinstance(item, Aggregate) else item, desc) for item, desc in order_by], limit, offset, OPERATOR_MEMORY_ROWS, SPILL_DIR)
+        else:
+            rows = self._limit_rows(rows, offset, None if limit is None else offset + limit)
+        try:
+            for values in rows:
+                yield json.dumps({name: values[name] for name in names})
+        finally:
+            rows.close()
+
+    def group_aggregate(self, group_by: list[str], aggregates: list[Aggregate], ast: Any = None, mode: str | None = None, parallel: bool | None = None, index_scan: IndexScan | None = None) -> HashAggregation:
+        """
+        Hash aggregation của các dòng thỏa WHERE theo các cột group_by (xem aggregates.HashAggregation):
+        scan đọc các cột GROUP BY + cột của aggregate; parallel scan gửi về state một phần
+        của các nhóm trong từng range. Caller duyệt kết quả bằng .items().
+        """
+        aggregator = Aggregator(aggregates, self.column_types)
+        groups = HashAggregation(aggregator, len(group_by), OPERATOR_MEMORY_ROWS, SPILL_DIR, SPILL_PARTITIONS)
+        if constant_value(ast) is False:
+            return groups
+        try:
+            self._fill_groups(groups, group_by, ast, mode, parallel, index_scan)
+        except BaseException:
+            # Lỗi giữa scan: xoá các partition đã spill
+            groups.close()
+            raise
+        return groups
+
+    def _fill_groups(self, groups: HashAggregation, group_by: list[str], ast: Any, mode: str | None, parallel: bool | None, index_scan: IndexScan | None) -> None:
+        aggregator = groups.aggregator
+        read_cols = group_by + aggregator.columns
+        if index_scan is not None:
+            groups.add_rows(self._aggregate_values(self._select_index(read_cols, ast, index_scan), read_cols))
+            return
+        columnar = self._open_columnar()
+        use_vectorized = self._use_vectorized(ast, mode, typed_source=columnar is not None)
+        if columnar is not None:
+            rows = self._with_appended(columnar, self._select_columnar(columnar, read_cols, ast, use_vectorized), read_cols, ast, use_vectorized)
+            groups.add_rows(self._aggregate_values(rows, read_cols))
+            return
+        segments = self.cold_segments()
+        partials = self._aggregate_parallel(aggregator, segments, ast, use_vectorized, parallel, group_by)
+        if partials is not None:
+            try:
+                for key, partial in partials:
+                    groups.merge(key, partial)
+            finally:
+                partials.close()
+            return
+        if segments is not None:
+            rows, _ = self._select_segments(segments, read_cols, ast, use_vectorized, parallel=False)
+        else:
+            rows = self._select_csv(read_cols, ast, use_vectorized, parallel=False)
+        groups.add_rows(self._aggregate_values(rows, read_cols))
+
+    def _aggregate_read_cols(self, aggregator: Aggregator, ast: Any, headers: list[str] | None = None) -> list[str]:
+        # Chỉ có COUNT(*): vẫn phải đọc một cột để scan trả về từng dòng khớp
+        if aggregator.columns:
+            return aggregator.columns
+        return (self._ast_columns(ast) or headers or self.read_headers())[:1]
+
+    def _aggregate_values(self, rows: Iterator[dict[str, Any]], columns: list[str]) -> Iterator[list[Any]]:
+        try:
+            for row in rows:
+                yield [row[c] for c in columns]
+        finally:
+            rows.close()
+
+    def _aggregate_from_metadata(self, aggregator: Aggregator, columnar: ColumnarTable | None) -> list[Any] | None:
+        """
+        State của các aggregate trên toàn bảng nếu trả lời được mà không scan, ngược lại None:
+        số dòng từ bản columnar / resident hoặc thống kê ANALYZE quét toàn bộ bảng, min / max
+        từ thống kê (chỉ khi cột không có field rỗng: thống kê bỏ qua field rỗng, scan đọc là 0 / "").
+        Không dùng khi có dòng được append sau khi build bản columnar / ANALYZE.
+        """
+        state = aggregator.new_state()
+        if aggregator.row_count_only() and columnar is not None and columnar.appended is None:
+            state[0] = columnar.row_count
+            return state
+        stats = self.get_statistics()
+        if stats is None or stats.sampled_rows is not None or stats.appended_rows:
+            return None
+        state[0] = stats.row_count
+        for i, (kind, col) in enumerate(aggregator.slots, 1):
+            info = stats.column(aggregator.columns[col])
+            if kind == "sum" or info is None or info.get("empty"):
+                return None
+            state[i] = info.get(kind)
+        return state
+
+    def _aggregate_columnar(self, columnar: ColumnarTable, aggregator: Aggregator, state: list[Any], ast: Any) -> None:
+        """
+        Vectorized aggregate trên bản columnar / resident: mask của WHERE cho từng batch
+        rồi NumPy reduce trên các hàng khớp của từng cột aggregate.
+        """
+        np = vectorized.np
+        try:
+            ast, column_types = code_predicates(ast, self.column_types, columnar.encodings())
+            filter_cols = self._ast_columns(ast, column_types)
+            mask_fn = vectorized.compile_mask(ast, column_types) if ast is not None else None
+            row_filter = self._compile_filter(ast, {c: i for i, c in enumerate(filter_cols)}, typed=True, column_types=column_types)
+            for start, stop in batch_ranges(0, columnar.row_count, batch_sizes(VECTOR_BATCH_SIZE)):
+                n = stop - start
+                arrays = {c: self._columnar_array(columnar, c, start, stop) for c in filter_cols}
+                hits = None
+                if mask_fn is not None:
+                    rows = lambda: zip(*(arrays[c].tolist() for c in filter_cols)) if filter_cols else [()] * n
+                    hits = np.flatnonzero(self._batch_mask(mask_fn, arrays, n, rows, row_filter))
+                    n = hits.size
+                    if n == 0:
+                        continue
+                values = []
+                for c in aggregator.columns:
+                    column = arrays[c] if c in arrays else self._columnar_array(columnar, c, start, stop)
+                    values.append(column if hits is None else column[hits])
+                aggregator.add_arrays(state, n, values)
+        finally:
+            columnar.close()
+
+    def _aggregate_parallel(self, aggregator: Aggregator, segments: SegmentFile | None, ast: Any, use_vectorized: bool, parallel: bool | None, group_by: list[str] | None = None) -> Iterator[Any] | None:
+        """
+        State một phần của từng byte range (CSV) / nhóm block (segments) do các worker của
+        parallel scan fold (với group_by: các cặp (key, state) của từng range);
+        None nếu không scan song song (cùng quy tắc như select).
+        """
+        table_args = (self.name, self.db_name, self.column_metadata)
+        if segments is not None:
+            block_ids = segments.matching_blocks(ast, self.column_types)
+            scan_bytes = sum(segments.blocks[i]["size"] for i in block_ids)
+            if not self._use_parallel(True, scan_bytes, parallel):
+                return None
+            headers = segments.headers()
+            self._check_headers(headers)
+            return parallel_scan.scan(
+                table_args, segments.group_blocks(block_ids, PARALLEL_CHUNK_BYTES), headers, [], ast, use_vectorized,
+                workers=PARALLEL_WORKERS, ordered=False, crlf=segments.crlf, segments=True, aggregates=aggregator.aggregates, group_by=group_by,
+            )
+
+        headers = self.read_headers()
+        mm = self._open_mmap()
+        try:
+            simple, crlf = self._csv_layout(mm)
+            header_end = mm.find(b"\n", 0)
+            data_start = len(mm) if header_end == -1 else header_end + 1
+            ranges = None
+            if ast is not None:
+                zone_map = ZoneMap.load(self.db_path, self.name, self.csv_path, len(mm))
+                if zone_map is not None:
+                    ranges = zone_map.matching_ranges(ast, self.column_types)
+            scan_ranges = ranges if ranges is not None else [(data_start, len(mm))]
+            if not self._use_parallel(simple, sum(e - s for s, e in scan_ranges), parallel):
+                return None
+            chunks = [
+                chunk
+                for start, end in scan_ranges
+                for chunk in parallel_scan.split_ranges(mm, start, end, PARALLEL_CHUNK_BYTES)
+            ]
+        finally:
+            mm.close()
+        return parallel_scan.scan(
+            table_args, chunks, headers, [], ast, use_vectorized,
+            workers=PARALLEL_WORKERS, ordered=False, crlf=crlf, aggregates=aggregator.aggregates, group_by=group_by,
+        )
+
+    def _aggregate_task(self, task: Any, headers: list[str], aggregates: list[Aggregate], group_by: list[str] | None, ast: Any, use_vectorized: bool, crlf: bool, segments: bool) -> list[Any]:
+        """
+        Fold một byte range của CSV (simple CSV) / một nhóm block của segments vào state
+        của các aggregate: trả về [state], hoặc với group_by danh sách (key, state) của các
+        nhóm trong range. Được gọi trong worker process của parallel_scan.
+        """
+        aggregator = Aggregator(aggregates, self.column_types)
+        read_cols = group_by + aggregator.columns if group_by else self._aggregate_read_cols(aggregator, ast, headers)
+        col_to_idx = {name: idx for idx, name in enumerate(headers)}
+        mm = None
+        if segments:
+            segment_file = SegmentFile.open(self.db_path, self.name)
+            if segment_file is None:
+                raise dpapi2_exception.OperationalError(f"Compressed segments of table '{self.name}' changed during the scan.")
+            rows = self._filter_segment_blocks(segment_file, task, headers, read_cols, ast, use_vectorized)
+        else:
+            start, end = task
+            cast_plan = self._build_cast_plan(read_cols, col_to_idx, raw_bytes=True)
+            mm = self._open_mmap()
+            rows = self._filter_byte_batches(self._byte_batches(mm, start, end, len(headers), crlf), col_to_idx, ast, cast_plan, use_vectorized)
+        try:
+            if group_by:
+                # Một range chỉ có vài chục MB dữ liệu: bảng hash của worker không cần spill
+                groups = HashAggregation(aggregator, len(group_by), max_groups=None)
+                groups.add_rows(rows)
+                return list(groups.items())
+            state = aggregator.new_state()
+            aggregator.add_rows(state, rows)
+            return [state]
+        finally:
+            rows.close()
+            if mm is not None:
+                mm.close()
+
+    def cold_segments(self) -> SegmentFile | None:
+        """
+        Segments của bảng nếu bảng chỉ còn bản nén (file CSV đã bị xoá), ngược lại None.
+        """
+        if os.path.exists(self.csv_path):
+            return None
+        return SegmentFile.open(self.db_path, self.name)
+
+    def data_signature(self) -> list[int] | None:
+        """
+        Signature của file đang chứa dữ liệu bảng: CSV, hoặc file segments với bảng chỉ còn bản nén.
+        """
+        signature = self.csv_signature()
+        if signature is None:
+            segments = self.cold_segments()
+            if segments is not None:
+                return segments.signature
+        return signature
+
+    def _open_columnar(self) -> ColumnarTable | None:
+        """
+        Nguồn dữ liệu đã có kiểu của bảng: bản resident nếu bảng được cấu hình resident
+        (và vừa memory budget), ngược lại bản columnar trên đĩa nếu còn khớp CSV.
+        Các dòng INSERT sau khi build bản đó nằm ở byte range .appended của CSV (xem _with_appended).
+        """
+        if self.resident:
+            copy = resident.store.get(self)
+            if copy is not None:
+                return copy
+        return ColumnarTable.open(self.db_path, self.name, self.csv_path, self.csv_signature())
+
+    def _with_appended(self, columnar: ColumnarTable, rows, columns: list[str], ast: Any = None, use_vectorized: bool = False):
+        """
+        Các dòng rows của bản columnar / resident, tiếp theo là các dòng được append vào
+        CSV sau khi build bản đó.
+        """
+        yield from rows
+        yield from self._appended_rows(columnar, columns, ast, use_vectorized)
+
+    def _appended_rows(self, columnar: ColumnarTable, columns: list[str], ast: Any = None, use_vectorized: bool = False):
+        """
+        Scan byte range columnar.appended của CSV (rỗng nếu bản columnar / resident đủ dòng).
+        """
+        if columnar.appended is not None:
+            yield from self._select_csv(columns, ast, use_vectorized, parallel=False, ranges=[columnar.appended])
+
+    def _limit_rows(self, rows, offset: int, stop: int | None):
+        """
+        LIMIT / OFFSET trên kết quả đã filter; đóng scan bên dưới ngay khi đủ dòng.
+        """
+        try:
+            yield from itertools.islice(rows, offset, stop)
+        finally:
+            rows.close()
+
+    def get_row_index(self) -> RowOffsetIndex:
+        """
+        Row offset index của bảng (build / cập nhật ở lần đầu cần dùng sau khi CSV đổi).
+        """
+        cached = self._row_index
+        if cached is not None and cached.source == file_signature(self.csv_path):
+            return cached
+        with self._index_lock:
+            self._row_index = RowOffsetIndex.open(self)
+            return self._row_index
+
+    def _row_ranges(self, first: int, stop: int | None) -> list[tuple[int, int]] | None:
+        """
+        Byte range của các dòng [first, stop) theo row index; None nếu không dùng được
+        row index (field có xuống dòng trong dấu nháy) - khi đó OFFSET đọc rồi bỏ.
+        """
+        try:
+            index = self.get_row_index()
+        except dpapi2_exception.NotSupportedError:
+            return None
+        start, end = index.byte_range(first, stop)
+        return [(start, end)] if end > start else []
+
+    def _use_vectorized(self, ast: Any, mode: str | None, typed_source: bool) -> bool:
+        """
+        typed_source: dữ liệu đọc ra đã có kiểu (bản columnar). Với CSV thô, chi phí
+        tokenize + cast lấn át phần filter nên "auto" giữ row mode.
+        """
+        mode = mode or EXECUTION_MODE
+        if mode not in ("row", "vectorized", "auto"):
+            raise dpapi2_exception.InterfaceError(f"Unknown execution mode '{mode}'.")
+        if ast is None or mode == "row":
+            return False
+        if mode == "vectorized":
+            if not vectorized.available():
+                raise dpapi2_exception.NotSupportedError("Vectorized execution requires NumPy.")
+            return True
+        return typed_source and vectorized.available()
+
+    def _batch_mask(self, mask_fn: Callable, arrays: dict[str, Any], n: int, rows: Callable[[], Any], row_filter: Callable) -> Any:
+        """
+        Tính mask cho một batch n hàng; nếu vector semantics khác row mode (vd. chia
+        cho 0) thì đánh giá lại batch đó bằng row_filter trên rows().
+        """
+        try:
+            return mask_fn(arrays, n)
+        except vectorized.RowFallback:
+            pass
+        try:
+            return vectorized.np.fromiter((bool(row_filter(vals)) for vals in rows()), dtype=bool, count=n)
+        except Exception as e:
+            raise dpapi2_exception.ProgrammingError("Error evaluating WHERE filter.") from e
+
+    def _select_columnar(self, columnar: ColumnarTable, columns: list[str], ast: Any = None, use_vectorized: bool = False, row_range: tuple[int, int | None] = (0, None), row_limit: int | None = None):
+        """
+        Chỉ mở file của các cột được SELECT và các cột trong WHERE.
+        row_range: chỉ đọc các dòng [start, stop) (dùng cho OFFSET/LIMIT khi không có WHERE).
+        row_limit: caller chỉ cần tối đa chừng này dòng (LIMIT), dùng để thu nhỏ batch.
+        """
+        try:
+            headers = columnar.headers
+            self._check_headers(headers)
+            select_cols = self._resolve_select_cols(headers, columns)
+            # So sánh trên cột đã encode được dịch một lần sang so sánh trên code
+            ast, column_types = code_predicates(ast, self.column_types, columnar.encodings())
+            filter_cols = self._ast_columns(ast, column_types)
+            if use_vectorized:
+                yield from self._scan_columnar_vectorized(columnar, ast, select_cols, filter_cols, column_types, row_limit)
+                return
+
+            read_cols = list(dict.fromkeys(select_cols + filter_cols))
+            col_to_idx = {name: idx for idx, name in enumerate(read_cols)}
+            row_filter = self._compile_filter(ast, col_to_idx, typed=True, column_types=column_types)
+            proj_idxs = [col_to_idx[c] for c in select_cols]
+
+            first_batch = limit_batch_rows(COLUMNAR_BATCH_ROWS, row_limit)
+            for vals in columnar.iter_rows(read_cols, *row_range, batch_rows=first_batch):
+                try:
+                    passed = row_filter(vals)
+                except Exception as e:
+                    raise dpapi2_exception.ProgrammingError("Error evaluating WHERE filter.") from e
+                if not passed:
+                    continue
+                yield dict(zip(select_cols, [vals[i] for i in proj_idxs]))
+        finally:
+            columnar.close()
+
+    def _scan_columnar_vectorized(self, columnar: ColumnarTable, ast: Any, select_cols: list[str], filter_cols: list[str], column_types: dict[str, str], row_limit: int | None = None):
+        """
+        Batch mode trên bản columnar: cột số / cột code được map thẳng thành ndarray
+        (zero-copy), cột chỉ dùng để SELECT chỉ được decode cho các hàng qua filter.
+        column_types: kiểu các cột của AST (gồm cả cột "<column>#code").
+        """
+        np = vectorized.np
+        mask_fn = vectorized.compile_mask(ast, column_types)
+        # row_filter trên tuple các cột WHERE, chỉ dùng khi phải fallback
+        row_filter = self._compile_filter(ast, {c: i for i, c in enumerate(filter_cols)}, typed=True, column_types=column_types)
+        sizes = batch_sizes(VECTOR_BATCH_SIZE, limit_batch_rows(VECTOR_BATCH_SIZE, row_limit))
+        for start, stop in batch_ranges(0, columnar.row_count, sizes):
+            arrays = {c: self._columnar_array(columnar, c, start, stop) for c in filter_cols}
+
+            n = stop - start
+            rows = lambda: zip(*(arrays[c].tolist() for c in filter_cols)) if filter_cols else [()] * n
+            mask = self._batch_mask(mask_fn, arrays, n, rows, row_filter)
+            hits = np.flatnonzero(mask)
+            if hits.size == 0:
+                continue
+
+            projected = []
+            for c in select_cols:
+                if c in arrays:
+                    projected.append(arrays[c][hits].tolist())
+                elif columnar.encoding(c) == "dict":
+                    # Chỉ tra dictionary cho các hàng qua filter
+                    values = columnar.dictionary(c)
+                    codes = np.frombuffer(columnar.code_view(c)[start:stop], dtype=columnar.columns[c]["code_type"])
+                    projected.append([values[i] for i in codes[hits].tolist()])
+                elif self.column_types[c] == "string":
+                    values = columnar.read_batch(c, start, stop)
+                    projected.append([values[i] for i in hits.tolist()])
+                else:
+                    projected.append(self._columnar_array(columnar, c, start, stop)[hits].tolist())
+            for vals in zip(*projected):
+                yield dict(zip(select_cols, vals))
+
+    def _columnar_array(self, columnar: ColumnarTable, column: str, start: int, stop: int) -> Any:
+        """
+        ndarray các dòng [start, stop) của một cột (hoặc cột code "<column>#code") trong
+        bản columnar: view zero-copy với cột số plain / cột code, decode với các cột khác.
+        """
+        np = vectorized.np
+        if column.endswith(CODE_SUFFIX):
+            name = column[:-len(CODE_SUFFIX)]
+            return np.frombuffer(columnar.code_view(name)[start:stop], dtype=columnar.columns[name]["code_type"])
+        encoding = columnar.encoding(column)
+        if encoding == "for":
+            codes = np.frombuffer(columnar.code_view(column)[start:stop], dtype=columnar.columns[column]["code_type"])
+            return codes.astype(np.int64) + columnar.columns[column]["reference"]
+        if encoding == "dict":
+            dictionary = vectorized.to_array(columnar.dictionary(column), "string")
+            codes = np.frombuffer(columnar.code_view(column)[start:stop], dtype=columnar.columns[column]["code_type"])
+            return dictionary[codes]
+        if self.column_types[column] == "string":
+            return vectorized.to_array(columnar.read_batch(column, start, stop), "string")
+        return vectorized.to_array(columnar.fixed_view(column)[start:stop], self.column_types[column])
+
+    def _get_index(self, kind: str, column: str) -> SortedIndex | HashIndex | None:
+        """
+        Index được mở (mmap) lười ở lần đầu cần dùng rồi giữ lại trên Table; mở lại khi
+        CSV đổi (chỉ đọc phần được append nếu CSV chỉ được INSERT thêm dòng, xem index.py).
+        Index thiếu / cũ được build lại nếu INDEX_AUTO_BUILD bật.
+        """
+        cached = self._open_indexes.get((kind, column))
+        if cached is not None and cached.source == file_signature(self.csv_path):
+            return cached
+        index_cls, build = _INDEX_TYPES[kind]
+        with self._index_lock:
+            index = index_cls.open(self, column)
+            if index is None and INDEX_AUTO_BUILD:
+                build(self, column)
+                index = index_cls.open(self, column)
+            if index is None:
+                self._open_indexes.pop((kind, column), None)
+            else:
+                self._open_indexes[(kind, column)] = index
+        return index
+
+    def index_candidates(self, ast: Any) -> list[tuple[str, str, KeyRange, SortedIndex | HashIndex]]:
+        """
+        Các index dùng được cho các conjunct trong WHERE, dạng (column, kind, key_range, index):
+        - sorted index: các điều kiện sargable (=, <, <=, >, >=) và IN trên cột,
+        - hash index: điều kiện bằng (=) hoặc IN trên cột.
+        """
+        if ast is None or not self.indexes or not os.path.exists(self.csv_path):
+            return []
+        candidates = []
+        for kind in INDEX_KINDS:
+            columns = {c for c, k in self.indexes.items() if k == kind}
+            if not columns:
+                continue
+            for column, key_range in key_ranges(ast, self.column_types, columns).items():
+                is_point = (
+                    key_range.empty
+                    or key_range.values is not None
+                    or (key_range.low is not None and key_range.low == key_range.high
+                        and key_range.low_inclusive and key_range.high_inclusive)
+                )
+                if kind == "hash" and not is_point:
+                    continue
+                try:
+                    index = self._get_index(kind, column)
+                except dpapi2_exception.NotSupportedError:
+                    continue
+                if index is not None:
+                    candidates.append((column, kind, key_range, index))
+        return candidates
+
+    def index_scan(self, column: str, kind: str, key_range: KeyRange, index: SortedIndex | HashIndex) -> IndexScan:
+        """
+        Đọc offset các dòng thỏa key_range từ index.
+        """
+        if key_range.values is not None:
+            # IN: một lookup cho mỗi giá trị, gộp lại theo thứ tự trong file
+            if kind == "sorted":
+                offsets = [o for lo, hi in index.member_bounds(key_range) for o in index.offsets[lo:hi].tolist()]
+            else:
+                offsets = [o for value in key_range.members() for o in index.lookup(value)]
+            return IndexScan(column, kind, key_range, sorted(offsets))
+        if kind == "sorted":
+            lo, hi = index.bounds(key_range)
+            return IndexScan(column, kind, key_range, index.row_offsets(lo, hi))
+        return IndexScan(column, kind, key_range, [] if key_range.empty else index.lookup(key_range.low))
+
+    def choose_index(self, ast: Any) -> IndexScan | None:
+        """
+        Chọn index trả về ít dòng nhất (xem index_candidates), khi bảng chưa có thống kê
+        cho planner. Trả về None nếu không có index dùng được hoặc index trả về quá nhiều
+        dòng (> INDEX_MAX_FRACTION số dòng của bảng) - khi đó scan tuần tự rẻ hơn.
+        """
+        scans: list[IndexScan] = []
+        for column, kind, key_range, index in self.index_candidates(ast):
+            if kind == "sorted" and index.matched(key_range) > index.count * INDEX_MAX_FRACTION:
+                continue
+            scan = self.index_scan(column, kind, key_range, index)
+            if len(scan.offsets) > index.count * INDEX_MAX_FRACTION:
+                continue
+            scans.append(scan)
+        return min(scans, key=lambda scan: len(scan.offsets), default=None)
+
+    def _select_index(self, columns: list[str], ast: Any, index_scan: IndexScan):
+        """
+        Index scan: seek thẳng tới các dòng trong mmap, vẫn áp dụng toàn bộ WHERE.
+        """
+        headers = self.read_headers()
+        col_to_idx = {name: idx for idx, name in enumerate(headers)}
+        select_cols = self._resolve_select_cols(headers, columns)
+        cast_plan = self._build_cast_plan(select_cols, col_to_idx)
+        row_filter = self._compile_filter(ast, col_to_idx)
+        mm = self._open_mmap()
+        try:
+            rows = self._read_rows_at(mm, index_scan.offsets)
+            for typed_vals in self._filter_csv_rows(rows, len(headers), row_filter, cast_plan):
+                yield dict(zip(select_cols, typed_vals))
+        finally:
+            mm.close()
+
+    def build_indexes(self) -> list[dict[str, Any]]:
+        """
+        Build tất cả index khai báo trong metadata của bảng.
+        """
+        built = []
+        for column, kind in self.indexes.items():
+            built.append(_INDEX_TYPES[kind][1](self, column))
+        return built
+
+    def _build_cast_plan(self, select_cols: list[str], col_to_idx: dict[str, int], raw_bytes: bool = False) -> list[tuple[int, Callable[[str], Any], str]]:
+        # Build cast_plan: mỗi phần tử là (idx_in_row, cast_fn, column_name)
+        cast_plan: list[tuple[int, Callable[[str], Any], str]] = []
+        type_map = self.column_types
+        type_to_fn = self._bytes_cast_fn if raw_bytes else self._type_to_cast_fn
+        for col_name in select_cols:
+            col_type = type_map.get(col_name)
+            if col_type not in type_to_fn:
+                raise dpapi2_exception.NotSupportedError(f"Unsupported column type '{col_type}' for column '{col_name}'.")
+            cast_plan.append((col_to_idx[col_name], type_to_fn[col_type], col_name))
+        return cast_plan
+
+    def _csv_layout(self, mm: mmap.mmap) -> tuple[bool, bool]:
+        """
+        (simple, crlf) của file CSV, ghi nhớ trên Table theo signature của file.
+        simple: không có dấu nháy nào và mọi '\r' đều thuộc "\r\n" - khi đó một dòng
+        là một record và field chỉ cần split theo ',' (fast path trên bytes, chia
+        byte range cho parallel scan). crlf: file dùng "\r\n".
+        """
+        signature = file_signature(self.csv_path)
+        if self._layout is not None and self._layout[0] == signature:
+            return self._layout[1], self._layout[2]
+        simple = mm.find(b'"', 0) == -1 and _LONE_CR.search(mm) is None
+        crlf = mm.find(b"\r", 0) != -1
+        self._layout = (signature, simple, crlf)
+        return simple, crlf
+
+    def _use_parallel(self, simple: bool, scan_bytes: int, parallel: bool | None) -> bool:
+        """
+        parallel=None: tự chọn theo số byte cần scan (PARALLEL_MIN_BYTES).
+        Chỉ chia theo byte range được khi file là simple CSV (xem _csv_layout).
+        """
+        if parallel is None:
+            parallel = PARALLEL_WORKERS > 1 and scan_bytes >= PARALLEL_MIN_BYTES
+        return bool(parallel) and simple
+
+    def _select_csv(self, columns: list[str], ast: Any = None, use_vectorized: bool = False, parallel: bool | None = None, ordered: bool | None = None, ranges: list[tuple[int, int]] | None = None, row_limit: int | None = None):
+        """
+        ranges: chỉ scan các byte range này (vd. từ row index) thay vì toàn bộ file.
+        row_limit: caller chỉ cần tối đa chừng này dòng (LIMIT): batch đầu nhỏ, mỗi
+        worker parallel dừng sau row_limit dòng khớp; không WHERE thì không chạy parallel.
+        """
         try:
             mm = self._open_mmap()
             mmap_reader = MMapReader(mm)
@@ -123,89 +1062,546 @@ class Table:
                 raise dpapi2_exception.OperationalError("CSV file is empty.")
             headers = [h.strip() for h in headers]
             col_to_idx = {name: idx for idx, name in enumerate(headers)}
+            self._check_headers(headers)
  
-            # Kiểm tra metadata cover tất cả header
-            for col in headers:
-                if col not in self.column_types:
-                    raise dpapi2_exception.ProgrammingError(f"Column '{col}' missing in metadata.")
- 
+            # CSV không có dấu nháy: split thẳng trên bytes của mmap, bỏ qua TextIOWrapper + csv.reader
+            simple, crlf = self._csv_layout(mm)
+
+            # Xác định select_cols rồi build cast_plan
+            select_cols = self._resolve_select_cols(headers, columns)
+            cast_plan = self._build_cast_plan(select_cols, col_to_idx, raw_bytes=simple)
+
+            header_end = mm.find(b"\n", 0)
+            data_start = len(mm) if header_end == -1 else header_end + 1
+
+            # Zone map: chỉ giữ các block có thể thỏa WHERE (None = scan toàn bộ file)
+            if ranges is None and ast is not None:
+                zone_map = ZoneMap.load(self.db_path, self.name, self.csv_path, len(mm))
+                if zone_map is not None:
+                    ranges = zone_map.matching_ranges(ast, self.column_types)
+            scan_ranges = ranges if ranges is not None else [(data_start, len(mm))]
+
+            # Parallel scan: chia các byte range cần scan thành các chunk cho worker
+            scan_bytes = sum(e - s for s, e in scan_ranges)
+            if ast is None and row_limit is not None:
+                # Mọi dòng đều khớp: vài KB đầu tiên đã đủ, không cần chia cho worker
+                parallel = False
+            if self._use_parallel(simple, scan_bytes, parallel):
+                chunks = [
+                    chunk
+                    for start, end in scan_ranges
+                    for chunk in parallel_scan.split_ranges(mm, start, end, PARALLEL_CHUNK_BYTES)
+                ]
+                rows = parallel_scan.scan(
+                    (self.name, self.db_name, self.column_metadata),
+                    chunks, headers, select_cols, ast, use_vectorized,
+                    workers=PARALLEL_WORKERS,
+                    ordered=PARALLEL_ORDERED if ordered is None else ordered,
+                    crlf=crlf,
+                    max_rows=row_limit,
+                )
+                for typed_vals in rows:
+                    yield dict(zip(select_cols, typed_vals))
+                return
+
+            if simple:
+                sizes = batch_sizes(_BYTE_SCAN_CHUNK, None if row_limit is None else _BYTE_SCAN_FIRST_CHUNK)
+                batches = itertools.chain.from_iterable(
+                    self._byte_batches(mm, start, end, len(headers), crlf, sizes) for start, end in scan_ranges
+                )
+                rows = self._filter_byte_batches(batches, col_to_idx, ast, cast_plan, use_vectorized)
+                for typed_vals in rows:
+                    yield dict(zip(select_cols, typed_vals))
+                return
+
+            if ranges is not None:
+                reader = itertools.chain.from_iterable(self._range_reader(mm, start, end) for start, end in ranges)
+
             # Xây dựng row_filter từ AST (nếu có)
-            if ast is not None:
-                try:
-                    expr_str = self._ast_to_python_expr(ast, col_to_idx, self.column_types)
-                    code = f"def row_filter(vals):\n    return {expr_str}"
-                    namespace: dict[str, Any] = {}
-                    exec(code, namespace)
-                    row_filter = namespace["row_filter"]
-                except dpapi2_exception.ProgrammingError:
-                    raise
-                except Exception as e:
-                    raise dpapi2_exception.ProgrammingError("Error compiling WHERE expression.") from e
+            row_filter = self._compile_filter(ast, col_to_idx)
+            if use_vectorized:
+                rows = self._scan_csv_vectorized(reader, len(headers), col_to_idx, ast, row_filter, cast_plan, row_limit)
             else:
-                row_filter = lambda vals: True
+                rows = self._filter_csv_rows(reader, len(headers), row_filter, cast_plan)
+            for typed_vals in rows:
+                yield dict(zip(select_cols, typed_vals))
  
-            # Xác định select_cols và select_idxs, rồi build cast_plan
-            if columns == ["*"]:
-                select_cols = headers[:]
+        finally:
+            # Đóng TextIOWrapper và mmap khi kết thúc hoặc lỗi
+            try:
+                text_stream.close()
+            except Exception:
+                pass
+            try:
+                mm.close()
+            except Exception:
+                pass
+
+    def _select_segments(self, segments: SegmentFile, columns: list[str], ast: Any = None, use_vectorized: bool = False, parallel: bool | None = None, ordered: bool | None = None, row_limit: int | None = None, first_row: int = 0):
+        """
+        Scan bảng chỉ còn bản nén: chỉ giải nén các block mà min / max có thể thỏa WHERE.
+        first_row: bỏ qua nguyên các block nằm trước dòng này (OFFSET khi không có WHERE).
+        Trả về (generator dict các dòng, số dòng đã bỏ qua).
+        """
+        headers = segments.headers()
+        self._check_headers(headers)
+        select_cols = self._resolve_select_cols(headers, columns)
+        block_ids = segments.matching_blocks(ast, self.column_types)
+        skipped = 0
+        while block_ids and skipped + segments.blocks[block_ids[0]]["rows"] <= first_row:
+            skipped += segments.blocks[block_ids.pop(0)]["rows"]
+        return self._scan_segments(segments, block_ids, headers, select_cols, ast, use_vectorized, parallel, ordered, row_limit), skipped
+
+    def _scan_segments(self, segments: SegmentFile, block_ids: list[int], headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, parallel: bool | None, ordered: bool | None, row_limit: int | None):
+        scan_bytes = sum(segments.blocks[i]["size"] for i in block_ids)
+        if ast is None and row_limit is not None:
+            parallel = False
+        # Block cắt theo ranh giới dòng nên chia được cho worker cả khi CSV có dấu nháy
+        if self._use_parallel(True, scan_bytes, parallel):
+            rows = parallel_scan.scan(
+                (self.name, self.db_name, self.column_metadata),
+                segments.group_blocks(block_ids, PARALLEL_CHUNK_BYTES), headers, select_cols, ast, use_vectorized,
+                workers=PARALLEL_WORKERS,
+                ordered=PARALLEL_ORDERED if ordered is None else ordered,
+                crlf=segments.crlf,
+                max_rows=row_limit,
+                segments=True,
+            )
+        else:
+            rows = self._filter_segment_blocks(segments, block_ids, headers, select_cols, ast, use_vectorized, row_limit)
+        try:
+            for typed_vals in rows:
+                yield dict(zip(select_cols, typed_vals))
+        finally:
+            rows.close()
+
+    def _scan_segment_blocks(self, block_ids: list[int], headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, max_rows: int | None = None) -> list[list[Any]]:
+        """
+        Giải nén + filter + cast một nhóm block của segments. Được gọi trong worker process của parallel_scan.
+        """
+        segments = SegmentFile.open(self.db_path, self.name)
+        if segments is None:
+            raise dpapi2_exception.OperationalError(f"Compressed segments of table '{self.name}' changed during the scan.")
+        rows = self._filter_segment_blocks(segments, block_ids, headers, select_cols, ast, use_vectorized, max_rows)
+        try:
+            return [list(vals) for vals in itertools.islice(rows, max_rows)]
+        finally:
+            rows.close()
+
+    def _filter_segment_blocks(self, segments: SegmentFile, block_ids: list[int], headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, row_limit: int | None = None):
+        """
+        Giải nén lần lượt các block rồi filter + cast như một byte range của CSV:
+        split trên bytes nếu CSV gốc là simple, ngược lại csv.reader.
+        """
+        col_to_idx = {name: idx for idx, name in enumerate(headers)}
+        blocks = segments.iter_blocks(block_ids)
+        try:
+            if segments.simple:
+                cast_plan = self._build_cast_plan(select_cols, col_to_idx, raw_bytes=True)
+                sizes = batch_sizes(_BYTE_SCAN_CHUNK, None if row_limit is None else _BYTE_SCAN_FIRST_CHUNK)
+                batches = itertools.chain.from_iterable(
+                    self._byte_batches(data, 0, len(data), len(headers), segments.crlf, sizes) for data in blocks
+                )
+                yield from self._filter_byte_batches(batches, col_to_idx, ast, cast_plan, use_vectorized)
+                return
+
+            cast_plan = self._build_cast_plan(select_cols, col_to_idx)
+            reader = itertools.chain.from_iterable(self._block_reader(segments, data) for data in blocks)
+            row_filter = self._compile_filter(ast, col_to_idx)
+            if use_vectorized:
+                yield from self._scan_csv_vectorized(reader, len(headers), col_to_idx, ast, row_filter, cast_plan, row_limit)
             else:
-                select_cols = columns[:]
-                for c in select_cols:
-                    if c not in col_to_idx:
-                        raise dpapi2_exception.ProgrammingError(f"Selected column '{c}' not in CSV header.")
-            select_idxs = [col_to_idx[c] for c in select_cols]
- 
-            # Build cast_plan: mỗi phần tử là (idx_in_row, cast_fn, column_name)
-            cast_plan: list[tuple[int, Callable[[str], Any], str]] = []
-            type_map = self.column_types
-            type_to_fn = self._type_to_cast_fn
-            for col_name, idx in zip(select_cols, select_idxs):
-                col_type = type_map.get(col_name)
-                if col_type not in type_to_fn:
-                    raise dpapi2_exception.NotSupportedError(f"Unsupported column type '{col_type}' for column '{col_name}'.")
-                fn = type_to_fn[col_type]
-                cast_plan.append((idx, fn, col_name))
- 
-            # 5) Duyệt từng dòng qua csv.reader, filter + cast rồi yield JSON
-            for vals in reader:
-                # Nếu row rỗng hoặc thiếu cột
-                if not vals or len(vals) < len(headers):
+                yield from self._filter_csv_rows(reader, len(headers), row_filter, cast_plan)
+        finally:
+            blocks.close()
+
+    def _block_reader(self, segments: SegmentFile, data: bytes):
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise dpapi2_exception.DataError(f"Invalid UTF-8 data in '{segments.data_path}'.") from e
+        return csv.reader(io.StringIO(text, newline=""))
+
+    def _range_reader(self, mm: mmap.mmap, start: int, end: int):
+        """
+        csv.reader trên byte range [start, end) (đã căn theo ranh giới dòng) của file.
+        """
+        try:
+            text = mm[start:end].decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise dpapi2_exception.DataError(f"Invalid UTF-8 data in '{self.csv_path}'.") from e
+        return csv.reader(io.StringIO(text, newline=""))
+
+    def _byte_batches(self, mm: mmap.mmap | bytes, start: int, end: int, n_headers: int, crlf: bool, sizes: Iterator[int] | None = None):
+        """
+        Fast path cho simple CSV: cắt [start, end) thành các chunk (~_BYTE_SCAN_CHUNK byte,
+        hoặc theo `sizes`) theo ranh giới dòng và tách thẳng trên bytes, không decode.
+        Yield (n_rows, columns) với columns[i] là list bytes của cột i.
+        Mỗi chunk được split một lần cho cả chunk (newline -> ",\n" rồi split theo ','),
+        cột i là fields[i::n_headers]; nếu số field không khớp (dòng trống, thiếu / thừa
+        field) thì chunk đó được tách từng dòng với cùng quy tắc như csv.reader.
+        """
+        sizes = sizes or batch_sizes(_BYTE_SCAN_CHUNK)
+        pos = start
+        while pos < end:
+            cut = min(pos + next(sizes), end)
+            if cut < end:
+                nl = mm.find(b"\n", cut - 1, end)
+                cut = end if nl == -1 else nl + 1
+            chunk = mm[pos:cut]
+            pos = cut
+            if crlf:
+                chunk = chunk.replace(b"\r\n", b"\n")
+            if chunk.endswith(b"\n"):
+                chunk = chunk[:-1]
+            if not chunk:
+                continue
+
+            n_rows = chunk.count(b"\n") + 1
+            fields = chunk.replace(b"\n", b",\n").split(b",")
+            if len(fields) == n_rows * n_headers:
+                # Field đầu của mỗi dòng (trừ dòng 1) bắt đầu bằng '\n': ghép lại rồi split
+                # vừa bỏ '\n' vừa kiểm tra mọi dòng đều đúng n_headers field
+                first = b"".join(fields[n_headers::n_headers]).split(b"\n")
+                if len(first) == n_rows:
+                    first[0] = fields[0]
+                    yield n_rows, [first] + [fields[i::n_headers] for i in range(1, n_headers)]
                     continue
- 
-                # Áp dụng filter
+
+            rows = [vals for vals in (line.split(b",") for line in chunk.split(b"\n") if line) if len(vals) >= n_headers]
+            if rows:
+                yield len(rows), [[vals[i] for vals in rows] for i in range(n_headers)]
+
+    def _filter_byte_batches(self, batches, col_to_idx: dict[str, int], ast: Any, cast_plan: list, use_vectorized: bool):
+        """
+        Filter + cast từng batch cột bytes của _byte_batches: cast các cột trong WHERE
+        theo cột rồi tính mask cho cả batch (filter typed trên từng dòng, hoặc compile_mask
+        nếu use_vectorized); sau đó chỉ cast các cột SELECT của những dòng qua filter.
+        Yield tuple giá trị đã cast.
+        """
+        filter_cols = self._ast_columns(ast)
+        filter_idxs = [col_to_idx[c] for c in filter_cols]
+        filter_map = {c: i for i, c in enumerate(filter_cols)}
+        typed_filter = self._compile_filter(ast, filter_map, typed=True, batch=True)
+        raw_filter = self._compile_filter(ast, filter_map, raw_bytes=True, batch=True)
+        filter_casts = [self._bytes_cast_fn[self.column_types[c]] for c in filter_cols]
+        mask_fn = vectorized.compile_mask(ast, self.column_types) if use_vectorized else None
+        for n_rows, columns in batches:
+            mask = None
+            if ast is not None:
                 try:
-                    passed = row_filter(vals)
+                    typed = [cast_bytes_column(columns[idx], fn) for idx, fn in zip(filter_idxs, filter_casts)]
+                    row_filter = typed_filter
+                except dpapi2_exception.DataError:
+                    # Giá trị lỗi: đánh giá trên bytes như row mode (AND/OR ngắt sớm có thể bỏ qua nó)
+                    typed, row_filter = [columns[idx] for idx in filter_idxs], raw_filter
+                try:
+                    if mask_fn is not None and row_filter is typed_filter:
+                        arrays = {
+                            c: vectorized.to_array(values, self.column_types[c])
+                            for c, values in zip(filter_cols, typed)
+                        }
+                        try:
+                            mask = mask_fn(arrays, n_rows).tolist()
+                        except vectorized.RowFallback:
+                            mask = row_filter(typed)
+                    else:
+                        mask = row_filter(typed)
+                except dpapi2_exception.Error:
+                    raise
+                except UnicodeDecodeError as e:
+                    raise dpapi2_exception.DataError(f"Invalid UTF-8 data in '{self.csv_path}'.") from e
                 except Exception as e:
                     raise dpapi2_exception.ProgrammingError("Error evaluating WHERE filter.") from e
-                if not passed:
+                if not any(mask):
                     continue
- 
-                # Cast theo cast_plan
+            projected = [
+                cast_bytes_column(columns[idx] if mask is None else list(itertools.compress(columns[idx], mask)), cast_fn)
+                for idx, cast_fn, _ in cast_plan
+            ]
+            yield from zip(*projected)
+
+    def _scan_csv_range(self, start: int, end: int, headers: list[str], select_cols: list[str], ast: Any, use_vectorized: bool, crlf: bool = False, max_rows: int | None = None) -> list[list[Any]]:
+        """
+        Filter + cast các dòng nằm trong byte range [start, end) của file CSV (simple CSV),
+        dừng sau max_rows dòng khớp (LIMIT). Được gọi trong worker process của parallel_scan.
+        """
+        col_to_idx = {name: idx for idx, name in enumerate(headers)}
+        cast_plan = self._build_cast_plan(select_cols, col_to_idx, raw_bytes=True)
+        mm = self._open_mmap()
+        try:
+            sizes = batch_sizes(_BYTE_SCAN_CHUNK, None if max_rows is None else _BYTE_SCAN_FIRST_CHUNK)
+            batches = self._byte_batches(mm, start, end, len(headers), crlf, sizes)
+            rows = self._filter_byte_batches(batches, col_to_idx, ast, cast_plan, use_vectorized)
+            return list(itertools.islice(rows, max_rows))
+        finally:
+            mm.close()
+
+    def _filter_csv_rows(self, reader, n_headers: int, row_filter: Callable, cast_plan: list):
+        """
+        Duyệt từng dòng qua csv.reader, filter + cast rồi yield list giá trị đã cast.
+        """
+        for vals in reader:
+            # Nếu row rỗng hoặc thiếu cột
+            if not vals or len(vals) < n_headers:
+                continue
+
+            # Áp dụng filter
+            try:
+                passed = row_filter(vals)
+            except dpapi2_exception.DataError:
+                raise
+            except Exception as e:
+                raise dpapi2_exception.ProgrammingError("Error evaluating WHERE filter.") from e
+            if not passed:
+                continue
+
+            # Cast theo cast_plan
+            try:
+                yield [cast_fn(vals[idx]) for idx, cast_fn, _ in cast_plan]
+            except dpapi2_exception.DataError:
+                # Casting từng cột đã raise DataError nếu lỗi, propagate
+                raise
+            except Exception as e:
+                raise dpapi2_exception.DataError("Error casting row values.") from e
+
+    def _scan_csv_vectorized(self, reader, n_headers: int, col_to_idx: dict[str, int], ast: Any, row_filter: Callable, cast_plan: list, row_limit: int | None = None):
+        """
+        Batch mode trên CSV: đọc VECTOR_BATCH_SIZE dòng, cast các cột trong WHERE thành
+        ndarray, tính mask một lần cho cả batch rồi chỉ cast cột SELECT cho hàng qua filter.
+        """
+        np = vectorized.np
+        mask_fn = vectorized.compile_mask(ast, self.column_types)
+        filter_plan = [
+            (c, col_to_idx[c], self._type_to_cast_fn[self.column_types[c]], self.column_types[c])
+            for c in self._ast_columns(ast)
+        ]
+        sizes = batch_sizes(VECTOR_BATCH_SIZE, limit_batch_rows(VECTOR_BATCH_SIZE, row_limit))
+        while True:
+            chunk = list(itertools.islice(reader, next(sizes)))
+            if not chunk:
+                break
+            batch = [vals for vals in chunk if vals and len(vals) >= n_headers]
+            if not batch:
+                continue
+
+            arrays = {
+                name: vectorized.parse_array([vals[idx] for vals in batch], ctype, cast_fn)
+                for name, idx, cast_fn, ctype in filter_plan
+            }
+            mask = self._batch_mask(mask_fn, arrays, len(batch), lambda: batch, row_filter)
+            for i in np.flatnonzero(mask).tolist():
+                vals = batch[i]
                 try:
-                    typed_vals = [cast_fn(vals[idx]) for idx, cast_fn, _ in cast_plan]
+                    yield [cast_fn(vals[idx]) for idx, cast_fn, _ in cast_plan]
                 except dpapi2_exception.DataError:
-                    # Casting từng cột đã raise DataError nếu lỗi, propagate
                     raise
                 except Exception as e:
                     raise dpapi2_exception.DataError("Error casting row values.") from e
- 
-                # Build output map và yield
-                out = dict(zip(select_cols, typed_vals))
-                yield json.dumps(out)
- 
+
+    def read_headers(self) -> list[str]:
+        """
+        Đọc + kiểm tra header (dòng đầu) của file CSV.
+        """
+        mm = self._open_mmap()
+        try:
+            header_line = mm.readline()
         finally:
-            # Đóng TextIOWrapper và mmap khi kết thúc hoặc lỗi
+            mm.close()
+        if not header_line:
+            raise dpapi2_exception.OperationalError("CSV file is empty.")
+        headers = [h.strip() for h in next(csv.reader([header_line.decode("utf-8")]))]
+        self._check_headers(headers)
+        return headers
+
+    def insert(self, columns: list[str], rows: list[list[Any]]) -> int:
+        """
+        INSERT các dòng (giá trị đã kiểm tra kiểu, theo thứ tự columns; cột không có trong
+        columns để trống) qua write-ahead log của bảng (xem wal.py). Trả về (số dòng) khi
+        các dòng đã durable trong WAL và đã được thread apply ghi vào CSV, nên SELECT sau
+        đó thấy chúng.
+        """
+        headers = self.read_headers()
+        for col in columns:
+            if col not in headers:
+                raise dpapi2_exception.ProgrammingError(f"Column '{col}' not in CSV header.")
+        log = wal.logs.get(self)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator=log.line_terminator)
+        positions = [headers.index(col) for col in columns]
+        for values in rows:
+            line = [""] * len(headers)
+            for i, value in zip(positions, values):
+                line[i] = value
+            writer.writerow(line)
+        lsn = log.commit(buffer.getvalue().encode("utf-8"))
+        log.wait_applied(lsn)
+        return len(rows)
+
+    def csv_signature(self) -> list[int] | None:
+        """
+        file_signature của CSV lấy dưới append lock của WAL: size luôn là cuối một batch
+        INSERT đã ghi xong (sidecar build tới đúng size này, xem iter_row_offsets(end=...)).
+        """
+        with wal.append_lock(self.csv_path):
+            return file_signature(self.csv_path)
+
+    def iter_row_offsets(self, start: int | None = None, end: int | None = None):
+        """
+        Duyệt các dòng dữ liệu hợp lệ của CSV, yield (start, end, vals) với [start, end)
+        là byte range của dòng trong file. Dùng để build zone map / index.
+        start: bắt đầu từ byte này (đầu một dòng) thay vì ngay sau header.
+        end: dừng ở byte này (cuối một dòng, vd. size trong csv_signature()) dù file đã
+        được append thêm sau đó.
+        Không hỗ trợ field có xuống dòng bên trong dấu nháy.
+        """
+        n_headers = len(self.read_headers())
+        mm = self._open_mmap()
+        try:
+            if start is None:
+                mm.readline()
+            else:
+                mm.seek(start)
+            pos = mm.tell()
+            while end is None or pos < end:
+                line = mm.readline()
+                if not line:
+                    break
+                start = pos
+                pos += len(line)
+                text = line.decode("utf-8")
+                if text.count('"') % 2:
+                    raise dpapi2_exception.NotSupportedError(
+                        f"Table '{self.name}' has quoted fields spanning multiple lines."
+                    )
+                vals = next(csv.reader([text]), [])
+                if not vals or len(vals) < n_headers:
+                    continue
+                yield start, pos, vals
+        finally:
+            mm.close()
+
+    def _read_rows_at(self, mm: mmap.mmap, offsets: Iterable[int]):
+        """
+        Đọc các dòng CSV bắt đầu tại các byte offset cho trước (từ index).
+        """
+        for start in offsets:
+            end = mm.find(b"\n", start)
+            line = mm[start:] if end == -1 else mm[start:end + 1]
             try:
-                text_stream.close()
-            except Exception:
-                pass
+                yield next(csv.reader([line.decode("utf-8")]), [])
+            except UnicodeDecodeError as e:
+                raise dpapi2_exception.DataError(f"Invalid UTF-8 data in '{self.csv_path}'.") from e
+
+    def build_zone_map(self) -> dict[str, Any]:
+        """
+        Build sidecar zone map (min/max mỗi ZONE_MAP_BLOCK_ROWS dòng) cho bảng.
+        """
+        return build_zone_map(self, ZONE_MAP_BLOCK_ROWS)
+
+    def build_columnar(self) -> dict[str, Any]:
+        """
+        Convert file CSV thành bản columnar (xem columnar.py). Trả về manifest.
+        """
+        mm, signature = self._map_csv()
+        try:
+            headers, rows = self._typed_csv_rows(io.TextIOWrapper(MMapReader(mm), encoding="utf-8", newline=""))
+            return write_columnar(self.db_path, self.name, headers, self.column_types, rows, signature, self._source_state(signature))
+        except OSError as e:
+            raise dpapi2_exception.OperationalError(f"Cannot build columnar copy of '{self.name}': {e}") from e
+        finally:
+            mm.close()
+
+    def _source_state(self, signature: list[int]) -> dict[str, Any]:
+        """
+        Signature + append_state của CSV tại size trong signature: ghi vào bản columnar /
+        resident để chúng vẫn dùng được sau khi CSV được append thêm dòng.
+        """
+        return {"source": signature, **append_state(self.csv_path, signature[1])}
+
+    def analyze(self, sample_rows: int | None = None) -> dict[str, Any]:
+        """
+        ANALYZE: thu thập thống kê cột (xem statistics.py), scan toàn bộ hoặc lấy mẫu
+        sample_rows dòng. Trả về nội dung sidecar đã ghi.
+        """
+        return collect_statistics(self, STATS_HISTOGRAM_BUCKETS, sample_rows)
+
+    def get_statistics(self) -> TableStatistics | None:
+        """
+        Thống kê từ lần ANALYZE gần nhất, None nếu chưa có hoặc dữ liệu đã đổi.
+        Giữ lại trên Table tới khi dữ liệu hoặc file thống kê đổi (planner đọc mỗi truy vấn).
+        """
+        signature = self.data_signature()
+        key = (signature, file_signature(stats_path_for(self.db_path, self.name)))
+        cached = self._statistics
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        stats = TableStatistics.load(self.db_path, self.name, signature, self.csv_path)
+        self._statistics = (key, stats)
+        return stats
+
+    def build_segments(self, codec: str | None = None) -> dict[str, Any]:
+        """
+        Nén CSV thành segments (xem segments.py). Trả về block directory.
+        """
+        return build_segments(self, codec or SEGMENT_CODEC, SEGMENT_BLOCK_ROWS)
+
+    def load_resident(self) -> "resident.ResidentTable":
+        """
+        Decode cả bảng vào RAM: copy bản columnar nếu còn khớp đúng CSV, ngược lại parse
+        CSV (hoặc giải nén segments nếu bảng chỉ còn bản nén).
+        """
+        segments = self.cold_segments()
+        if segments is not None:
+            headers = segments.headers()
+            self._check_headers(headers)
+            rows = self._filter_segment_blocks(segments, list(range(len(segments.blocks))), headers, headers, None, False)
             try:
-                mm.close()
-            except Exception:
-                pass
+                return resident.load_from_rows(headers, self.column_types, rows, segments.signature)
+            finally:
+                rows.close()
+        mm, signature = self._map_csv()
+        try:
+            columnar = ColumnarTable.open(self.db_path, self.name, self.csv_path, signature)
+            if columnar is not None and columnar.appended is None:
+                try:
+                    self._check_headers(columnar.headers)
+                    return resident.load_from_columnar(columnar, signature, self._source_state(signature))
+                except OSError:
+                    # Generation của bản columnar vừa bị thay: đọc thẳng CSV
+                    pass
+                finally:
+                    columnar.close()
+            headers, rows = self._typed_csv_rows(io.TextIOWrapper(MMapReader(mm), encoding="utf-8", newline=""))
+            return resident.load_from_rows(headers, self.column_types, rows, signature, self._source_state(signature))
+        except OSError as e:
+            raise dpapi2_exception.OperationalError(f"Cannot load table '{self.name}' into memory: {e}") from e
+        finally:
+            mm.close()
+
+    def _typed_csv_rows(self, f: io.TextIOBase) -> tuple[list[str], Iterator[tuple]]:
+        """
+        Header + generator các dòng đã cast (theo thứ tự header) của file CSV đang mở.
+        """
+        reader = csv.reader(f)
+        try:
+            headers = [h.strip() for h in next(reader)]
+        except StopIteration:
+            raise dpapi2_exception.OperationalError("CSV file is empty.")
+        self._check_headers(headers)
+        casts = [self._type_to_cast_fn[self.column_types[h]] for h in headers]
+        rows = (
+            tuple(fn(raw) for fn, raw in zip(casts, vals))
+            for vals in reader
+            if vals and len(vals) >= len(headers)
+        )
+        return headers, rows
  
-    def _ast_to_python_expr(self, node: Any, col_to_idx: dict[str,int], column_types: dict[str,str]) -> str:
+    def _ast_to_python_expr(self, node: Any, col_to_idx: dict[str,int], column_types: dict[str,str], typed: bool = False, raw_bytes: bool = False) -> str:
         """
         Đệ quy chuyển ExpressionNode thành một Python boolean expression (chuỗi).
+        typed=True: vals[idx] đã có đúng kiểu, không cần cast.
+        raw_bytes=True: vals[idx] là bytes, chỉ cột chuỗi mới phải decode.
         """
         def recurse(n: ExpressionNode) -> str:
             # Leaf node
@@ -215,6 +1611,16 @@ class Table:
                 if isinstance(v, str) and v in col_to_idx:
                     idx = col_to_idx[v]
                     ctype = column_types[v]
+                    if typed:
+                        return f"vals[{idx}]"
+                    if raw_bytes:
+                        if ctype == "integer":
+                            return f"(int(vals[{idx}]) if vals[{idx}] else 0)"
+                        elif ctype == "float":
+                            return f"(float(vals[{idx}]) if vals[{idx}] else 0.0)"
+                        elif ctype == "string":
+                            return f"(vals[{idx}].decode('utf-8').strip())"
+                        raise dpapi2_exception.ProgrammingError(f"Unsupported column type '{ctype}' for '{v}'.")
                     if ctype == "integer":
                         return f"(int(vals[{idx}]) if vals[{idx}] != '' else 0)"
                     elif ctype == "float":
@@ -239,8 +1645,12 @@ class Table:
  
             # Nếu có left và right (binary op)
             left_s = recurse(n.left)
-            right_s = recurse(n.right)
             op = n.value.upper()
+            if op == "IN":
+                # Set literal toàn hằng: CPython gập thành một frozenset hằng, tra hash O(1)
+                members = ", ".join(repr(v) for v in sorted_members(n.right.value))
+                return f"(({left_s}) in {{{members}}})"
+            right_s = recurse(n.right)
             if op == "AND":
                 return f"(({left_s}) and ({right_s}))"
             elif op == "OR":
@@ -257,6 +1667,8 @@ class Table:
                 return f"(({left_s}) >= ({right_s}))"
             elif op == "<=":
                 return f"(({left_s}) <= ({right_s}))"
+            elif op == "LIKE":
+                return f"(_like({right_s}).fullmatch({left_s}) is not None)"
             elif op == "+":
                 return f"(({left_s}) + ({right_s}))"
             elif op == "-":
@@ -0,0 +1,164 @@
+import operator
+from typing import Any, Callable
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import like_regex, sorted_members
+from server.utils.exceptions import dpapi2_exception
+
+try:
+    import numpy as np
+except ImportError:  # NumPy là optional: không có thì Table dùng row_filter như cũ
+    np = None
+
+# =========================================
+# Batch (vectorized) evaluation of WHERE expressions.
+# A validated ExpressionNode is compiled once into a tree of closures; each closure
+# takes {column_name: ndarray} for one batch of rows and returns an ndarray (or a
+# scalar for literal-only subtrees). The root returns the boolean row mask.
+# =========================================
+
+_NUMPY_DTYPES = {"integer": "int64", "float": "float64", "string": object}
+
+_PARSERS: dict[str, Callable[[str], Any]] = {"integer": int, "float": float}
+
+_COMPARE_OPS: dict[str, Callable[[Any, Any], Any]] = {
+    "=": operator.eq, "==": operator.eq,
+    "!=": operator.ne, "<>": operator.ne,
+    ">": operator.gt, "<": operator.lt,
+    ">=": operator.ge, "<=": operator.le,
+}
+
+_ARITH_OPS: dict[str, Callable[[Any, Any], Any]] = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul,
+}
+
+
+class RowFallback(Exception):
+    """
+    Raised while evaluating a batch when vector semantics would differ from the
+    row-at-a-time filter (e.g. division by zero); the caller re-evaluates that
+    batch with row_filter so errors surface exactly as in row mode.
+    """
+
+
+def available() -> bool:
+    return np is not None
+
+
+def to_array(values: Any, col_type: str) -> Any:
+    """
+    Convert a list (or buffer) of already-cast values to an ndarray of the column's dtype.
+    """
+    if col_type == "string":
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+    if isinstance(values, memoryview):
+        return np.frombuffer(values, dtype=_NUMPY_DTYPES[col_type])
+    return np.asarray(values, dtype=_NUMPY_DTYPES[col_type])
+
+
+def parse_array(raw: list[str], col_type: str, cast_fn: Callable[[str], Any]) -> Any:
+    """
+    Parse raw CSV fields into an ndarray. Numeric columns go straight through
+    int/float into np.fromiter; if that fails (empty field, bad value) the batch is
+    parsed again with cast_fn so the result and the errors match the row path.
+    """
+    if col_type in _PARSERS:
+        try:
+            return np.fromiter(map(_PARSERS[col_type], raw), dtype=_NUMPY_DTYPES[col_type], count=len(raw))
+        except ValueError:
+            pass
+    return to_array([cast_fn(v) for v in raw], col_type)
+
+
+def _quoted(value: str) -> bool:
+    return len(value) >= 2 and ((value[0] == value[-1] == '"') or (value[0] == value[-1] == "'"))
+
+
+def compile_mask(ast: ExpressionNode, column_types: dict[str, str]) -> Callable[[dict[str, Any], int], Any]:
+    """
+    Compile the WHERE tree into mask(columns, n) -> bool ndarray of length n.
+    """
+    if np is None:
+        raise dpapi2_exception.NotSupportedError("Vectorized execution requires NumPy.")
+
+    def build(n: ExpressionNode) -> Callable[[dict[str, Any]], Any]:
+        # Leaf: cột hoặc literal
+        if n.left is None and n.right is None:
+            v = n.value
+            if isinstance(v, str) and v in column_types:
+                return lambda cols: cols[v]
+            if isinstance(v, (int, float)):
+                return lambda cols: v
+            if isinstance(v, str) and _quoted(v):
+                literal = v[1:-1]
+                return lambda cols: literal
+            raise dpapi2_exception.ProgrammingError(f"Invalid literal or column '{v}'.")
+
+        # NOT
+        if n.right is None:
+            inner = build(n.left)
+            return lambda cols: np.logical_not(inner(cols))
+
+        left = build(n.left)
+        op = n.value.upper()
+        if op == "IN":
+            return _build_in(left, n.right.value)
+        right = build(n.right)
+        if op == "LIKE":
+            return _build_like(left, right)
+        if op == "AND":
+            return lambda cols: np.logical_and(left(cols), right(cols))
+        if op == "OR":
+            return lambda cols: np.logical_or(left(cols), right(cols))
+        if op in _COMPARE_OPS:
+            fn = _COMPARE_OPS[op]
+            return lambda cols: fn(left(cols), right(cols))
+        if op in _ARITH_OPS:
+            fn = _ARITH_OPS[op]
+            return lambda cols: fn(left(cols), right(cols))
+        if op in ("/", "%"):
+            fn = np.true_divide if op == "/" else np.mod
+            def divide(cols):
+                divisor = right(cols)
+                if np.any(np.asarray(divisor) == 0):
+                    raise RowFallback()
+                return fn(left(cols), divisor)
+            return divide
+        raise dpapi2_exception.NotSupportedError(f"Unsupported operator: {op}")
+
+    root = build(ast)
+
+    def mask(cols: dict[str, Any], n: int) -> Any:
+        result = np.asarray(root(cols), dtype=bool)
+        if result.ndim == 0:
+            return np.full(n, bool(result))
+        return result
+
+    return mask
+
+
+def _build_in(left: Callable[[dict[str, Any]], Any], members: frozenset) -> Callable[[dict[str, Any]], Any]:
+    # Cột số: np.isin trên mảng các giá trị của list; cột chuỗi (object): tra frozenset từng phần tử
+    numbers = None
+    if all(isinstance(v, (int, float)) for v in members):
+        numbers = np.array(sorted_members(members), dtype="int64" if all(isinstance(v, int) for v in members) else "float64")
+    def isin(cols):
+        values = left(cols)
+        if not isinstance(values, np.ndarray):
+            return values in members
+        if values.dtype == object or numbers is None:
+            return np.fromiter(map(members.__contains__, values), dtype=bool, count=len(values))
+        return np.isin(values, numbers)
+    return isin
+
+
+def _build_like(left: Callable[[dict[str, Any]], Any], right: Callable[[dict[str, Any]], Any]) -> Callable[[dict[str, Any]], Any]:
+    def like(cols):
+        values = left(cols)
+        regex = like_regex(right(cols))
+        if not isinstance(values, np.ndarray):
+            return regex.fullmatch(values) is not None
+        match = regex.fullmatch
+        return np.fromiter((match(v) is not None for v in values), dtype=bool, count=len(values))
+    return like
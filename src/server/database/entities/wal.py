@@ -0,0 +1,396 @@
+import os
+import json
+import struct
+import threading
+import zlib
+from typing import Any
+from server.config.settings import WAL_GROUP_COMMIT_DELAY_MS, WAL_FSYNC, WAL_CHECKPOINT_BYTES
+from server.utils.exceptions import dpapi2_exception
+from server.utils.file_utils import read_json
+
+try:
+    import fcntl
+except ImportError:  # Không có fcntl (Windows): WAL không được khoá giữa các process
+    fcntl = None
+
+# =========================================
+# INSERT: append-only write-ahead log of a table, applied to its CSV in the background.
+#   <table>.wal       records: header (lsn, data length, crc32 of lsn + data) + data, where
+#                     data is the CSV lines of the rows of one INSERT, ready to append
+#   <table>.wal.json  checkpoint: every record up to `lsn` is in the CSV, which was `size`
+#                     bytes long right after the last of them was appended
+# Group commit: an INSERT queues its record and waits until it is durable. The first
+# waiter with no write in progress becomes the leader: it takes every queued record,
+# writes them with one write() and one fsync, then wakes the others. Records queued
+# during that fsync form the next group, so N concurrent inserts cost ~1 fsync, not N.
+# Apply: one background thread per table appends the durable records to the CSV (one
+# write per batch). A reader maps the CSV under the same append lock (Table._open_mmap),
+# so a scan sees the file as of the last applied batch and never a half-written row;
+# the lock is only held for the write() of already formatted bytes, never for an fsync,
+# so readers do not wait for commits. Table.insert returns only once its record is
+# applied (wait_applied), so a SELECT sent after a successful INSERT sees its rows.
+# Checkpoint (when the applier is idle, or the log is past WAL_CHECKPOINT_BYTES): fsync
+# the CSV, write <table>.wal.json, then drop the applied records from the log.
+# Recovery (database load / first INSERT after a crash): CSV bytes past the checkpoint
+# size are cut (a batch appended but not checkpointed), the records after the checkpoint
+# LSN are appended again, and a torn record at the end of the log (never acknowledged)
+# is dropped. The CSV must not be edited out of band while a table takes inserts.
+# =========================================
+
+WAL_VERSION = 1
+
+# Header của một record: lsn (uint64), độ dài data (uint32), crc32 của lsn + data (uint32)
+_RECORD_HEADER = struct.Struct("<QII")
+_LSN = struct.Struct("<Q")
+
+
+def wal_path_for(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.wal")
+
+
+def checkpoint_path_for(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.wal.json")
+
+
+def encode_record(lsn: int, data: bytes) -> bytes:
+    return _RECORD_HEADER.pack(lsn, len(data), zlib.crc32(data, zlib.crc32(_LSN.pack(lsn)))) + data
+
+
+def read_records(path: str) -> tuple[list[tuple[int, bytes]], int]:
+    """
+    Các record (lsn, data) của WAL theo thứ tự, và số byte của phần hợp lệ: dừng ở record
+    đầu tiên bị cắt / sai checksum (group ghi dở lúc crash, chưa từng được xác nhận commit).
+    """
+    try:
+        with open(path, "rb") as f:
+            buf = f.read()
+    except FileNotFoundError:
+        return [], 0
+    records: list[tuple[int, bytes]] = []
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(buf):
+        lsn, length, crc = _RECORD_HEADER.unpack_from(buf, pos)
+        start = pos + _RECORD_HEADER.size
+        data = buf[start:start + length]
+        if len(data) < length or zlib.crc32(data, zlib.crc32(_LSN.pack(lsn))) != crc:
+            break
+        records.append((lsn, data))
+        pos = start + length
+    return records, pos
+
+
+def _sync(fd: int) -> None:
+    if WAL_FSYNC:
+        (os.fdatasync if hasattr(os, "fdatasync") else os.fsync)(fd)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+_append_locks: dict[str, threading.Lock] = {}
+_append_locks_guard = threading.Lock()
+
+
+def append_lock(csv_path: str) -> threading.Lock:
+    """
+    Lock giữa thread apply (trong lúc append vào CSV) và reader (trong lúc mmap CSV).
+    """
+    lock = _append_locks.get(csv_path)
+    if lock is None:
+        with _append_locks_guard:
+            lock = _append_locks.setdefault(csv_path, threading.Lock())
+    return lock
+
+
+class _Commit:
+    __slots__ = ("lsn", "data", "done", "error")
+
+    def __init__(self, lsn: int, data: bytes):
+        self.lsn = lsn
+        self.data = data
+        self.done = False
+        self.error: OSError | None = None
+
+
+class WriteAheadLog:
+    """
+    WAL của một bảng: commit() ghi các dòng của một INSERT theo group commit, thread apply
+    ghi chúng vào CSV. Mỗi file CSV có một object trong process (xem WalStore); khi có
+    fcntl, file WAL được flock để process khác không ghi cùng lúc.
+    """
+    def __init__(self, db_path: str, table_name: str, csv_path: str):
+        self.table_name = table_name
+        self.csv_path = csv_path
+        self.path = wal_path_for(db_path, table_name)
+        self.checkpoint_path = checkpoint_path_for(db_path, table_name)
+        self.append_lock = append_lock(csv_path)
+        self._cond = threading.Condition()
+        # Record chờ group commit tiếp theo / đã durable nhưng chưa ghi vào CSV
+        self._pending: list[_Commit] = []
+        self._unapplied: list[tuple[int, bytes]] = []
+        # Một commit đang ghi + fsync một group / thread apply đang dọn WAL
+        self._flushing = False
+        self._checkpointing = False
+        self._applier: threading.Thread | None = None
+        # Lỗi I/O của thread apply hoặc khi dọn WAL: INSERT sau đó báo lỗi, recovery làm lại
+        self._failure: OSError | None = None
+        self._fd = self._open_log()
+        try:
+            self.line_terminator = self._line_terminator()
+            self._recover()
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _open_log(self) -> int:
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        except OSError as e:
+            raise dpapi2_exception.OperationalError(f"Cannot open write-ahead log '{self.path}'.") from e
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                os.close(fd)
+                raise dpapi2_exception.OperationalError(
+                    f"Table '{self.table_name}' is being written by another process."
+                ) from e
+        return fd
+
+    def _line_terminator(self) -> str:
+        # Dòng mới dùng cùng kiểu xuống dòng với header của CSV
+        try:
+            with open(self.csv_path, "rb") as f:
+                header = f.readline()
+        except OSError as e:
+            raise dpapi2_exception.OperationalError(f"Cannot open CSV file at '{self.csv_path}'.") from e
+        if not header:
+            raise dpapi2_exception.OperationalError("CSV file is empty.")
+        return "\r\n" if header.endswith(b"\r\n") else "\n"
+
+    def _recover(self) -> None:
+        checkpoint = read_json(self.checkpoint_path)
+        if not checkpoint or checkpoint.get("version") != WAL_VERSION:
+            checkpoint = {"lsn": 0, "size": None}
+        records, _ = read_records(self.path)
+        replay = [(lsn, data) for lsn, data in records if lsn > checkpoint["lsn"]]
+        if replay:
+            size = checkpoint["size"]
+            if size is not None and os.path.getsize(self.csv_path) > size:
+                # Batch đã append sau checkpoint cuối (có thể dở dang): ghi lại từ WAL
+                os.truncate(self.csv_path, size)
+            self._append_csv(b"".join(data for _, data in replay))
+        self.applied_lsn = max([checkpoint["lsn"]] + [lsn for lsn, _ in records])
+        self.durable_lsn = self.applied_lsn
+        self._next_lsn = self.applied_lsn + 1
+        self._sync_csv()
+        self._write_checkpoint()
+        os.ftruncate(self._fd, 0)
+        self._wal_size = 0
+
+    def commit(self, data: bytes) -> int:
+        """
+        Ghi data (các dòng CSV của một INSERT) vào WAL; trả về LSN của record khi nó đã durable.
+        """
+        with self._cond:
+            if self._failure is not None:
+                raise dpapi2_exception.OperationalError(
+                    f"Write-ahead log of table '{self.table_name}' failed: {self._failure}"
+                )
+            commit = _Commit(self._next_lsn, data)
+            self._next_lsn += 1
+            self._pending.append(commit)
+            while not commit.done:
+                if self._flushing or self._checkpointing:
+                    self._cond.wait()
+                    continue
+                # Leader: ghi mọi record đang chờ (kể cả của các INSERT khác) trong một group
+                self._flushing = True
+                if WAL_GROUP_COMMIT_DELAY_MS > 0:
+                    self._cond.wait(WAL_GROUP_COMMIT_DELAY_MS / 1000)
+                group, self._pending = self._pending, []
+                self._cond.release()
+                try:
+                    error = self._write_group(group)
+                finally:
+                    self._cond.acquire()
+                self._flushing = False
+                for c in group:
+                    c.done, c.error = True, error
+                if error is None:
+                    self.durable_lsn = group[-1].lsn
+                    self._unapplied.extend((c.lsn, c.data) for c in group)
+                    self._start_applier()
+                self._cond.notify_all()
+        if commit.error is not None:
+            raise dpapi2_exception.OperationalError(
+                f"Cannot write the write-ahead log of table '{self.table_name}': {commit.error}"
+            ) from commit.error
+        return commit.lsn
+
+    def _write_group(self, group: list[_Commit]) -> OSError | None:
+        payload = b"".join(encode_record(c.lsn, c.data) for c in group)
+        try:
+            _write_all(self._fd, payload)
+            _sync(self._fd)
+        except OSError as e:
+            # Bỏ phần group đã ghi dở để các record sau vẫn đọc được khi recovery
+            try:
+                os.ftruncate(self._fd, self._wal_size)
+            except OSError as truncate_error:
+                self._failure = truncate_error
+            return e
+        self._wal_size += len(payload)
+        return None
+
+    def _start_applier(self) -> None:
+        # Gọi khi đang giữ self._cond
+        if self._applier is None:
+            self._applier = threading.Thread(target=self._apply_loop, name=f"wal-apply-{self.table_name}", daemon=True)
+            self._applier.start()
+
+    def _apply_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._unapplied:
+                    self._cond.wait()
+                batch, self._unapplied = self._unapplied, []
+            try:
+                self._append_csv(b"".join(data for _, data in batch))
+            except OSError as e:
+                with self._cond:
+                    self._failure = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self.applied_lsn = batch[-1][0]
+                self._cond.notify_all()
+                idle = not self._unapplied
+            if idle or self._wal_size >= WAL_CHECKPOINT_BYTES:
+                try:
+                    self._checkpoint()
+                except OSError as e:
+                    with self._cond:
+                        self._failure = e
+                        self._cond.notify_all()
+                    return
+
+    def _append_csv(self, data: bytes) -> None:
+        fd = os.open(self.csv_path, os.O_RDWR | os.O_APPEND)
+        try:
+            size = os.fstat(fd).st_size
+            os.lseek(fd, max(0, size - 1), os.SEEK_SET)
+            if size and os.read(fd, 1) != b"\n":
+                # Dòng cuối của file chưa có xuống dòng
+                data = self.line_terminator.encode() + data
+            with self.append_lock:
+                _write_all(fd, data)
+        finally:
+            os.close(fd)
+
+    def _sync_csv(self) -> None:
+        fd = os.open(self.csv_path, os.O_RDONLY)
+        try:
+            _sync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_checkpoint(self) -> None:
+        payload = {"version": WAL_VERSION, "lsn": self.applied_lsn, "size": os.path.getsize(self.csv_path)}
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+            f.flush()
+            _sync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _checkpoint(self) -> None:
+        """
+        CSV đã chứa mọi record tới applied_lsn: fsync CSV, ghi checkpoint, rồi bỏ các record đó
+        khỏi WAL (truncate nếu không còn record chưa apply, ngược lại viết lại WAL chỉ với chúng).
+        """
+        self._sync_csv()
+        self._write_checkpoint()
+        with self._cond:
+            self._checkpointing = True
+            try:
+                while self._flushing:
+                    self._cond.wait()
+                if not self._unapplied:
+                    os.ftruncate(self._fd, 0)
+                    self._wal_size = 0
+                    return
+                payload = b"".join(encode_record(lsn, data) for lsn, data in self._unapplied)
+                tmp_path = f"{self.path}.tmp"
+                fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+                try:
+                    _write_all(fd, payload)
+                    _sync(fd)
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                os.close(self._fd)
+                self._fd = fd
+                self._wal_size = len(payload)
+            finally:
+                self._checkpointing = False
+                self._cond.notify_all()
+
+    def wait_applied(self, lsn: int, timeout: float | None = None) -> bool:
+        """
+        Chờ tới khi record lsn đã được ghi vào CSV (SELECT thấy các dòng của nó).
+        False nếu hết timeout; OperationalError nếu thread apply lỗi trước khi ghi tới lsn
+        (record vẫn durable trong WAL, recovery sẽ ghi nó vào CSV).
+        """
+        with self._cond:
+            applied = self._cond.wait_for(lambda: self.applied_lsn >= lsn or self._failure is not None, timeout)
+            if self.applied_lsn >= lsn:
+                return True
+            if applied:
+                raise dpapi2_exception.OperationalError(
+                    f"Cannot apply the write-ahead log of table '{self.table_name}': {self._failure}"
+                ) from self._failure
+            return False
+
+
+class WalStore:
+    """
+    WriteAheadLog của mọi bảng trong process, theo đường dẫn CSV (Table được tạo lại khi
+    metadata.json đổi, WAL thì không).
+    """
+    def __init__(self):
+        self._logs: dict[str, WriteAheadLog] = {}
+        self._lock = threading.Lock()
+
+    def get(self, table: Any) -> WriteAheadLog:
+        log = self._logs.get(table.csv_path)
+        if log is None:
+            with self._lock:
+                log = self._logs.get(table.csv_path)
+                if log is None:
+                    log = self._logs[table.csv_path] = WriteAheadLog(table.db_path, table.name, table.csv_path)
+        return log
+
+    def recover(self, table: Any) -> None:
+        """
+        Ghi nốt vào CSV các record còn trong WAL của bảng (sau crash), trước khi bảng được đọc.
+        """
+        if table.csv_path in self._logs:
+            return
+        path = wal_path_for(table.db_path, table.name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        try:
+            self.get(table)
+        except dpapi2_exception.OperationalError:
+            # Process khác đang giữ WAL của bảng: nó tự apply các record của mình
+            pass
+
+
+logs = WalStore()
@@ -0,0 +1,196 @@
+import bisect
+import functools
+import os
+from typing import Any
+from server.database.entities.ast import ExpressionNode
+from server.database.entities.predicates import is_leaf, column_comparison, in_list, sorted_members
+from server.utils.file_utils import file_signature, atomic_write_json, read_json, append_state, appended_since
+
+# =========================================
+# Zone maps: min / max / row count of every column over blocks of rows of the CSV.
+# Stored in storage/<db>/<table>.zonemap.json together with the signature of the CSV
+# they describe. A block is a newline-aligned byte range [start, end) so the scan can
+# jump over blocks whose statistics prove the WHERE clause cannot match.
+# Rows appended to the CSV after the build (INSERT) form one extra block without
+# statistics (ZoneMap.appended) that every scan reads, until the zone map is rebuilt.
+# =========================================
+
+ZONE_MAP_VERSION = 1
+
+
+def zone_map_path_for(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.zonemap.json")
+
+
+def build_zone_map(table: Any, block_rows: int) -> dict[str, Any]:
+    """
+    Scan the table's CSV row by row (Table.iter_row_offsets) and write its zone map sidecar.
+    Values are cast exactly like Table.select does, so min/max compare the same way
+    the WHERE filter does.
+    """
+    signature = table.csv_signature()
+    headers = table.read_headers()
+    casts = [table._type_to_cast_fn[table.column_types[h]] for h in headers]
+
+    blocks: list[dict[str, Any]] = []
+    current: dict[str, Any] | None = None
+    for start, end, vals in table.iter_row_offsets(end=signature[1]):
+        typed = [cast(raw) for cast, raw in zip(casts, vals)]
+        if current is None:
+            current = {"start": start, "end": end, "rows": 0, "min": typed[:], "max": typed[:]}
+        else:
+            mins, maxs = current["min"], current["max"]
+            for i, v in enumerate(typed):
+                if v < mins[i]:
+                    mins[i] = v
+                elif v > maxs[i]:
+                    maxs[i] = v
+            current["end"] = end
+        current["rows"] += 1
+        if current["rows"] >= block_rows:
+            blocks.append(current)
+            current = None
+    if current is not None:
+        blocks.append(current)
+
+    zone_map = {
+        "version": ZONE_MAP_VERSION,
+        "source": signature,
+        "block_rows": block_rows,
+        "columns": headers,
+        "blocks": [
+            {
+                "start": b["start"],
+                "end": b["end"],
+                "rows": b["rows"],
+                "min": dict(zip(headers, b["min"])),
+                "max": dict(zip(headers, b["max"])),
+            }
+            for b in blocks
+        ],
+        **append_state(table.csv_path, signature[1]),
+    }
+    atomic_write_json(zone_map_path_for(table.db_path, table.name), zone_map)
+    return zone_map
+
+
+_NEGATED_OPS = {"=": "!=", "!=": "=", "<": ">=", ">=": "<", ">": "<=", "<=": ">"}
+
+
+def block_may_match(node: ExpressionNode, block: dict[str, Any], column_types: dict[str, str], negate: bool = False) -> bool:
+    """
+    False chỉ khi chắc chắn không dòng nào trong block thỏa điều kiện (negate=True:
+    thỏa NOT điều kiện). Những dạng không phân tích được (biểu thức số học...) luôn True.
+    """
+    if node is None or is_leaf(node):
+        return True
+    op = str(node.value).upper()
+    if op == "NOT" and node.right is None:
+        return block_may_match(node.left, block, column_types, not negate)
+    if op in ("AND", "OR") and node.right is not None:
+        # De Morgan: NOT (a AND b) = NOT a OR NOT b
+        if (op == "AND") != negate:
+            return block_may_match(node.left, block, column_types, negate) and block_may_match(node.right, block, column_types, negate)
+        return block_may_match(node.left, block, column_types, negate) or block_may_match(node.right, block, column_types, negate)
+
+    members = in_list(node, column_types)
+    if members is not None:
+        return _block_may_contain(block, *members, negate)
+    comparison = column_comparison(node, column_types)
+    if comparison is None:
+        return True
+    column, op, value = comparison
+    if negate:
+        op = _NEGATED_OPS[op]
+    lo = block["min"].get(column)
+    hi = block["max"].get(column)
+    if lo is None or hi is None:
+        return True
+    try:
+        if op == "=":
+            return lo <= value <= hi
+        if op == "!=":
+            return not (lo == hi == value)
+        if op == "<":
+            return lo < value
+        if op == "<=":
+            return lo <= value
+        if op == ">":
+            return hi > value
+        if op == ">=":
+            return hi >= value
+    except TypeError:
+        return True
+    return True
+
+
+def _block_may_contain(block: dict[str, Any], column: str, values: frozenset, negate: bool) -> bool:
+    # IN: có giá trị nào của list nằm trong [min, max]; NOT IN: block không chỉ gồm một giá trị của list
+    lo = block["min"].get(column)
+    hi = block["max"].get(column)
+    if lo is None or hi is None:
+        return True
+    try:
+        if negate:
+            return not (lo == hi and lo in values)
+        # Tìm nhị phân trong list đã sort: một IN vài nghìn giá trị vẫn rẻ với mỗi block
+        ordered = _ordered_values(values)
+        i = bisect.bisect_left(ordered, lo)
+        return i < len(ordered) and ordered[i] <= hi
+    except TypeError:
+        return True
+
+
+@functools.lru_cache(maxsize=16)
+def _ordered_values(values: frozenset) -> list[Any]:
+    return sorted_members(values)
+
+
+class ZoneMap:
+    def __init__(self, payload: dict[str, Any], appended: tuple[int, int] | None = None):
+        self.blocks: list[dict[str, Any]] = payload["blocks"]
+        # Byte range của các dòng được append sau khi build (không có min / max: luôn scan)
+        self.appended = appended
+
+    @classmethod
+    def load(cls, db_path: str, table_name: str, csv_path: str, size: int | None = None) -> "ZoneMap | None":
+        """
+        Zone map của bảng, hoặc None nếu chưa build hoặc CSV đã thay đổi từ lúc build
+        theo cách khác ngoài việc được append thêm dòng.
+        size: số byte của CSV mà caller sẽ scan (vd. len của mmap), mặc định size hiện tại.
+        """
+        payload = read_json(zone_map_path_for(db_path, table_name))
+        if not payload or payload.get("version") != ZONE_MAP_VERSION:
+            return None
+        signature = file_signature(csv_path)
+        if payload.get("source") == signature:
+            return cls(payload)
+        if not appended_since(csv_path, payload, signature):
+            return None
+        end = signature[1] if size is None else size
+        return cls(payload, (payload["size"], end) if end > payload["size"] else None)
+
+    def matching_ranges(self, ast: ExpressionNode, column_types: dict[str, str]) -> list[tuple[int, int]]:
+        """
+        Byte range của các block có thể match (và phần được append), các block liền kề được gộp lại.
+        """
+        ranges: list[tuple[int, int]] = []
+        blocks = [(b["start"], b["end"]) for b in self.blocks if block_may_match(ast, b, column_types)]
+        if self.appended is not None:
+            blocks.append(self.appended)
+        for start, end in blocks:
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def appended_rows(self) -> float:
+        """
+        Ước lượng số dòng trong phần được append (theo số byte trung bình mỗi dòng của các block).
+        """
+        if self.appended is None or not self.blocks:
+            return 0.0
+        rows = sum(b["rows"] for b in self.blocks)
+        covered = self.blocks[-1]["end"] - self.blocks[0]["start"]
+        return (self.appended[1] - self.appended[0]) * rows / covered if covered else 0.0
@@ -0,0 +1,136 @@
+# Maintenance commands for the storage folder.
+#
+# Run from src/:
+#   python -m server.manage columnar <db_name> <table_name>
+#   python -m server.manage zonemap <db_name> [<table_name>]
+#   python -m server.manage index <db_name> [<table_name>]
+#   python -m server.manage rows <db_name> [<table_name>]
+#   python -m server.manage analyze <db_name> [<table_name>] [--sample <rows>]
+#   python -m server.manage compress <db_name> <table_name> [--codec zlib|lzma] [--drop-csv]
+
+import argparse
+import os
+import sys
+from server.database.entities.db import DB
+from server.database.entities.table import Table
+from server.database.entities.segments import SegmentFile
+from server.config.settings import STATS_SAMPLE_ROWS
+from server.utils.exceptions import dpapi2_exception
+
+
+def _tables(db_name: str, table_name: str | None) -> list[Table]:
+    db = DB(db_name)
+    if table_name is None:
+        return list(db.tables.values())
+    return [db.get_table(table_name)]
+
+
+def build_columnar(db_name: str, table_name: str) -> str:
+    table = DB(db_name).get_table(table_name)
+    manifest = table.build_columnar()
+    return f"Wrote columnar copy of {db_name}.{table_name}: {manifest['row_count']} rows, {len(manifest['columns'])} columns."
+
+
+def build_zone_maps(db_name: str, table_name: str | None) -> str:
+    lines = []
+    for table in _tables(db_name, table_name):
+        zone_map = table.build_zone_map()
+        lines.append(f"Wrote zone map of {db_name}.{table.name}: {len(zone_map['blocks'])} blocks.")
+    return "\n".join(lines)
+
+
+def build_indexes(db_name: str, table_name: str | None) -> str:
+    lines = []
+    for table in _tables(db_name, table_name):
+        for meta in table.build_indexes():
+            lines.append(f"Wrote {meta['kind']} index on {db_name}.{table.name}.{meta['column']}: {meta['count']} keys.")
+    return "\n".join(lines) or "No indexes declared in metadata.json."
+
+
+def build_row_indexes(db_name: str, table_name: str | None) -> str:
+    lines = []
+    for table in _tables(db_name, table_name):
+        index = table.get_row_index()
+        lines.append(f"Row index of {db_name}.{table.name}: {index.count} rows.")
+    return "\n".join(lines)
+
+
+def analyze_tables(db_name: str, table_name: str | None, sample_rows: int | None) -> str:
+    lines = []
+    for table in _tables(db_name, table_name):
+        stats = table.analyze(sample_rows)
+        how = f"sampled {stats['sampled_rows']} rows" if stats["sampled_rows"] is not None else "full scan"
+        lines.append(f"Analyzed {db_name}.{table.name}: {stats['row_count']} rows, {len(stats['columns'])} columns ({how}).")
+    return "\n".join(lines)
+
+
+def compress_table(db_name: str, table_name: str, codec: str | None, drop_csv: bool) -> str:
+    table = DB(db_name).get_table(table_name)
+    if not os.path.exists(table.csv_path):
+        raise dpapi2_exception.OperationalError(f"Table {db_name}.{table_name} has no CSV file to compress.")
+    meta = table.build_segments(codec)
+    packed = sum(b["length"] for b in meta["blocks"])
+    raw = sum(b["size"] for b in meta["blocks"])
+    message = f"Wrote {meta['codec']} segments of {db_name}.{table_name}: {len(meta['blocks'])} blocks, {raw} -> {packed} bytes."
+    if drop_csv:
+        # CSV chỉ bị xoá khi segments vừa ghi đọc lại được
+        if SegmentFile.open(table.db_path, table.name) is None:
+            raise dpapi2_exception.InternalError("Segments could not be read back, CSV kept.")
+        os.remove(table.csv_path)
+        message += f" Removed {table.csv_path}."
+    return message
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m server.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    columnar = commands.add_parser("columnar", help="Convert <table>.csv into the columnar binary format")
+    columnar.add_argument("db_name")
+    columnar.add_argument("table_name")
+
+    zonemap = commands.add_parser("zonemap", help="Build min/max zone maps (all tables if no table is given)")
+    zonemap.add_argument("db_name")
+    zonemap.add_argument("table_name", nargs="?")
+
+    index = commands.add_parser("index", help="Build the indexes declared in metadata.json (all tables if no table is given)")
+    index.add_argument("db_name")
+    index.add_argument("table_name", nargs="?")
+
+    rows = commands.add_parser("rows", help="Build / refresh the row offset index (all tables if no table is given)")
+    rows.add_argument("db_name")
+    rows.add_argument("table_name", nargs="?")
+
+    analyze = commands.add_parser("analyze", help="Collect column statistics and histograms (all tables if no table is given)")
+    analyze.add_argument("db_name")
+    analyze.add_argument("table_name", nargs="?")
+    analyze.add_argument("--sample", type=int, default=STATS_SAMPLE_ROWS or None, help="Only read about this many rows (default: full scan)")
+
+    compress = commands.add_parser("compress", help="Write block-compressed segments of a table (cold storage)")
+    compress.add_argument("db_name")
+    compress.add_argument("table_name")
+    compress.add_argument("--codec", choices=["zlib", "lzma"], help="Default: SEGMENT_CODEC")
+    compress.add_argument("--drop-csv", action="store_true", help="Remove the CSV afterwards; the table is then read from the segments")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "columnar":
+            print(build_columnar(args.db_name, args.table_name))
+        elif args.command == "zonemap":
+            print(build_zone_maps(args.db_name, args.table_name))
+        elif args.command == "index":
+            print(build_indexes(args.db_name, args.table_name))
+        elif args.command == "rows":
+            print(build_row_indexes(args.db_name, args.table_name))
+        elif args.command == "analyze":
+            print(analyze_tables(args.db_name, args.table_name, args.sample))
+        elif args.command == "compress":
+            print(compress_table(args.db_name, args.table_name, args.codec, args.drop_csv))
+    except dpapi2_exception.Error as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Any
+
+# Bytes at the end of a file hashed by append_state to detect a rewrite of its old tail
+TAIL_BYTES = 4096
+
+
+def file_signature(path: str) -> list[int] | None:
+    """
+    Return [mtime_ns, size, inode] of a file, or None if it does not exist.
+    Sidecar files (columnar copies, indexes, statistics...) store this signature
+    of the CSV they were built from so readers can detect stale sidecars.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """
+    Write data to path through a temporary file + os.replace so readers never see
+    a half-written file.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, payload: Any) -> None:
+    atomic_write_bytes(path, json.dumps(payload, indent=2).encode("utf-8"))
+
+
+def read_json(path: str) -> Any | None:
+    """
+    Load a JSON sidecar file; None if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _tail_digest(path: str, size: int) -> str | None:
+    """
+    Hash of the last TAIL_BYTES bytes of the first `size` bytes of a file (None if unreadable).
+    """
+    start = max(0, size - TAIL_BYTES)
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(size - start)
+    except OSError:
+        return None
+    if len(data) != size - start:
+        return None
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def append_state(path: str, size: int) -> dict[str, Any]:
+    """
+    Fields a sidecar built from the first `size` bytes of a file stores so that
+    appended_since can later tell whether the file only grew by appended lines:
+    {"size", "ends_with_newline", "tail"}.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, size - 1))
+            ends_with_newline = f.read(1) == b"\n"
+    except OSError:
+        ends_with_newline = False
+    return {"size": size, "ends_with_newline": ends_with_newline, "tail": _tail_digest(path, size)}
+
+
+def appended_since(path: str, meta: dict[str, Any], signature: list[int] | None) -> bool:
+    """
+    True if the file (current signature) only grew by lines appended after the state
+    recorded in meta (see append_state): same inode, larger, the old content ended with
+    a newline and its tail is unchanged.
+    """
+    old_size = meta.get("size")
+    source = meta.get("source")
+    if signature is None or not isinstance(old_size, int) or not meta.get("ends_with_newline"):
+        return False
+    if not source or signature[1] <= old_size or signature[2] != source[2]:
+        return False
+    return _tail_digest(path, old_size) == meta.get("tail")
@@ -0,0 +1,122 @@
+# INSERT regression tests: write-ahead log, read-your-writes, crash recovery, and the
+# sidecars (indexes, statistics, zone map, columnar copy) plus the result cache after an
+# INSERT. Each test runs on its own database in a temporary storage folder.
+
+import json
+import os
+import pytest
+from server.controllers import db_controlller
+from server.database import db_engine
+from server.database.entities import db as db_module, table as table_module, wal
+from server.database.entities.ast import AST
+from server.database.entities.result_cache import ResultCache
+
+DB_NAME = "shop"
+ROWS = 3000
+COLUMNS = [
+    {"name": "id", "type": "integer", "index": "sorted"},
+    {"name": "name", "type": "string", "index": "hash"},
+    {"name": "price", "type": "float"},
+]
+
+
+@pytest.fixture
+def shop(tmp_path, monkeypatch):
+    """
+    Database `shop` (bảng items, ROWS dòng) trong storage tạm, với một DatabaseEngine
+    riêng mà db_controlller dùng; user "tester" đã kết nối.
+    """
+    db_path = tmp_path / DB_NAME
+    db_path.mkdir()
+    (db_path / "metadata.json").write_text(json.dumps({DB_NAME: {"items": COLUMNS}}))
+    lines = ["id,name,price"] + [f"{i},item{i % 100},{i * 1.5}" for i in range(ROWS)]
+    (db_path / "items.csv").write_text("\n".join(lines) + "\n")
+
+    monkeypatch.setattr(db_module, "STORAGE_FOLDER", str(tmp_path))
+    monkeypatch.setattr(table_module, "STORAGE_FOLDER", str(tmp_path))
+    monkeypatch.setattr(db_engine, "DB_NAMES", [DB_NAME])
+    engine = db_engine.DatabaseEngine()
+    engine.result_cache = ResultCache(1 << 20, 1 << 20, 1 << 20, str(tmp_path / "result_cache"))
+    engine.load_db("tester", DB_NAME)
+    monkeypatch.setattr(db_controlller, "engine", engine)
+    return engine
+
+
+def query(sql: str) -> list:
+    return [json.loads(row) for row in db_controlller.query_execute("tester", sql)]
+
+
+def items(engine):
+    return engine.get_db("tester").tables["items"]
+
+
+def test_insert_then_select_returns_rows(shop):
+    assert query("INSERT INTO items (id, name, price) VALUES (5000, 'new', 1.25), (5001, 'new', 2.5)") == [{"inserted": 2}]
+    assert query("SELECT id, price FROM items WHERE name = 'new'") == [{"id": 5000, "price": 1.25}, {"id": 5001, "price": 2.5}]
+    assert query("SELECT count(*) FROM items") == [{"count(*)": ROWS + 2}]
+
+
+def test_recovery_replays_unapplied_records(shop):
+    table = items(shop)
+    csv_size = os.path.getsize(table.csv_path)
+    # Crash sau khi hai record durable trong WAL: record 1 mới được ghi dở vào CSV,
+    # record 2 chưa được ghi, record thứ 3 bị cắt giữa chừng (chưa từng được xác nhận)
+    with open(wal.checkpoint_path_for(table.db_path, table.name), "w") as f:
+        json.dump({"version": wal.WAL_VERSION, "lsn": 0, "size": csv_size}, f)
+    with open(wal.wal_path_for(table.db_path, table.name), "wb") as f:
+        f.write(wal.encode_record(1, b"7000,crash,1.0\n"))
+        f.write(wal.encode_record(2, b"7001,crash,2.0\n"))
+        f.write(wal.encode_record(3, b"7002,crash,3.0\n")[:-4])
+    with open(table.csv_path, "ab") as f:
+        f.write(b"7000,cra")
+
+    store = wal.WalStore()
+    store.recover(table)
+    with open(table.csv_path, "rb") as f:
+        f.seek(csv_size)
+        assert f.read() == b"7000,crash,1.0\n7001,crash,2.0\n"
+    assert os.path.getsize(wal.wal_path_for(table.db_path, table.name)) == 0
+    # Record tiếp theo nhận LSN sau các record đã replay
+    assert store.get(table).commit(b"7003,crash,4.0\n") == 3
+
+
+def test_indexes_after_insert(shop):
+    table = items(shop)
+    for sql in ("id = 42", "name = 'item7'"):
+        assert table.choose_index(AST(sql).root) is not None
+    query("INSERT INTO items (id, name, price) VALUES (42, 'item7', 99.0), (9000, 'item7', 1.0)")
+
+    for sql in ("id = 42", "name = 'item7'", "id >= 2990"):
+        ast = AST(sql).root
+        index_scan = table.choose_index(ast)
+        assert index_scan is not None, sql
+        by_index = sorted(json.dumps(r) for r in table.select_rows(["*"], ast, index_scan=index_scan))
+        by_scan = sorted(json.dumps(r) for r in table.select_rows(["*"], ast))
+        assert by_index == by_scan, sql
+    assert [r["price"] for r in table.select_rows(["price"], AST("id = 42").root, index_scan=table.choose_index(AST("id = 42").root))] == [63.0, 99.0]
+
+
+def test_sidecars_after_insert(shop):
+    table = items(shop)
+    table.analyze()
+    table.build_zone_map()
+    table.build_columnar()
+    query("INSERT INTO items (id, name, price) VALUES (-1, 'late', 100000.0)")
+
+    stats = table.get_statistics()
+    assert stats is not None and stats.appended_rows == 1
+    assert stats.row_count == ROWS + 1
+    # Thống kê / bản columnar cũ không còn được dùng như câu trả lời chính xác
+    assert query("SELECT count(*), min(id), max(price) FROM items") == [{"count(*)": ROWS + 1, "min(id)": -1, "max(price)": 100000.0}]
+    assert query("SELECT id FROM items WHERE price > 50000") == [{"id": -1}]
+    assert query("SELECT id, name FROM items LIMIT 2 OFFSET 2999") == [{"id": 2999, "name": "item99"}, {"id": -1, "name": "late"}]
+    assert query("SELECT name, count(*) FROM items WHERE name = 'late' GROUP BY name") == [{"name": "late", "count(*)": 1}]
+
+
+def test_result_cache_after_insert(shop):
+    sql = "SELECT count(*) FROM items WHERE name = 'item3'"
+    assert query(sql) == [{"count(*)": ROWS // 100}]
+    assert query(sql) == [{"count(*)": ROWS // 100}]
+    assert shop.result_cache.hits == 1
+    query("INSERT INTO items (id, name, price) VALUES (8000, 'item3', 0.5)")
+    assert query(sql) == [{"count(*)": ROWS // 100 + 1}]